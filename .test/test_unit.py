@@ -3,6 +3,7 @@ import glob
 import json
 import os
 import random
+import threading
 import time
 from datetime import datetime
 from tkinter import messagebox
@@ -392,3 +393,607 @@ class Test(TestCase):
         print(btn.__dict__)
 
         tk_root.mainloop()
+
+    def test_mirror_fetcher_race_and_conditional(self):
+        """本地 http 服务模拟多个镜像: 慢速、失败、内容无效、支持 ETag 的正常镜像"""
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from utils.encoding_utils import CryptoUtils
+        from utils.http_utils import MirrorFetcher
+
+        payload = CryptoUtils.encrypt_and_append_key(json.dumps({"global": {"ver": "1"}}), "test_key")
+        etag = '"v1"'
+        hits = {}
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                hits[self.path] = hits.get(self.path, 0) + 1
+                if self.path == "/fail":
+                    self.send_response(500)
+                    self.end_headers()
+                    return
+                if self.path == "/slow":
+                    time.sleep(1.5)
+                body = payload if self.path != "/bad" else "not encrypted"
+                if self.path == "/ok" and self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(body.encode())
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        decrypt_calls = []
+
+        def parse(text):
+            decrypt_calls.append(1)
+            return CryptoUtils.decrypt_response(text)
+
+        try:
+            fetcher = MirrorFetcher([f"{base}/slow", f"{base}/fail", f"{base}/bad", f"{base}/ok"], parse=parse)
+            # 首次: 慢速镜像不拖累结果, 失败和无效内容被跳过
+            start = time.perf_counter()
+            result = fetcher.fetch()
+            self.assertLess(time.perf_counter() - start, 1.0)
+            self.assertEqual(result.url, f"{base}/ok")
+            self.assertEqual(json.loads(result.data), {"global": {"ver": "1"}})
+            self.assertFalse(result.not_modified)
+
+            # 再次: 正常镜像返回 304, 不再下载和解密
+            calls = len(decrypt_calls)
+            result = fetcher.fetch(result.payload_digest, [f"{base}/fail", f"{base}/ok"])
+            self.assertTrue(result.not_modified)
+            self.assertEqual(len(decrypt_calls), calls)
+
+            # 慢速镜像返回的内容与之前相同, 命中解密缓存
+            result = fetcher.fetch(None, [f"{base}/slow"])
+            self.assertEqual(result.url, f"{base}/slow")
+            self.assertEqual(len(decrypt_calls), calls)
+
+            # 全部失败时返回 None
+            self.assertIsNone(fetcher.fetch(None, [f"{base}/fail", f"{base}/bad"]))
+        finally:
+            server.shutdown()
+
+    def test_session_watcher_with_simulated_processes(self):
+        """模拟进程源: 登录/登出/新窗口事件, 且只对尚未识别出账号的进程做识别"""
+        from utils.session_utils import SessionWatcher, SimulatedProcessSource
+
+        now = [0.0]
+        source = SimulatedProcessSource()
+        watcher = source.create_watcher(retry_interval=5.0, clock=lambda: now[0])
+        watcher.watch("Weixin")
+        events = []
+        watcher.subscribe(events.append, sw="Weixin")
+
+        p1 = source.spawn("Weixin.exe", acc="wxid_a")
+        source.spawn("WeixinHelper.exe", ppid=p1)
+        p2 = source.spawn("Weixin.exe")
+        source.spawn("QQ.exe", acc="qq_a")
+        watcher.poll()
+        self.assertEqual([(e.kind, e.acc, e.pid) for e in events], [(SessionWatcher.LOGIN, "wxid_a", p1)])
+        self.assertEqual(watcher.pid_acc_dict("Weixin"), {p1: "wxid_a"})
+        self.assertEqual(source.identify_calls, 2)
+
+        # 已识别的进程不再识别, 未登录的进程登录后被识别
+        events.clear()
+        source.login(p2, "wxid_b")
+        hwnd = source.open_window(p2)
+        watcher.poll()
+        self.assertEqual(source.identify_calls, 3)
+        self.assertEqual({(e.kind, e.acc) for e in events},
+                         {(SessionWatcher.LOGIN, "wxid_b"), (SessionWatcher.NEW_WINDOW, "wxid_b")})
+        self.assertEqual(watcher.acc_hwnds("Weixin", "wxid_b"), [hwnd])
+
+        # 无变化时不产生事件也不识别
+        events.clear()
+        watcher.poll()
+        self.assertEqual(events, [])
+        self.assertEqual(source.identify_calls, 3)
+
+        # 未登录的进程识别失败后, 窗口不变且未到重试时间时不再识别; 窗口变化或到时后重新识别
+        p3 = source.spawn("Weixin.exe")
+        watcher.poll()
+        watcher.poll()
+        self.assertEqual(source.identify_calls, 4)
+        source.open_window(p3)
+        watcher.poll()
+        self.assertEqual(source.identify_calls, 5)
+        now[0] += 5.0
+        watcher.poll()
+        self.assertEqual(source.identify_calls, 6)
+
+        # 进程退出
+        events.clear()
+        source.kill(p1)
+        watcher.poll()
+        self.assertEqual([(e.kind, e.acc, e.pid) for e in events], [(SessionWatcher.LOGOUT, "wxid_a", p1)])
+        self.assertEqual(watcher.pid_acc_dict("Weixin"), {p2: "wxid_b"})
+
+    def test_handle_table_parser_with_synthetic_buffer(self):
+        """合成句柄表: pid 过滤结果与逐项解析一致; 读取器记住所需大小, 第二次一次读完"""
+        entry = handle_utils.HANDLE_TABLE_ENTRY
+        rng = random.Random(17)
+        rows = []
+        for i in range(50000):
+            pid = rng.choice([4, 1232, 1236, 5678] + list(range(100, 2000, 4)))
+            # 句柄值与 pid 相同的表项, 用来检验不会误把其他字段当成 pid
+            handle = rng.choice([1232, (i * 4) & 0xFFFF])
+            rows.append((rng.getrandbits(48), pid, handle, 0x1F0001, 0, rng.choice([17, 37]), 0, 0))
+        table = bytearray(handle_utils.HANDLE_TABLE_HEADER.pack(len(rows), 0))
+        table += b"".join(entry.pack(*row) for row in rows) + bytes(entry.size)
+
+        expected = [handle_utils.HandleEntry(r[1], r[2], r[3], r[5]) for r in rows if r[1] in (1232, 5678)]
+        self.assertEqual(list(handle_utils.iter_handle_table_entries(table, [1232, "5678", 99999])), expected)
+        self.assertEqual(len(list(handle_utils.iter_handle_table_entries(table))), len(rows))
+
+        query_sizes = []
+
+        def query(buf):
+            query_sizes.append(len(buf))
+            if len(buf) < len(table):
+                return handle_utils.STATUS_INFO_LENGTH_MISMATCH, len(table)
+            buf[:len(table)] = table
+            return handle_utils.STATUS_SUCCESS, len(table)
+
+        reader = handle_utils.SystemHandleTableReader(query)
+        reader.INITIAL_SIZE = 1024
+        reader._size = reader.INITIAL_SIZE
+        self.assertEqual(reader.find([1232, 5678]), expected)
+        self.assertEqual(len(query_sizes), 2)
+        query_sizes.clear()
+        self.assertEqual(reader.find([5678]), [e for e in expected if e.process_id == 5678])
+        self.assertEqual(len(query_sizes), 1)
+
+    def test_handle_scanner_pipeline(self):
+        """分阶段句柄查找: 先按 pid 和类型过滤, 每个 pid 只打开一次进程, 卡住的名称查询超时后跳过"""
+        import threading
+
+        entry = handle_utils.HANDLE_TABLE_ENTRY
+        # 类型序号: 17=Mutant, 37=File, 40=Event
+        rows = [(0, pid, handle, 0, 0, type_index, 0, 0)
+                for pid in (100, 200, 300) for handle, type_index in ((4, 17), (8, 37), (12, 40), (16, 37))]
+        table = bytearray(handle_utils.HANDLE_TABLE_HEADER.pack(len(rows), 0))
+        table += b"".join(entry.pack(*row) for row in rows)
+        type_names = {17: "Mutant", 37: "File", 40: "Event"}
+        hang = threading.Event()
+        calls = {"open": [], "type": 0, "name": [], "closed_dup": 0}
+
+        class FakeScanner(handle_utils.HandleScanner):
+            @staticmethod
+            def open_process(pid):
+                calls["open"].append(pid)
+                return pid
+
+            @staticmethod
+            def close_process(process):
+                pass
+
+            @staticmethod
+            def duplicate(process, handle):
+                return process, handle
+
+            @staticmethod
+            def close_duplicate(duplicated_handle):
+                calls["closed_dup"] += 1
+
+            @staticmethod
+            def query_type(duplicated_handle):
+                calls["type"] += 1
+                pid, handle = duplicated_handle
+                return type_names[rows[[(r[1], r[2]) for r in rows].index((pid, handle))][5]]
+
+            @staticmethod
+            def query_name(duplicated_handle):
+                calls["name"].append(duplicated_handle)
+                pid, handle = duplicated_handle
+                if handle == 16:
+                    hang.wait(5)  # 模拟卡死的管道句柄
+                return f"\\Sessions\\1\\BaseNamedObjects\\obj_{pid}_{handle}"
+
+        def query(buf):
+            buf[:len(table)] = table
+            return handle_utils.STATUS_SUCCESS, len(table)
+
+        scanner = FakeScanner(handle_utils.SystemHandleTableReader(query), max_workers=2, timeout=0.2)
+        try:
+            start = time.perf_counter()
+            results = list(scanner.iter_handles([100, 200], ("Mutant", "File")))
+            self.assertLess(time.perf_counter() - start, 2)
+        finally:
+            hang.set()
+        self.assertEqual(sorted(set(calls["open"])), [100, 200])
+        self.assertEqual(len(calls["open"]), 2)
+        self.assertEqual(calls["type"], 3)
+        self.assertTrue(all(handle != 12 for _, handle in calls["name"]))
+        self.assertEqual([(pid, handle, t) for pid, handle, _, t in results],
+                         [(pid, h, t) for pid in (100, 200) for h, t in ((4, "Mutant"), (8, "File"), (16, "File"))])
+        self.assertEqual({(pid, handle) for pid, handle, name, _ in results if name is None}, {(100, 16), (200, 16)})
+
+        # 类型序号已知, 第二次不再查询类型
+        scanner.iter_handles([300], ("Mutant", "File")).__next__()
+        self.assertEqual(calls["type"], 3)
+
+        # 默认不限类型
+        self.assertEqual({t for *_, t in scanner.iter_handles([300])}, {"Mutant", "File", "Event"})
+
+    def test_sweep_handles_in_one_table_read(self):
+        """多个进程各自的通配只需读一次句柄表"""
+        entry = handle_utils.HANDLE_TABLE_ENTRY
+        names = {(100, 4): "\\BaseNamedObjects\\_WeChat_App_Instance_Identity_Mutex_Name",
+                 (100, 8): "\\Device\\HarddiskVolume3\\WeChat Files\\All Users\\config\\config.data",
+                 (200, 4): "\\BaseNamedObjects\\Tencent.WeWork.ExclusiveObject",
+                 (200, 8): "\\BaseNamedObjects\\_WeChat_App_Instance_Identity_Mutex_Name",
+                 (300, 4): "\\BaseNamedObjects\\Tencent.WeWork.ExclusiveObject"}
+        rows = [(0, pid, handle, 0, 0, 17, 0, 0) for pid, handle in names]
+        table = bytearray(handle_utils.HANDLE_TABLE_HEADER.pack(len(rows), 0))
+        table += b"".join(entry.pack(*row) for row in rows)
+        reads = []
+
+        def query(buf):
+            reads.append(1)
+            buf[:len(table)] = table
+            return handle_utils.STATUS_SUCCESS, len(table)
+
+        class FakeScanner(handle_utils.HandleScanner):
+            open_process = staticmethod(lambda pid: pid)
+            close_process = staticmethod(lambda process: None)
+            duplicate = staticmethod(lambda process, handle: (process, handle))
+            close_duplicate = staticmethod(lambda duplicated_handle: None)
+            query_type = staticmethod(lambda duplicated_handle: "Mutant")
+            query_name = staticmethod(lambda duplicated_handle: names[duplicated_handle])
+
+        origin_scanner = handle_utils._handle_scanner
+        handle_utils._handle_scanner = FakeScanner(handle_utils.SystemHandleTableReader(query))
+        try:
+            success, matched, timings = handle_utils.sweep_handles({
+                100: ["_W?Chat_App_Instance_Identity_Mutex_Name", "conf?g.data"],
+                "200": ["Tencent.WeWork.ExclusiveObject"],
+            }, close=False)
+        finally:
+            handle_utils._handle_scanner = origin_scanner
+        self.assertTrue(success)
+        self.assertEqual(len(reads), 1)
+        self.assertEqual([(h["process_id"], h["handle"]) for h in matched], [(100, 4), (100, 8), (200, 4)])
+        self.assertTrue({"table", "type_filter", "names", "total"} <= set(timings))
+
+    def test_timed_waiter_with_fake_conditions(self):
+        """定时等待服务: 假时钟和假窗口/进程来源, 检查间隔按倍数退避, 条件成立/超时/唤醒"""
+        from utils import wait_utils
+
+        now = [0.0]
+        waiter = wait_utils.TimedWaiter(min_interval=0.1, max_interval=1.0, backoff=2, clock=lambda: now[0],
+                                        autostart=False)
+        open_windows = {1, 2}
+        alive_pids = {100}
+        checks = []
+
+        def is_window(hwnd):
+            checks.append((now[0], hwnd))
+            return hwnd in open_windows
+
+        results = []
+        f_windows = waiter.wait_until(wait_utils.windows_closed([1, 2], is_window), 10, results.append)
+        f_process = waiter.wait_until(wait_utils.process_exited(100, lambda pid: pid in alive_pids), 3)
+
+        # 推进假时钟, 记录每次检查的时间
+        check_times = []
+        for _ in range(8):
+            delay = waiter.run_due()
+            check_times.append(now[0])
+            now[0] += delay
+        self.assertEqual([round(t, 3) for t in check_times[:5]], [0.0, 0.2, 0.6, 1.4, 2.4])
+        self.assertEqual(f_process.result(0), False)  # 超时
+        self.assertFalse(f_windows.done())
+
+        open_windows.discard(1)
+        waiter.run_due()
+        open_windows.discard(2)
+        # 唤醒后立即检查, 不必等到下一次退避时间
+        waiter.wake()
+        waiter.run_due()
+        self.assertTrue(f_windows.result(0))
+        self.assertEqual(results, [True])
+        self.assertEqual(waiter.pending_count, 0)
+
+        # 真实线程: 条件在另一个线程中成立
+        import threading
+        flag = threading.Event()
+        threading.Timer(0.2, flag.set).start()
+        self.assertTrue(wait_utils.TimedWaiter().wait(flag.is_set, 2))
+
+    def test_window_snapshot_index(self):
+        """窗口快照: 按 pid/类名/可见性查询"""
+        from utils.hwnd_utils import WindowInfo, WindowSnapshot
+
+        snapshot = WindowSnapshot([
+            WindowInfo(1, 100, "Qt51514QWindowIcon", True),
+            WindowInfo(2, 100, "Qt51514QWindowToolSaveBits", False),
+            WindowInfo(3, 200, "WeChatMainWndForPC", True),
+            WindowInfo(4, 200, "Qt51514QWindowIcon", True),
+        ])
+        self.assertEqual(snapshot.hwnds_of_pid(100), [1, 2])
+        self.assertEqual(snapshot.hwnds_of_pid(100, visible_only=True), [1])
+        self.assertEqual(snapshot.hwnds_of_pid(200, ["Qt*Icon"]), [4])
+        self.assertEqual(Win32HwndGetter.win32_get_hwnds_by_pid_and_class_wildcards(300, snapshot=snapshot), [])
+        self.assertEqual(sorted(snapshot.hwnds_of_class("Qt51514QWindowIcon")), [1, 4])
+        self.assertEqual(sorted(snapshot.hwnds_of_class("Qt*", visible_only=True)), [1, 4])
+        self.assertEqual(Win32HwndGetter.win32_group_hwnds_by_pids([100, 200], snapshot=snapshot),
+                         {100: [1], 200: [3, 4]})
+        self.assertIn(3, snapshot)
+        self.assertNotIn(5, snapshot)
+
+    def test_compiled_wnd_rules_with_fake_controls(self):
+        """窗口规则编译: 用假控件验证规则语义与属性缓存"""
+        from utils.wnd_rule_utils import (ControlPropertyCache, FakeControl, FakeControlBackend,
+                                          compile_logic_expr, compile_wnd_rule)
+
+        now = [0.0]
+        backend = FakeControlBackend([
+            FakeControl(1, "Qt51514QWindowIcon", rect=(0, 0, 800, 600), Name="微信"),
+            FakeControl(2, "Qt51514QWindowIcon", rect=(0, 0, 0, 0), Name=""),
+            FakeControl(3, "Qt51514QWindowIcon", rect=(0, 0, 300, 200), Name="",
+                        children=[FakeControl(31, "TitleBar")]),
+            FakeControl(4, "mmui::MainWindow", rect=(0, 0, 100, 100), Name="微信"),
+        ])
+        cache = ControlPropertyCache(backend, ttl=1.0, clock=lambda: now[0])
+        hwnds = [1, 2, 3, 4, 5]
+
+        def run(rules):
+            return sorted(compile_wnd_rule(rules).filter(hwnds, cache))
+
+        self.assertEqual(run({"ClassNameWildcards": ["Qt*Icon"]}), [1, 2, 3])
+        self.assertEqual(run({"ClassNameWildcards": ["Qt*Icon"], "!Name": ""}), [1])
+        self.assertEqual(run({"OR": [{"ClassNameWildcards": ["mmui::*"]}, {"Name": "微信"}]}), [1, 4])
+        self.assertEqual(run({"FirstChild": {"ClassNameWildcards": ["Title*"]}}), [3])
+        self.assertEqual(run({"ClassNameWildcards": ["Qt*"], "FinalSelect": [{"SizeEquals": 0}]}), [2])
+        self.assertEqual(run({"ClassNameWildcards": ["Qt*"], "FinalSelect": [{"SizeEquals": 1}, {"SizeExtreme": "max"}]}),
+                         [1])
+        self.assertEqual(run({"FinalSelect": [{"OR": [{"WidthGreater": 5000}, {"HeightGreater": 500}]}]}), [1])
+        # 相同内容的规则只编译一次
+        self.assertIs(compile_wnd_rule({"ClassNameWildcards": ["Qt*Icon"]}),
+                      compile_wnd_rule({"ClassNameWildcards": ["Qt*Icon"]}))
+
+        # 有效期内不再读取控件, 过期后重新读取
+        calls = backend.calls
+        run({"ClassNameWildcards": ["Qt*Icon"]})
+        self.assertEqual(backend.calls, calls + 1)  # 只有 hwnd 5 不存在, 不缓存
+        now[0] += 2
+        run({"ClassNameWildcards": ["Qt*Icon"]})
+        self.assertGreater(backend.calls, calls + 5)
+
+        # 逻辑表达式: 变量为匹配字典
+        expr = compile_logic_expr("(A+B)!C", {
+            "A": {"ClassNameWildcards": ["mmui::*"]},
+            "B": {"ClassNameWildcards": ["Qt*"]},
+            "C": {"Name": ""},
+        })
+        self.assertEqual(sorted(expr.filter(hwnds, cache)), [1, 4])
+        expr = compile_logic_expr("(A+B)(C+D)", {
+            "A": {"Name": "微信"}, "B": {"Name": "QQ"},
+            "C": {"ClassNameWildcards": ["mmui::*"]}, "D": {"ClassNameWildcards": ["Other"]},
+        })
+        self.assertEqual(expr.filter(hwnds, cache), [4])
+
+    def test_lane_pipeline_overlaps_stages(self):
+        """登录流水线: 按序阶段依次进行, 其余阶段与后续任务重叠, 各通道同时进行"""
+        from utils.pipeline_utils import LanePipeline
+
+        order = []
+        lock = threading.Lock()
+
+        def worker(task):
+            with task.ordered():
+                with task.stage("launch"):
+                    with lock:
+                        order.append((task.lane, task.index))
+                    time.sleep(0.05)
+                # 共存号启动后即可放行, 其余账号要等窗口出现
+                if task.item == "coexist":
+                    task.release()
+                with task.stage("wait_hwnd"):
+                    time.sleep(0.05)
+            task.release()
+            with task.stage("place"):
+                time.sleep(0.2)
+            return task.item
+
+        lanes = {"WeChat": ["a"] * 4, "Weixin": ["coexist"] * 4}
+        start = time.perf_counter()
+        results = LanePipeline(worker, concurrency=4).run(lanes)
+        elapsed = time.perf_counter() - start
+
+        for lane, tasks in results.items():
+            self.assertEqual([t.result for t in tasks], lanes[lane])
+            self.assertEqual([i for l, i in order if l == lane], [0, 1, 2, 3])
+            self.assertTrue(all({"queue", "launch", "wait_hwnd", "place"} <= set(t.timings) for t in tasks))
+        # 串行需要 2 * 4 * 0.3 = 2.4s; WeChat 按序部分 4 * 0.1 + 最后一个 place 0.2 = 0.6s
+        self.assertLess(elapsed, 1.0)
+        weixin = results["Weixin"]
+        # 共存号启动后即放行, 后续账号的排队时间只有前一个的启动时间
+        self.assertLess(max(t.timings["queue"] for t in weixin), 0.05 * 4)
+
+    def test_span_tracer_exports(self):
+        """区间追踪: 嵌套、属性、Chrome trace 与折叠栈导出"""
+        import tempfile
+        from utils.logger_utils import SpanTracer, traced, Printer
+
+        tracer = SpanTracer()
+        with tracer.span("off"):
+            pass
+        self.assertEqual(tracer.spans(), [])
+
+        tracer.set_enabled(True)
+        with tracer.span("login_accounts"):
+            with tracer.span("open_sw", sw="Weixin") as sp:
+                time.sleep(0.02)
+                sp.set(pid=1234)
+            with tracer.span("sweep_handles"):
+                time.sleep(0.01)
+        spans = {sp.name: sp for sp in tracer.spans()}
+        self.assertEqual(spans["open_sw"].path, ("login_accounts", "open_sw"))
+        self.assertEqual(spans["open_sw"].attrs, {"sw": "Weixin", "pid": 1234})
+        self.assertEqual(spans["sweep_handles"].parent_id, spans["login_accounts"].span_id)
+
+        events = [e for e in tracer.chrome_trace()["traceEvents"] if e["ph"] == "X"]
+        self.assertEqual([e["name"] for e in events], ["login_accounts", "open_sw", "sweep_handles"])
+        self.assertEqual(events[1]["args"], {"sw": "Weixin", "pid": "1234"})
+        self.assertGreaterEqual(events[1]["dur"], 20000)
+
+        folded = dict(line.rsplit(" ", 1) for line in tracer.folded_lines())
+        self.assertEqual(set(folded), {"login_accounts", "login_accounts;open_sw", "login_accounts;sweep_handles"})
+        # 外层的自身耗时不含子区间
+        self.assertLess(int(folded["login_accounts"]), int(folded["login_accounts;open_sw"]))
+
+        with tempfile.TemporaryDirectory() as d:
+            trace_path, folded_path = tracer.export(d, "t")
+            with open(trace_path, encoding="utf-8") as f:
+                self.assertEqual(len(json.load(f)["traceEvents"]), len(tracer.chrome_trace()["traceEvents"]))
+            with open(folded_path, encoding="utf-8") as f:
+                self.assertEqual(len(f.read().splitlines()), 3)
+
+        @traced("open_acc", "sw", "acc")
+        def open_acc(sw, acc, excluded=None):
+            return acc
+
+        span_trace = Printer().span_trace
+        span_trace.reset()
+        span_trace.set_enabled(True)
+        try:
+            self.assertEqual(open_acc("WeChat", acc="wxid_1"), "wxid_1")
+        finally:
+            span_trace.set_enabled(False)
+        self.assertEqual([(sp.name, sp.attrs) for sp in span_trace.spans()],
+                         [("open_acc", {"sw": "WeChat", "acc": "wxid_1"})])
+
+    def test_statistic_store_percentiles_and_compaction(self):
+        """耗时统计: 分位数、追加日志回放、压缩与保留期、旧版数据导入"""
+        import tempfile
+        from utils.stats_utils import StatisticStore
+
+        now = [1_700_000_000.0]
+        with tempfile.TemporaryDirectory() as d:
+            samples, snapshot, legacy = (os.path.join(d, n) for n in ("s.jsonl", "h.json", "old.json"))
+            store = StatisticStore(samples, snapshot, retention=7 * 86400, compact_every=5000, clock=lambda: now[0])
+            rng = random.Random(0)
+            values = [rng.uniform(1, 3) for _ in range(980)] + [100.0] * 20
+            for v in values:
+                store.add("WeChat", "auto", "1", "2", v)
+            s = store.query("WeChat")[("auto", "1", "2")]
+            exact = sorted(values)
+            self.assertEqual(s.count, 1000)
+            self.assertAlmostEqual(s.avg, sum(values) / 1000, places=6)
+            self.assertEqual((s.min, s.max), (exact[0], 100.0))
+            # 分桶相对误差 5%
+            self.assertAlmostEqual(s.p50, exact[499], delta=exact[499] * 0.05)
+            self.assertLess(s.p95, 3.0)
+            # 异常值不再被丢弃, 体现在高分位上
+            self.assertAlmostEqual(s.p99, 100.0, delta=5.0)
+            self.assertFalse(os.path.exists(snapshot))
+
+            # 新实例从日志回放
+            store2 = StatisticStore(samples, snapshot, retention=7 * 86400, clock=lambda: now[0])
+            self.assertEqual(store2.query("WeChat")[("auto", "1", "2")].count, 1000)
+
+            # 压缩后日志清空, 快照可还原; 超出保留期的窗口被丢弃
+            store2.add("WeChat", "refresh", "list", "3", 0.5)
+            now[0] += 8 * 86400
+            store2.add("WeChat", "refresh", "list", "3", 0.7)
+            store2.compact()
+            self.assertEqual(os.path.getsize(samples), 0)
+            store3 = StatisticStore(samples, snapshot, retention=7 * 86400, clock=lambda: now[0])
+            self.assertEqual(list(store3.query("WeChat")), [("refresh", "list", "3")])
+            self.assertEqual(store3.query("WeChat", mode="refresh")[("refresh", "list", "3")].count, 1)
+
+            # 旧版 "最短,次数,平均,最长" 数据在无快照时导入, 次数与平均值不变
+            with open(legacy, "w", encoding="utf-8") as f:
+                json.dump({"Weixin": {"manual": {"_": {"auto": "1.0000,5,2.0000,4.0000"}}}}, f)
+            os.remove(snapshot)
+            store4 = StatisticStore(samples, snapshot, legacy_path=legacy, clock=lambda: now[0])
+            s = store4.query("Weixin")[("manual", "_", "auto")]
+            self.assertEqual((s.count, s.min, s.max), (5, 1.0, 4.0))
+            self.assertAlmostEqual(s.avg, 2.0)
+            self.assertTrue(os.path.exists(snapshot))
+            # 文件删除失败时不清空统计
+            self.assertFalse(store4.clear(lambda paths: False))
+            self.assertEqual(store4.query("Weixin")[("manual", "_", "auto")].count, 5)
+            removed = []
+
+            def remove_files(paths):
+                removed.extend(paths)
+                for path in paths:
+                    os.remove(path)
+                return True
+
+            self.assertTrue(store4.clear(remove_files))
+            self.assertEqual(sorted(removed), sorted([samples, snapshot, legacy]))
+            self.assertEqual(store4.query("Weixin"), {})
+
+    def test_patch_rule_resolver_and_atomic_replace(self):
+        """补丁规则解析(jmp_offset 回填相对地址)与多文件原子替换的回滚"""
+        import tempfile
+        from utils import patch_utils
+
+        data = bytearray(b"\x00" * 0x400)
+        data[0x100:0x109] = bytes.fromhex("AA BB 11 CC E9 00 00 00 00")
+        data[0x300:0x304] = bytes.fromhex("55 56 57 53")
+        recorded = []
+        resolver = patch_utils.PatchRuleResolver(record_scan=lambda *args: recorded.append(args[:2]))
+        rule = {"type": "jmp_offset", "original": "AA BB ?? CC E9 ?? ?? ?? ??", "modified": "... E9 !! !! !! !!",
+                "targets": ["55 !56 57 53"], "descript": "jmp"}
+        res = resolver.resolve_rule_dict_and_return_res_dicts(bytes(data), rule)
+        self.assertEqual(len(res), 1)
+        self.assertEqual((res[0]["offset"], res[0]["descript"]), (0x100, "jmp"))
+        offset = int.from_bytes(bytes.fromhex("".join(res[0]["modified"].split()[-4:])), "little", signed=True)
+        self.assertEqual(0x100 + 9 + offset, 0x301)
+        self.assertEqual(recorded, [("AA BB ?? CC E9 ?? ?? ?? ??", 1)])
+        self.assertEqual(resolver.resolve_rule_dict_and_return_res_dicts(
+            bytes(data), {"type": "simple", "original": "DE AD", "modified": "..."}), [])
+
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "a.dll")
+            with open(path, "wb") as f:
+                f.write(data)
+            # 第二组找不到, 第一组已写入的改动也要回滚
+            self.assertFalse(patch_utils.batch_atomic_replace_multi_files(
+                {path: [(["aabb11cc"], ["aabb22cc"]), (["deadbeef"], ["deadbeef"])]}))
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(), bytes(data))
+            self.assertTrue(patch_utils.batch_atomic_replace_multi_files({path: [(["aabb11cc"], ["aabb22cc"])]}))
+            with open(path, "rb") as f:
+                self.assertEqual(f.read(0x104)[0x100:], bytes.fromhex("aabb22cc"))
+
+    def test_scan_fingerprint_and_memo_cap(self):
+        """文件指纹按块计算且与内容指纹一致; 进程内扫描结果与磁盘缓存一样只保留最近使用的若干个指纹"""
+        import tempfile
+        from utils import pattern_utils
+
+        data = os.urandom(pattern_utils.FINGERPRINT_CHUNK_BYTES // 4 + 123)
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "a.dll")
+            with open(path, "wb") as f:
+                f.write(data)
+            self.assertEqual(pattern_utils.file_fingerprint(path), pattern_utils.content_fingerprint(data))
+
+        saved = SwInfoUtils._scan_memo.copy()
+        try:
+            SwInfoUtils._scan_memo.clear()
+            cap = subfunc_file.SCAN_CACHE_MAX_FILES
+            for i in range(cap):
+                SwInfoUtils._memo_of(f"fp{i}")[b"x"] = [i]
+            # 重新使用 fp0 后, 淘汰的是最早使用的 fp1
+            SwInfoUtils._memo_of("fp0")
+            SwInfoUtils._memo_of("new")
+            self.assertEqual(len(SwInfoUtils._scan_memo), cap)
+            self.assertNotIn("fp1", SwInfoUtils._scan_memo)
+            self.assertEqual(SwInfoUtils._memo_of("fp0"), {b"x": [0]})
+        finally:
+            SwInfoUtils._scan_memo.clear()
+            SwInfoUtils._scan_memo.update(saved)
@@ -9,7 +9,7 @@ import threading
 import time
 import tkinter as tk
 from collections.abc import Iterable
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from fnmatch import fnmatch
 from pathlib import Path
 from tkinter import messagebox, filedialog
@@ -31,10 +31,12 @@ from public.config import Config
 from public.enums import AccKeys, SwEnum, LocalCfg, MultirunMode, CfgStatus, WndType
 from public.global_members import GlobalMembers
 from public.strings import Strings
-from utils import process_utils, image_utils, hwnd_utils, handle_utils, file_utils
+from utils import process_utils, image_utils, hwnd_utils, handle_utils, file_utils, wait_utils
 from utils.encoding_utils import StringUtils
-from utils.hwnd_utils import HwndGetter, Win32HwndGetter
-from utils.logger_utils import mylogger as logger, Printer
+from utils.hwnd_utils import HwndGetter, Win32HwndGetter, WindowSnapshot
+from utils.logger_utils import mylogger as logger, Printer, traced
+from utils.pipeline_utils import LanePipeline
+from utils.session_utils import SessionWatcher
 
 
 class AccOperator:
@@ -71,51 +73,57 @@ class AccOperator:
         return (max_width, max_height) if max_width > 0 else None
 
     @staticmethod
-    def _get_now_login_hwnd_from_cache(sw, acc, excluded_hwnd_list):
-        """用缓存类名来获取当前登录窗口hwnd"""
+    def _get_now_login_hwnd_from_cache(sw, acc, excluded_hwnd_list, pid=None):
+        """用缓存类名来获取当前登录窗口hwnd; 传入 pid 时只在该进程的窗口中查找(多个账号同时启动时不会互相抢窗口)"""
         # Printer().debug(f"传入参数: {sw}, {acc}, {excluded_hwnd_list}")
         cached_class, = subfunc_file.get_sw_acc_data(sw, acc, login_wnd_class=None)
         # Printer().debug(cached_class)
         if cached_class is None:
             return None
-        sw_hwnd = Win32HwndGetter.win32_wait_hwnd_exclusively_by_class(excluded_hwnd_list, cached_class, 1)
-        if sw_hwnd is None:
-            return None
-        return sw_hwnd
+        if pid is None:
+            return Win32HwndGetter.win32_wait_hwnd_exclusively_by_class(excluded_hwnd_list, cached_class, 1)
+        end_time = time.time() + 1
+        while True:
+            hwnds = Win32HwndGetter.win32_get_hwnds_by_pid_and_class_wildcards(pid, [cached_class])
+            hwnds = [h for h in hwnds if h not in excluded_hwnd_list]
+            if len(hwnds) > 0:
+                return hwnds[0]
+            if time.time() >= end_time:
+                return None
+            time.sleep(0.1)
 
     @classmethod
-    def _open_acc_return_hwnd_and_pid(cls, sw, acc, all_excluded_hwnds):
-        """对单个账号尝试打开并返回pid和窗口hwnd"""
-        login_rules_dicts = SwInfoFunc.get_sw_wnd_class_matching_dicts(sw, WndType.LOGIN)
-        # 调取配置,打开登录窗口 *******************************************************************
+    @traced("launch_acc", "sw", "acc")
+    def _launch_acc(cls, sw, acc):
+        """对单个账号应用登录配置并启动进程, 返回主进程和子进程; 失败返回 None, None"""
         if AccInfoFunc.is_acc_coexist(sw, acc):
             # 共存程序账号: 尝试查找有无同名打开进程, 有则需要去除互斥体, 共存账号无需替换配置文件
             print(f"[OK]{acc}是共存号,无需登录配置")
-            sw_proc, sub_proc = SwOperator.open_sw(sw, exe=acc)
+            return SwOperator.open_sw(sw, exe=acc)
+        # 原生程序账号: 替换登录配置文件后, 打开平台原生程序
+        success, _ = cls.operate_acc_config('use', sw, acc)
+        if success:
+            Printer().print_vn(f"[OK]应用{acc}的登录配置")
         else:
-            # 原生程序账号: 替换登录配置文件后, 打开平台原生程序
-            success, _ = cls.operate_acc_config('use', sw, acc)
-            if success:
-                Printer().print_vn(f"[OK]应用{acc}的登录配置")
-            else:
-                Printer().print_vn(f"[ERR]应用{acc}配置失败")
-                return None, None
-            sw_proc, sub_proc = SwOperator.open_sw(sw)
-        sw_proc_pid = sw_proc.pid if sw_proc else None
-        # 等待打开窗口并获取hwnd *******************************************************************
-        sw_hwnd = cls._get_now_login_hwnd_from_cache(
-            sw, acc, all_excluded_hwnds)
+            Printer().print_vn(f"[ERR]应用{acc}配置失败")
+            return None, None
+        return SwOperator.open_sw(sw)
+
+    @classmethod
+    @traced("wait_login_hwnd", "sw", "acc", "pid")
+    def _wait_login_hwnd(cls, sw, acc, pid, excluded_hwnds):
+        """等待账号启动的进程打开登录窗口并返回hwnd"""
+        sw_hwnd = cls._get_now_login_hwnd_from_cache(sw, acc, excluded_hwnds, pid)
         # Printer().debug(f"通过缓存类名获取到的登录窗口：{sw_hwnd}")
         if sw_hwnd is None:
             # 从精确类名未能获取,只能用类名通配模式来获取,并缓存起来
+            login_rules_dicts = SwInfoFunc.get_sw_wnd_class_matching_dicts(sw, WndType.LOGIN)
             sw_hwnd, class_name = HwndGetter.uiautomation_wait_hwnd_exclusively_by_pid_and_rules_dicts(
-                all_excluded_hwnds, sw_proc_pid, login_rules_dicts)
+                excluded_hwnds, pid, login_rules_dicts)
             if class_name is not None:
                 subfunc_file.update_sw_acc_data(sw, acc, login_wnd_class=class_name)
-        if sub_proc:
-            sub_proc.terminate()
         Printer().debug(sw_hwnd)
-        return sw_hwnd, sw_proc_pid
+        return sw_hwnd
 
     @staticmethod
     def _set_wnd_pos(hwnd, pos):
@@ -135,6 +143,12 @@ class AccOperator:
             except Exception as e:
                 logger.error(e)
 
+    @classmethod
+    def _place_wnd_when_settled(cls, hwnd, pos, timeout=3):
+        """窗口显示且不再变化后(或超时后)再调整位置, 避免被程序自身的居中覆盖; 不阻塞, 返回等待的 Future"""
+        return wait_utils.timed_waiter.wait_until(
+            wait_utils.window_settled(hwnd), timeout, lambda _settled: cls._set_wnd_pos(hwnd, pos))
+
     @staticmethod
     def _thread_to_click_all_login_buttons_and_wait_refresh(sw, hwnds):
         """点击列表所有登录窗口的登录按钮,等待所有窗口关闭则刷新"""
@@ -155,7 +169,6 @@ class AccOperator:
                     cx = int(hwnd_details["width"] * 0.5)
                     cy = int(hwnd_details["height"] * 0.75)
                     hwnd_utils.do_click_in_wnd(h, cx, cy)
-                    time.sleep(0.2)
                 print(f"通过位置查找，用时：{time.time() - inner_start_time:.4f}s")
             inner_start_time = time.time()
             for h in hwnds:
@@ -182,120 +195,166 @@ class AccOperator:
         else:
             print("请手动点击登录按钮")
 
-        # 结束条件为限定时间内所有窗口消失（网络不好则会这样）
-        ddl_time = time.time() + 30
-        while time.time() < ddl_time:
-            # 判断所有 hwnd 是否都不存在了
-            all_closed = all(not win32gui.IsWindow(hwnd) for hwnd in hwnds)
+        # 结束条件为限定时间内所有窗口消失（网络不好则会这样）; 由等待服务检查, 平台有账号登录时立即检查一次
+        watcher = AccInfoFunc.get_session_watcher()
+        token = watcher.subscribe(lambda _e: wait_utils.timed_waiter.wake(), sw=sw, kinds=(SessionWatcher.LOGIN,))
+
+        def on_done(all_closed):
+            watcher.unsubscribe(token)
             if all_closed:
                 print("登录完成, 刷新...")
                 root.after(0, login_ui.refresh_frame, sw)
-                break
+
+        wait_utils.timed_waiter.wait_until(wait_utils.windows_closed(hwnds), 30, on_done)
+
+    @staticmethod
+    def _get_login_concurrency(sw) -> int:
+        """平台同时进行登录的账号数上限"""
+        value = SwInfoFunc.get_sw_setting_by_local_record(sw, LocalCfg.LOGIN_CONCURRENCY)
+        try:
+            return min(max(int(value), 1), 8)
+        except (TypeError, ValueError):
+            return 1
 
     @classmethod
+    @traced("login_accounts")
     def _login_accounts(cls, login_dict: Dict[str, List]):
         """
         传入{平台: 账号列表}字典，进行全自动登录
-        该方法会逐平台逐账号登录, 窗口排布是所有平台的窗口一起排
+        各平台同时进行; 平台内账号按流水线登录: 启动阶段按顺序进行, 前一个账号的窗口登记完成后(全局多开的共存号启动后即可)
+        下一个账号即开始启动, 与前一个账号的窗口排布等阶段重叠. 窗口排布是所有平台的窗口一起排
         """
         # 统计一下数目,若为0则直接返回 ===================================================================
-        acc_cnt = 0
-        for sw, acc_list in login_dict.items():
-            if isinstance(acc_list, list):
-                acc_cnt += len(acc_list)
-        if acc_cnt is None or acc_cnt == 0:
+        login_dict = {sw: accounts for sw, accounts in login_dict.items()
+                      if isinstance(accounts, list) and len(accounts) > 0}
+        acc_cnt = sum(len(accounts) for accounts in login_dict.values())
+        if acc_cnt == 0:
             return
-        # 计算窗口排列位置 ===================================================================
+        # 计算窗口排列位置, 按平台顺序给每个账号预先分配 ===================================================================
         screen_size = cls._get_screen_size()
         max_login_size = cls._get_max_dimensions_from_sw_list(list(login_dict.keys()))
         if max_login_size is None:
             max_login_size = (int(screen_size[0] / 6), int(screen_size[1] / 3))
         all_acc_positions = hwnd_utils.layout_wnd_positions(acc_cnt, max_login_size, screen_size)
-        # 开始登录过程 ===================================================================
-        all_acc_turn = 0  # 所有账号队列的当前轮次
-        all_opened_hwnds = []  # 记录新打开的登录窗口
-        all_excluded_hwnds = []  # 记录要排除的已存在的登录窗口
+        position_offsets = {}
+        offset = 0
         for sw, accounts in login_dict.items():
-            start_time = time.time()
+            position_offsets[sw] = offset
+            offset += len(accounts)
+        # 开始登录过程 ===================================================================
+        excluded_lock = threading.Lock()
+        all_excluded_hwnds = []  # 记录要排除的已存在的登录窗口及新打开的登录窗口
+        # 需要检查互斥体的平台, 只读一次句柄表一起查出 -------------------------------------------------------------------
+        all_has_mutex = AppFunc.get_global_setting_value_by_local_record(LocalCfg.ALL_HAS_MUTEX) is True
+        sws_to_detect = [sw for sw in login_dict
+                         if SwInfoFunc.get_sw_class(sw).multirun_mode != MultirunMode.FREELY_MULTIRUN]
+        pids_with_mutex_by_sw = {}
+        if not all_has_mutex and len(sws_to_detect) > 0:
+            pids_with_mutex_by_sw = SwOperator.find_pids_with_mutex_of_sws(sws_to_detect)
+
+        def prepare_sw(sw):
             Printer().vital(f"{sw}登录")
-            if not isinstance(accounts, list) or len(accounts) == 0:
-                continue
-            # 初始化获取数据 -------------------------------------------------------------------
             multirun_mode = SwInfoFunc.get_sw_class(sw).multirun_mode
-            config_wildcards, = subfunc_file.get_remote_cfg(
-                sw,
-                config_handle_wildcards=None
-            )
-            # 清空闲置的登录窗口、多开器，清空并拉取各账户的登录和互斥体情况 -------------------------------------------------------------------
+            config_wildcards, = subfunc_file.get_remote_cfg(sw, config_handle_wildcards=None)
+            # 清空闲置的登录窗口、多开器，清空并拉取各账户的登录和互斥体情况
             SwOperator.kill_sw_multiple_processes(sw)
             # 是否需要关闭闲置的登录窗口
             kill_idle = AppFunc.get_global_setting_value_by_local_record(LocalCfg.KILL_IDLE_LOGIN_WND) is True
             Printer().print_vn(f"[INFO]需要关闭闲置窗口: {kill_idle}")
             remained_idle_wnd_list = SwOperator.get_idle_login_wnd_and_close_if_necessary(sw, kill_idle)
+            with excluded_lock:
+                all_excluded_hwnds.extend(remained_idle_wnd_list)
             # 是否需要解锁配置文件
             unlock_cfg = AppFunc.get_global_setting_value_by_local_record(LocalCfg.UNLOCK_CFG) is True
             Printer().print_vn(f"[INFO]需要解锁配置文件: {unlock_cfg}")
-            all_excluded_hwnds.extend(remained_idle_wnd_list)
-            # 根据是否全局多开, 检查记录所有pid及互斥体情况 -------------------------------------------------------------------
+            # 根据是否全局多开, 检查记录所有pid及互斥体情况
             if multirun_mode == MultirunMode.FREELY_MULTIRUN:
                 print("[INFO]全局多开模式下, 不含有互斥体...")
                 SwInfoFunc.record_sw_pid_mutex_dict_when_start_login(sw, False)
             else:
-                SwInfoFunc.record_sw_pid_mutex_dict_when_start_login(sw)
-            # 开始平台的账号列表登录 -------------------------------------------------------------------
-            sw_opened_hwnds = []  # 当前平台的登录窗口列表
-
-            for j in range(len(login_dict[sw])):
-                if unlock_cfg:
-                    # 解锁配置文件锁
-                    pids_has_mutex = SwInfoFunc.get_pids_has_mutex_from_record(sw)
-                    handle_infos = handle_utils.pywinhandle_find_handles_by_pids_and_handle_name_wildcards(
-                        pids_has_mutex, config_wildcards)
-                    Printer().print_vn(f"[INFO]查询到登录配置文件锁：{handle_infos}")
-                    handle_utils.pywinhandle_close_handles(handle_infos)
-                sw_hwnd, sw_proc_pid = cls._open_acc_return_hwnd_and_pid(sw, accounts[j], all_excluded_hwnds)
+                SwInfoFunc.record_sw_pid_mutex_dict_when_start_login(sw, pids_has_mutex=pids_with_mutex_by_sw.get(sw))
+            return {
+                "multirun_mode": multirun_mode,
+                "config_wildcards": config_wildcards if isinstance(config_wildcards, list) else [],
+                "unlock_cfg": unlock_cfg,
+                "start_time": time.perf_counter(),
+                "placements": [],
+            }
+
+        def login_acc(task):
+            sw, acc, state = task.lane, task.item, task.lane_state
+            multirun_mode = state["multirun_mode"]
+            # 启动阶段按序进行: 替换配置文件、去除互斥体都依赖前一个账号的进程状态
+            with task.ordered():
+                if state["unlock_cfg"] and len(state["config_wildcards"]) > 0:
+                    with task.stage("unlock"):
+                        # 只需解锁上一个刚启动的进程, 边查找边关闭
+                        pids_has_mutex = SwInfoFunc.get_pids_has_mutex_from_record(sw)
+                        handle_utils.sweep_handles({pid: state["config_wildcards"] for pid in pids_has_mutex},
+                                                   handle_types=handle_utils.HANDLE_TYPES_OF_INTEREST)
+                with task.stage("launch"):
+                    sw_proc, sub_proc = cls._launch_acc(sw, acc)
+                sw_proc_pid = sw_proc.pid if sw_proc else None
+                task.span.set(acc=acc, pid=sw_proc_pid)
+                # 全局多开的共存号不替换配置、没有互斥体, 启动后即可放行下一个账号
+                if multirun_mode == MultirunMode.FREELY_MULTIRUN and AccInfoFunc.is_acc_coexist(sw, acc):
+                    task.release()
+                with task.stage("wait_hwnd"):
+                    with excluded_lock:
+                        excluded = list(all_excluded_hwnds)
+                    sw_hwnd = cls._wait_login_hwnd(sw, acc, sw_proc_pid, excluded) if sw_proc is not None else None
+                if sub_proc:
+                    sub_proc.terminate()
                 if sw_hwnd is not None:
-                    if sw_hwnd not in all_opened_hwnds:
-                        all_opened_hwnds.append(sw_hwnd)
-                    if sw_hwnd not in all_excluded_hwnds:
-                        all_excluded_hwnds.append(sw_hwnd)
-                    if sw_hwnd not in sw_opened_hwnds:
-                        sw_opened_hwnds.append(sw_hwnd)
-                    print(f"打开窗口成功：{sw_hwnd}")
-                    SwInfoFunc.set_pid_mutex_all_values_to_false(sw)
-                    if sw_proc_pid is None:
-                        _, sw_proc_pid = win32process.GetWindowThreadProcessId(sw_hwnd)
-                    subfunc_file.update_sw_acc_data(AccKeys.RELAY, sw, AccKeys.PID_MUTEX, **{f"{sw_proc_pid}": True})
-                else:
-                    all_opened_hwnds.append(None)
-                    sw_opened_hwnds.append(None)
-                # 从第二个窗口开始,每打开一个窗口就安排上一个窗口的位置,上一个窗口若为空则不处理
-                if all_acc_turn >= 1:
-                    pre_hwnd = all_opened_hwnds[all_acc_turn - 1]
-                    pre_wnd_pos = all_acc_positions[all_acc_turn - 1]
-                    cls._set_wnd_pos(pre_hwnd, pre_wnd_pos)
-                # 逐次统计时间 *******************************************************************
-                subfunc_file.update_statistic_data(
-                    sw, 'auto', str(j + 1), multirun_mode, time.time() - start_time)
-                all_acc_turn += 1
-
-            # 统计平台平均时间 -------------------------------------------------------------------
+                    with task.stage("record"):
+                        with excluded_lock:
+                            if sw_hwnd not in all_excluded_hwnds:
+                                all_excluded_hwnds.append(sw_hwnd)
+                        print(f"打开窗口成功：{sw_hwnd}")
+                        if sw_proc_pid is None:
+                            _, sw_proc_pid = win32process.GetWindowThreadProcessId(sw_hwnd)
+                        with subfunc_file.acc_batch() as tx:
+                            SwInfoFunc.set_pid_mutex_all_values_to_false(sw, tx)
+                            tx.set_nested_values(
+                                None, AccKeys.RELAY, sw, AccKeys.PID_MUTEX, **{f"{sw_proc_pid}": True})
+            # 以下阶段与后续账号的启动重叠进行
+            task.release()
+            if sw_hwnd is None:
+                return None
+            AccInfoFunc.get_session_watcher().request_poll()
+            pos = all_acc_positions[position_offsets[sw] + task.index]
+            state["placements"].append(cls._place_wnd_when_settled(sw_hwnd, pos))
+            return sw_hwnd
+
+        def finish_sw(sw, tasks):
+            state = tasks[0].lane_state if tasks else None
+            if state is None:
+                return
+            multirun_mode = state["multirun_mode"]
+            # 统计每个账号的完成时间(自平台开始登录起)、平台平均时间及各阶段平均用时
+            for task in tasks:
+                if task.finished_at is not None:
+                    subfunc_file.update_statistic_data(
+                        sw, 'auto', str(task.index + 1), multirun_mode, task.finished_at - state["start_time"])
             subfunc_file.update_statistic_data(sw, 'auto', 'avg', multirun_mode,
-                                               (time.time() - start_time) / acc_cnt)
-            # 间隔一段时间后对平台的最后一个窗口移动 -------------------------------------------------------------------
+                                               (time.perf_counter() - state["start_time"]) / acc_cnt)
+            stage_totals = {}
+            for task in tasks:
+                for stage, seconds in task.timings.items():
+                    stage_totals.setdefault(stage, []).append(seconds)
+            for stage, values in stage_totals.items():
+                subfunc_file.update_statistic_data(sw, 'stage', stage, multirun_mode, sum(values) / len(values))
             SwOperator.kill_sw_multiple_processes(sw)
-            time.sleep(3)
-            Printer().debug(sw_opened_hwnds, all_opened_hwnds, all_excluded_hwnds, all_acc_turn)
-            sw_last_hwnd = all_opened_hwnds[all_acc_turn - 1]
-            sw_last_pos = all_acc_positions[all_acc_turn - 1]
-            if sw_last_hwnd is not None:
-                cls._set_wnd_pos(sw_last_hwnd, sw_last_pos)
-            # 启动善后线程 -------------------------------------------------------------------
+            # 等所有窗口排布完成后再点击登录
+            wait(state["placements"], timeout=5)
+            sw_opened_hwnds = [t.result for t in tasks]
+            Printer().debug(sw_opened_hwnds, all_excluded_hwnds)
             threading.Thread(
                 target=cls._thread_to_click_all_login_buttons_and_wait_refresh,
                 args=(sw, sw_opened_hwnds,)
             ).start()
-        return
+
+        LanePipeline(login_acc, cls._get_login_concurrency, prepare_sw, finish_sw).run(login_dict)
 
     @classmethod
     def start_login_accounts_thread(cls, login_dict: Dict[str, List]):
@@ -839,12 +898,10 @@ shell.ShellExecute "{admin_bat_file_path}", "", "", "runas", 1
         handle_names = [handle["handle_name"] for handle in handle_regex_list]
         if handle_names is None or len(handle_names) == 0:
             return True
-        success = handle_utils.pywinhandle_close_handles(
-            handle_utils.pywinhandle_find_handles_by_pids_and_handle_names(
-                [pid],
-                handle_names
-            )
-        )
+        # 句柄名按"包含"匹配, 转成通配时转义其中的通配符
+        handle_wildcards = [re.sub(r"([*?\[])", r"[\1]", name) for name in handle_names]
+        success, _, _ = handle_utils.sweep_handles(
+            {pid: handle_wildcards}, handle_types=handle_utils.HANDLE_TYPES_OF_INTEREST)
         print(f"kill mutex: {success}")
         if success:
             subfunc_file.update_sw_acc_data(sw, acc, has_mutex=False)
@@ -1142,52 +1199,146 @@ class AccInfoFunc:
             return acc_dict["linked_acc"] if acc_dict["linked_acc"] is not None else acc
         return acc
 
+    # pid -> 账号 解析: 常驻线程池, 及按 (pid, 进程创建时间, 数据目录) 缓存的已识别结果
+    _acc_pid_pool: Optional[ThreadPoolExecutor] = None
+    _acc_pid_cache: Dict[tuple, str] = {}
+    _acc_pid_lock = threading.Lock()
+    # 每个进程识别的最长等待时间(秒), 从该进程的识别开始执行时算起(排队未开始的同样最多等这么久);
+    # 超时的进程本次视为未登录, 其结果在完成后仍会进入缓存
+    ACC_PID_TIMEOUT = 3.0
+    # 账号会话监视器: 增量维护各平台 账号 <-> 进程 <-> 窗口, 界面刷新时直接读取其状态
+    _session_watcher: Optional[SessionWatcher] = None
+    _session_watcher_lock = threading.Lock()
+    SESSION_POLL_INTERVAL = 1.0
+
     @staticmethod
-    def _update_acc_list_by_pid(pid: int, data_dir, pid_acc_dict, exclude_folders):
-        """为存在的进程匹配出对应的账号，并更新[已登录账号]和[(已登录进程,账号)]"""
-
-        def identify_by_file(file):
-            lock = threading.Lock()  # 用于保护 pid_acc_dict
-            # print(process_id, f)
-            # 将路径中的反斜杠替换为正斜杠
-            normalized_path = file.path.replace('\\', '/')
-            # print(normalized_path)
-            # 检查路径是否以 data_path 开头
-            if normalized_path.startswith(data_dir):
-                # print(
-                #     f"┌———匹配到进程{process_id}使用的符合的文件，待比对，已用时：{time.time() - start_time:.4f}秒")
-                # print(f"提取中：{f.path}")
-                path_parts = file.path.split(os.path.sep)
-                try:
-                    acc_dir_index = path_parts.index(os.path.basename(data_dir)) + 1
-                    acc_dir = path_parts[acc_dir_index]
-                    if acc_dir not in exclude_folders:
-                        with lock:
-                            pid_acc_dict[pid] = acc_dir
-                        # print(f"进程{process_id}对应账号{acc_dir}，已用时：{time.time() - start_time:.4f}秒")
-                        return True
-                    return None
-                except Exception as se:
-                    logger.error(se)
-                    return None
+    def _get_acc_dir_from_path(path, data_dir, exclude_folders) -> Optional[str]:
+        """若文件位于数据目录下的账号文件夹中, 返回账号文件夹名"""
+        # 将路径中的反斜杠替换为正斜杠, 检查路径是否以 data_dir 开头
+        if not path.replace('\\', '/').startswith(data_dir):
             return None
-
+        path_parts = path.split(os.path.sep)
         try:
-            for f in psutil.Process(pid).memory_maps():
-                success = identify_by_file(f)
-                if success:
-                    return
-            for f in psutil.Process(pid).open_files():
-                success = identify_by_file(f)
-                if success:
-                    return
+            acc_dir = path_parts[path_parts.index(os.path.basename(data_dir)) + 1]
+        except (ValueError, IndexError) as e:
+            logger.error(e)
+            return None
+        return acc_dir if acc_dir not in exclude_folders else None
 
+    @classmethod
+    def _identify_acc_by_pid(cls, pid: int, data_dir, exclude_folders) -> Optional[str]:
+        """为进程匹配出对应的账号: 先看内存映射文件, 再看打开的文件, 一旦找到即停止"""
+        try:
+            for path in process_utils.iter_mapped_and_open_file_paths(pid):
+                acc = cls._get_acc_dir_from_path(path, data_dir, exclude_folders)
+                if acc is not None:
+                    return acc
         except psutil.AccessDenied:
             logger.error(f"无法访问进程ID为 {pid} 的内存映射文件，权限不足。")
         except psutil.NoSuchProcess:
             logger.error(f"进程ID为 {pid} 的进程不存在或已退出。")
         except Exception as e:
             logger.error(f"发生意外错误: {e}")
+        return None
+
+    @classmethod
+    def _identify_and_cache_acc_by_pid(cls, cache_key, pid, data_dir, exclude_folders) -> Optional[str]:
+        acc = cls._identify_acc_by_pid(pid, data_dir, exclude_folders)
+        # 只缓存识别成功的结果: 尚未登录的进程稍后可能会登录
+        if acc is not None and cache_key is not None:
+            with cls._acc_pid_lock:
+                cls._acc_pid_cache[cache_key] = acc
+        return acc
+
+    @classmethod
+    def _get_acc_pid_pool(cls) -> ThreadPoolExecutor:
+        with cls._acc_pid_lock:
+            if cls._acc_pid_pool is None:
+                cls._acc_pid_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="acc_pid")
+            return cls._acc_pid_pool
+
+    @classmethod
+    def resolve_pid_acc_dict(cls, pids, data_dir, exclude_folders, timeout=None) -> Dict[int, str]:
+        """
+        获取进程与账号的对应关系 {pid: 账号}:
+        已识别过且未重启的进程(pid 与创建时间都未变)直接取缓存, 其余进程交给常驻线程池并发识别,
+        每个进程最多等待 timeout 秒(各自计时, 慢进程不占用其他进程的时间), 返回时所有已完成的结果都已写入
+        """
+        timeout = cls.ACC_PID_TIMEOUT if timeout is None else timeout
+        snapshot = process_utils.ProcessSnapshot.current()
+        pid_acc_dict = {}
+        pending = {}
+        with cls._acc_pid_lock:
+            # 清理已退出进程的缓存
+            alive_keys = {(info.pid, info.create_time) for info in snapshot.procs.values()}
+            for key in [k for k in cls._acc_pid_cache if k[:2] not in alive_keys]:
+                del cls._acc_pid_cache[key]
+            for pid in pids:
+                info = snapshot.get(pid)
+                cache_key = (pid, info.create_time, data_dir) if info is not None else None
+                if cache_key in cls._acc_pid_cache:
+                    pid_acc_dict[pid] = cls._acc_pid_cache[cache_key]
+                else:
+                    pending[pid] = cache_key
+        if pending:
+            pool = cls._get_acc_pid_pool()
+            started_at = {}
+
+            def identify(pid, cache_key):
+                started_at[pid] = time.monotonic()
+                return cls._identify_and_cache_acc_by_pid(cache_key, pid, data_dir, exclude_folders)
+
+            submitted_at = time.monotonic()
+            futures = {pool.submit(identify, pid, cache_key): pid for pid, cache_key in pending.items()}
+            not_done = set(futures)
+            timed_out = []
+            while not_done:
+                # 每个进程各自的截止时间: 开始执行后 timeout 秒; 尚未开始的按提交时间算排队上限
+                now = time.monotonic()
+                deadlines = {f: started_at.get(futures[f], submitted_at) + timeout for f in not_done}
+                expired = [f for f, deadline in deadlines.items() if deadline <= now]
+                for f in expired:
+                    not_done.discard(f)
+                    timed_out.append(futures[f])
+                if not not_done:
+                    break
+                done, not_done = wait(not_done, timeout=min(deadlines[f] for f in not_done) - now,
+                                      return_when=FIRST_COMPLETED)
+                for future in done:
+                    acc = future.result()
+                    if acc is not None:
+                        pid_acc_dict[futures[future]] = acc
+            if timed_out:
+                logger.warning(f"以下进程在 {timeout} 秒内未完成账号识别: {timed_out}")
+        return pid_acc_dict
+
+    @staticmethod
+    def _watcher_select_pids(sw, snapshot) -> list:
+        with process_utils.ProcessSnapshot.shared(snapshot):
+            return SwInfoFunc.get_sw_all_exe_pids(sw)
+
+    @classmethod
+    def _watcher_identify_acc(cls, sw, pids) -> Dict[int, str]:
+        data_dir = SwInfoFunc.try_get_path_of_(sw, LocalCfg.DATA_DIR)
+        excluded_dirs, = subfunc_file.get_remote_cfg(sw, excluded_dir_list=None)
+        if data_dir is None or not isinstance(excluded_dirs, list):
+            return {}
+        with process_utils.ProcessSnapshot.shared(cls._session_watcher.last_snapshot):
+            return cls.resolve_pid_acc_dict(pids, data_dir, excluded_dirs)
+
+    @staticmethod
+    def _watcher_list_windows(_sw, pids) -> Dict[int, List[int]]:
+        return Win32HwndGetter.win32_group_hwnds_by_pids(pids)
+
+    @classmethod
+    def get_session_watcher(cls) -> SessionWatcher:
+        """全局唯一的账号会话监视器(懒创建, 需调用 watch/start 后才开始工作)"""
+        with cls._session_watcher_lock:
+            if cls._session_watcher is None:
+                cls._session_watcher = SessionWatcher(
+                    cls._watcher_select_pids, cls._watcher_identify_acc, cls._watcher_list_windows,
+                    process_utils.ProcessSnapshot.take, interval=cls.SESSION_POLL_INTERVAL)
+            return cls._session_watcher
 
     @staticmethod
     def _link_acc_to_coexist_exe(sw, pid_acc_dict, executable_wildcards):
@@ -1195,22 +1346,29 @@ class AccInfoFunc:
         origin_exe, = subfunc_file.get_remote_cfg(sw, executable=None)
         if origin_exe is None:
             raise Exception("无法区分共存程序")
-        for pid, acc in pid_acc_dict.items():
-            pid_exe = process_utils.get_exe_name_by_pid(pid)
-            for wildcard in executable_wildcards:
-                if fnmatch(pid_exe, wildcard) and pid_exe != origin_exe:
-                    # 只筛选出共存但不是原生程序的
-                    subfunc_file.update_sw_acc_data(sw, pid_exe, linked_acc=acc)
-                    pid_acc_dict[pid] = pid_exe
-                    break
+        with subfunc_file.acc_batch() as tx:
+            for pid, acc in pid_acc_dict.items():
+                pid_exe = process_utils.get_exe_name_by_pid(pid)
+                for wildcard in executable_wildcards:
+                    if fnmatch(pid_exe, wildcard) and pid_exe != origin_exe:
+                        # 只筛选出共存但不是原生程序的
+                        tx.set_nested_values(None, sw, pid_exe, linked_acc=acc)
+                        pid_acc_dict[pid] = pid_exe
+                        break
 
     @classmethod
+    @traced("get_sw_acc_list", "sw")
     def get_sw_acc_list(cls, sw):
         """
-        获取账号及其登录情况
+        获取账号及其登录情况, 期间所有进程查询共用一个进程快照
         :param sw: 平台
         :return: Union[Tuple[True, Tuple[账号字典，进程字典，有无互斥体]], Tuple[False, 错误信息]]
         """
+        with process_utils.ProcessSnapshot.shared():
+            return cls._get_sw_acc_list(sw)
+
+    @classmethod
+    def _get_sw_acc_list(cls, sw):
         data_dir = SwInfoFunc.try_get_path_of_(sw, LocalCfg.DATA_DIR)
         if data_dir is None or os.path.isdir(data_dir) is False:
             return False, "数据路径不存在"
@@ -1228,17 +1386,17 @@ class AccInfoFunc:
         pid_acc_dict = {}
 
         # 获取在线进程及对应的账号字典 pid_acc_dict --------------------------------------------
-        pids = SwInfoFunc.get_sw_all_exe_pids(sw)
-        Printer().print_vn(f"读取到{sw}所有进程, 用时：{time.time() - start_time:.4f} 秒")
-        Printer().print_vn(f"所有进程: {pids}")
-        if isinstance(pids, Iterable):
-            # for pid in pids:
-            #     threading.Thread(target=cls._update_acc_list_by_pid, args=(pid, data_dir, pid_acc_dict, excluded_dirs)).start()
-            # for pid in pids:
-            #     cls._update_acc_list_by_pid(pid, data_dir, pid_acc_dict, excluded_dirs)
-            executor = ThreadPoolExecutor(max_workers=8)
-            for pid in pids:
-                executor.submit(cls._update_acc_list_by_pid, pid, data_dir, pid_acc_dict, excluded_dirs)
+        watcher = cls._session_watcher
+        if watcher is not None and watcher.is_synced(sw):
+            # 会话监视器已在增量维护该平台, 无需重新扫描
+            pid_acc_dict = watcher.pid_acc_dict(sw)
+            Printer().print_vn(f"从会话监视器读取{sw}进程与账号")
+        else:
+            pids = SwInfoFunc.get_sw_all_exe_pids(sw)
+            Printer().print_vn(f"读取到{sw}所有进程, 用时：{time.time() - start_time:.4f} 秒")
+            Printer().print_vn(f"所有进程: {pids}")
+            if isinstance(pids, Iterable):
+                pid_acc_dict = cls.resolve_pid_acc_dict(pids, data_dir, excluded_dirs)
 
         Printer().print_vn(f"{sw}所有进程与账号匹配, 用时：{time.time() - start_time:.4f} 秒")
         Printer().print_vn(pid_acc_dict)
@@ -1261,20 +1419,23 @@ class AccInfoFunc:
             acc_pid_dict[v] = k
         Printer().print_vn(f"进程账号字典反转, 用时：{time.time() - start_time:.4f} 秒")
         Printer().print_vn(acc_pid_dict)
-        # 先将账号对应pid记录, 再从pid_mutex加载回互斥体情况
-        for acc in all_acc_list:
-            pid = acc_pid_dict.get(acc, None)
-            if pid is None:
-                subfunc_file.update_sw_acc_data(sw, acc, pid=None, has_mutex=False)
-            else:
-                subfunc_file.update_sw_acc_data(sw, acc, pid=pid)
-        _, has_mutex = SwInfoFunc.update_has_mutex_from_pid_mutex(sw)
-        # 对账号添加窗口类名属性
+        # 先将账号对应pid记录, 并对账号添加窗口类名属性, 再从pid_mutex加载回互斥体情况
         origin_login_wnd_class = SwInfoFunc.get_sw_original_wnd_class_name(sw, WndType.LOGIN)
-        for acc in all_acc_list:
-            login_wnd_class, = subfunc_file.get_sw_acc_data(sw, acc, login_wnd_class=None)
-            if login_wnd_class is None:
-                subfunc_file.update_sw_acc_data(sw, acc, login_wnd_class=origin_login_wnd_class)
+        sw_dict = subfunc_file.get_sw_acc_data(sw)
+        if not isinstance(sw_dict, dict):
+            sw_dict = {}
+        with subfunc_file.acc_batch() as tx:
+            for acc in all_acc_list:
+                pid = acc_pid_dict.get(acc, None)
+                if pid is None:
+                    tx.set_nested_values(None, sw, acc, pid=None, has_mutex=False)
+                else:
+                    tx.set_nested_values(None, sw, acc, pid=pid)
+                acc_dict = sw_dict.get(acc)
+                login_wnd_class = acc_dict.get("login_wnd_class") if isinstance(acc_dict, dict) else None
+                if login_wnd_class is None:
+                    tx.set_nested_values(None, sw, acc, login_wnd_class=origin_login_wnd_class)
+        _, has_mutex = SwInfoFunc.update_has_mutex_from_pid_mutex(sw)
         return True, (acc_list_dict, has_mutex)
 
     @classmethod
@@ -1288,10 +1449,12 @@ class AccInfoFunc:
         if wnd_class_matching_dicts is None:
             return None, f"{sw}平台未适配"
         acc_hwnd_dict = {}
+        # 所有账号共用一次窗口枚举
+        snapshot = WindowSnapshot.take()
         for acc in acc_list:
             pid, = subfunc_file.get_sw_acc_data(sw, acc, pid=None)
             Printer().print_vn(f"账号{acc} pid:{pid} -----------------------------------------------")
-            hwnds_of_pid = Win32HwndGetter.win32_get_hwnds_by_pid_and_class_wildcards(pid)
+            hwnds_of_pid = Win32HwndGetter.win32_get_hwnds_by_pid_and_class_wildcards(pid, snapshot=snapshot)
             Printer().print_vn(f"进程{pid}的窗口总数: {len(hwnds_of_pid)}")
             for matching_dict in wnd_class_matching_dicts:
                 Printer().print_vn(f"筛选条件: {matching_dict}")
@@ -1,4 +1,3 @@
-import json
 import os
 import shutil
 import sys
@@ -225,8 +224,7 @@ class AppFunc:
         :return: Union[Tuple[成功, Tuple[新版列表, 旧表列表]], Tuple[失败, 错误信息]]
         """
         try:
-            with open(Config.REMOTE_SETTING_JSON_PATH, 'r', encoding='utf-8') as f:
-                config_data = json.load(f)
+            config_data = subfunc_file.try_read_remote_cfg_locally()
             if not config_data:
                 print("没有数据")
                 return False, "错误：没有数据"
@@ -272,6 +270,7 @@ class AppFunc:
         items = [os.path.join(user_dir, item) for item in os.listdir(user_dir)]
         if confirm:
             try:
+                subfunc_file.flush_user_docs()
                 file_utils.move_files_to_recycle_bin(items)
                 messagebox.showinfo("清除完成", "用户目录已移入回收站。")
                 after()
@@ -339,15 +338,12 @@ class AppFunc:
             "该操作将会清空统计的数据，请确认是否需要清除？"
         )
         if confirm:
-            file_path = Config.STATISTIC_JSON_PATH
-            try:
-                file_utils.move_files_to_recycle_bin([file_path])
-                print(f"已删除: {file_path}")
-            except Exception as e:
-                print(f"无法删除 {file_path}: {e}")
-                logger.error(e)
+            # 文件移至回收站成功后才清空内存中的统计, 失败时保持原样
+            if subfunc_file.statistic_store.clear(file_utils.move_files_to_recycle_bin):
+                print("成功清除统计数据！")
+            else:
+                print("无法删除统计文件, 统计数据未清除")
             after()
-            print("成功清除统计数据！")
 
     @staticmethod
     def create_app_lnk():
@@ -479,6 +475,7 @@ class AppFunc:
                 items_to_del.extend(items)
 
                 try:
+                    subfunc_file.flush_user_docs()
                     file_utils.move_files_to_recycle_bin(items_to_del)
                 except Exception as e:
                     logger.error(e)
@@ -1,65 +1,102 @@
+import copy
 import datetime as dt
-import json
-import math
 import os
 import re
 import sys
+import threading
 from enum import Enum
 from typing import *
 
-import requests
-
 from public import Config, Strings
 from public.enums import LocalCfg, SwEnum
 from utils import file_utils
-from utils.encoding_utils import CryptoUtils
-from utils.file_utils import JsonUtils, DictUtils
+from utils.encoding_utils import CryptoUtils, VersionIndex
+from utils.file_utils import JsonUtils, DictUtils, CachedJsonDoc, FrozenJsonSnapshot
+from utils.http_utils import MirrorFetcher
 from utils.logger_utils import mylogger as logger
+from utils.stats_utils import StatisticStore
 
 """获取远程配置，此配置只读，不提供修改方法"""
 
 
+def _remote_snapshot() -> FrozenJsonSnapshot:
+    return FrozenJsonSnapshot.of(Config.REMOTE_SETTING_JSON_PATH)
+
+
+_remote_fetcher: Optional[MirrorFetcher] = None
+_remote_fetcher_lock = threading.Lock()
+
+
+def _get_remote_fetcher() -> MirrorFetcher:
+    """镜像下载器全局唯一; 首次创建时载入上次的条件请求信息, 若本地配置仍是上次下载的版本, 预置为解密缓存"""
+    global _remote_fetcher
+    with _remote_fetcher_lock:
+        if _remote_fetcher is None:
+            state = JsonUtils.load_json(Config.REMOTE_FETCH_STATE_JSON_PATH)
+            _remote_fetcher = MirrorFetcher(
+                [Strings.REMOTE_SETTING_JSON_GITEE, Strings.REMOTE_SETTING_JSON_GITHUB],
+                parse=CryptoUtils.decrypt_response, timeout=2, validators=state.get("mirrors"))
+            snapshot = _remote_snapshot()
+            if (state.get("payload_digest") and snapshot.get() is not None
+                    and state.get("cfg_digest") == snapshot.digest):
+                try:
+                    with open(Config.REMOTE_SETTING_JSON_PATH, 'r', encoding='utf-8') as f:
+                        _remote_fetcher.seed_parse_cache(state["payload_digest"], f.read())
+                except Exception as e:
+                    logger.error(e)
+        return _remote_fetcher
+
+
 def force_fetch_remote_encrypted_cfg(url=None):
-    """强制从网络中获取最新的配置文件"""
+    """
+    强制从网络中获取最新的配置文件:
+    所有源并发请求, 取最先返回的有效内容; 源返回 304 或内容摘要未变时不再解密、不写盘
+    """
 
     print(f"正从远程源下载...")
     urls = [Strings.REMOTE_SETTING_JSON_GITEE, Strings.REMOTE_SETTING_JSON_GITHUB]
 
     if url is not None:
-        urls = [url].extend(urls)
-
-    for url in urls:
-        print(f"正在尝试从此处下载: {url}...")
-        try:
-            response = requests.get(url, timeout=2)
-            if response.status_code == 200:
-                with open(Config.REMOTE_SETTING_JSON_PATH, 'w', encoding='utf-8') as config_file:
-                    decrypted_data = CryptoUtils.decrypt_response(response.text)
-                    config_file.write(decrypted_data)  # 将下载的 JSON 保存到文件
-                print(f"成功从 {url} 获取并保存 JSON 文件")
-                return json.loads(decrypted_data)  # 返回加载的 JSON 数据
-            else:
-                print(f"获取失败: {response.status_code}，尝试下一个源...")
-
-        except requests.exceptions.Timeout:
-            logger.warning(f"请求 {url} 超时，尝试下一个源...")
-        except Exception as e:
-            logger.error(f"从 {url} 获取时发生错误: {e}，尝试下一个源...")
-
-    return None
+        urls = [url] + urls
+
+    fetcher = _get_remote_fetcher()
+    snapshot = _remote_snapshot()
+    local_data = snapshot.get()
+    state = JsonUtils.load_json(Config.REMOTE_FETCH_STATE_JSON_PATH)
+    # 本地配置仍是上次下载的版本时才发送条件请求, 否则完整下载
+    expected_digest = None
+    if local_data is not None and state.get("cfg_digest") == snapshot.digest:
+        expected_digest = state.get("payload_digest")
+
+    result = fetcher.fetch(expected_digest, urls)
+    if result is None:
+        print(f"所有源均获取失败")
+        return None
+    if result.not_modified:
+        print(f"{result.url} 上的配置无变化")
+        return local_data
+    try:
+        changed, config_data = snapshot.replace_text(result.data)
+    except Exception as e:
+        logger.error(f"从 {result.url} 获取的配置无法解析: {e}")
+        return None
+    JsonUtils.save_json(Config.REMOTE_FETCH_STATE_JSON_PATH, {
+        "payload_digest": result.payload_digest,
+        "cfg_digest": snapshot.digest,
+        "mirrors": fetcher.validators,
+    })
+    print(f"成功从 {result.url} 获取 JSON 文件" + ("并保存" if changed else ", 内容无变化"))
+    return config_data  # 返回只读的配置数据
 
 
 def try_read_remote_cfg_locally():
     """
     尝试从本地读取配置数据，优先从本地获取，成功后停止；失败会从网络下载远程配置
-    :return: 是否成功；数据
+    :return: 只读的配置数据
     """
-    config_data = None
-    try:
-        with open(Config.REMOTE_SETTING_JSON_PATH, 'r', encoding='utf-8') as f:
-            config_data = json.load(f)
-    except Exception as e:
-        logger.error(f"错误：读取本地 JSON 文件失败: {e}，尝试从云端下载")
+    config_data = _remote_snapshot().get()
+    if config_data is None:
+        logger.error(f"错误：读取本地 JSON 文件失败，尝试从云端下载")
         try:
             config_data = force_fetch_remote_encrypted_cfg()
             logger.info(f"成功从云端下载了配置文件!")
@@ -104,35 +141,59 @@ def read_remote_cfg_in_rules():
 
 
 def load_remote_cfg() -> dict:
-    data = JsonUtils.load_json(Config.REMOTE_SETTING_JSON_PATH)
-    return data
+    """返回远程配置的普通副本, 可以修改"""
+    data = _remote_snapshot().get()
+    return copy.deepcopy(data) if data is not None else {}
 
 
 def get_remote_cfg(*pre_nodes: str, **kwargs) -> Union[Any, Tuple[Any, ...]]:
     """
-    从远程设置json中获取数据
+    从远程设置json中获取数据, 直接查询内存中的只读快照, 返回值不可修改(需要修改请先 deepcopy)
     :param pre_nodes: 选择的软件标签
     :param kwargs: 传入要获取的参数及其默认值
     :return:
     """
     try:
-        data = load_remote_cfg()
+        data = _remote_snapshot().get()
+        if data is None:
+            data = {}
         return DictUtils.get_nested_values(data, None, *pre_nodes, **kwargs)
     except Exception as e:
         logger.error(e)
         return None
 
 
+def derive_from_remote_cfg(key, builder: Callable[[Any], Any]) -> Any:
+    """基于当前远程配置快照派生的数据(如版本索引), 每个快照只构建一次, 配置更新后自动重建"""
+    return _remote_snapshot().derive(key, builder)
+
+
+def get_remote_version_index(*nodes: str) -> Optional[VersionIndex]:
+    """远程配置中某个 {版本号: 数据} 节点的版本索引; 节点不是字典时返回 None"""
+
+    def build(data):
+        vers_dict = DictUtils.get_nested_values(data, None, *nodes)
+        return VersionIndex.of_versions(vers_dict) if isinstance(vers_dict, dict) else None
+
+    return derive_from_remote_cfg(("version_index",) + nodes, build)
+
+
 """额外配置"""
 
 
+def _cache_doc() -> CachedJsonDoc:
+    return CachedJsonDoc.of(Config.CACHE_SETTING_JSON_PATH)
+
+
 def load_cache_cfg() -> dict:
-    data = JsonUtils.load_json(Config.CACHE_SETTING_JSON_PATH)
-    return data
+    return _cache_doc().read()
 
 
 def save_cache_cfg(data):
-    return JsonUtils.save_json(Config.CACHE_SETTING_JSON_PATH, data)
+    with _cache_doc().modify() as doc:
+        doc.clear()
+        doc.update(data)
+    return True
 
 
 def clear_some_cache_cfg(*addr) -> bool:
@@ -142,10 +203,7 @@ def clear_some_cache_cfg(*addr) -> bool:
     """
     try:
         print(f"清理{addr}处数据...")
-        data = load_cache_cfg()
-        DictUtils.clear_nested_values(data, *addr)
-        save_cache_cfg(data)
-        return True
+        return _cache_doc().clear_values(*addr)
     except Exception as e:
         logger.error(e)
         return False
@@ -154,10 +212,7 @@ def clear_some_cache_cfg(*addr) -> bool:
 def update_cache_cfg(*front_addr, **kwargs) -> bool:
     """更新账户信息到 JSON"""
     try:
-        data = load_cache_cfg()
-        success = DictUtils.set_nested_values(data, None, *front_addr, **kwargs)
-        save_cache_cfg(data)
-        return success
+        return _cache_doc().set_values(None, *front_addr, **kwargs)
     except Exception as e:
         logger.error(e)
         return False
@@ -170,26 +225,56 @@ def get_cache_cfg(*front_addr, **kwargs) -> Union[Dict, Tuple[Any, ...]]:
     :param kwargs: 需要获取的键地址及其默认值（如 note="", nickname=None）
     :return: 包含所请求数据的元组
     """
-    data = load_cache_cfg()
-    return DictUtils.get_nested_values(data, None, *front_addr, **kwargs)
+    return _cache_doc().read(*front_addr, **kwargs)
+
+
+"""特征码扫描缓存: 按文件内容指纹 -> 特征码键 记录扫描结果, 文件内容不变则无需重扫"""
+
+SCAN_CACHE_MAX_FILES = 16
+
+
+def _scan_doc() -> CachedJsonDoc:
+    return CachedJsonDoc.of(Config.SCAN_CACHE_JSON_PATH)
+
+
+def get_scan_cache(fingerprint) -> dict:
+    """获取某内容指纹下已缓存的扫描结果 {特征码键: 编码后的匹配列表}"""
+    try:
+        features, = _scan_doc().read(fingerprint, features={})
+        return features if isinstance(features, dict) else {}
+    except Exception as e:
+        logger.error(e)
+        return {}
+
+
+def update_scan_cache(fingerprint, **feature_matches) -> bool:
+    """写入某内容指纹下的扫描结果, 并只保留最近使用的若干个文件指纹"""
+    try:
+        doc = _scan_doc()
+        with doc.batch() as tx:
+            tx.set_nested_values(None, fingerprint, "features", **feature_matches)
+            tx.set_nested_values(None, fingerprint, used=dt.datetime.now().timestamp())
+        if len(doc.read()) > SCAN_CACHE_MAX_FILES:
+            with doc.modify() as data:
+                stale = sorted(data, key=lambda fp: data[fp].get("used", 0) if isinstance(data[fp], dict) else 0)
+                for fp in stale[:len(data) - SCAN_CACHE_MAX_FILES]:
+                    del data[fp]
+        return True
+    except Exception as e:
+        logger.error(e)
+        return False
 
 
 """本地设置:为了线程安全,写方法仅在设置界面可以使用"""
 
 
-def _load_setting():
+def _setting_doc() -> CachedJsonDoc:
     """
     加载设置
     :return:
     """
     # data = IniUtils.load_ini_as_dict(Config.SETTING_INI_PATH)
-    data = JsonUtils.load_json(Config.LOCAL_SETTING_JSON_PATH)
-    return data
-
-
-def _save_setting(data):
-    # return IniUtils.save_ini_from_dict(Config.SETTING_INI_PATH, data)
-    return JsonUtils.save_json(Config.LOCAL_SETTING_JSON_PATH, data)
+    return CachedJsonDoc.of(Config.LOCAL_SETTING_JSON_PATH)
 
 
 def clear_some_setting(*addr) -> bool:
@@ -199,10 +284,7 @@ def clear_some_setting(*addr) -> bool:
     """
     try:
         print(f"清理{addr}处数据...")
-        data = _load_setting()
-        DictUtils.clear_nested_values(data, *addr)
-        _save_setting(data)
-        return True
+        return _setting_doc().clear_values(*addr)
     except Exception as e:
         logger.error(e)
         return False
@@ -211,10 +293,7 @@ def clear_some_setting(*addr) -> bool:
 def update_settings(*front_addr, **kwargs) -> bool:
     """更新账户信息到 JSON"""
     try:
-        data = _load_setting()
-        success = DictUtils.set_nested_values(data, None, *front_addr, **kwargs)
-        _save_setting(data)
-        return success
+        return _setting_doc().set_values(None, *front_addr, **kwargs)
     except Exception as e:
         logger.error(e)
         return False
@@ -228,8 +307,7 @@ def get_settings(*front_addr, **kwargs) -> Union[Any, Tuple[Any, ...]]:
     :return: 包含所请求数据的元组
     """
     try:
-        data = _load_setting()
-        return DictUtils.get_nested_values(data, None, *front_addr, **kwargs)
+        return _setting_doc().read(*front_addr, **kwargs)
     except Exception as e:
         logger.error(e)
         return tuple()
@@ -308,21 +386,12 @@ def fetch_a_setting_or_set_default_or_none(section: str, setting_key: str, enum_
 """账号数据相关，该文件记录账号及登录时期的互斥体情况"""
 
 
-def _load_acc_data() -> dict:
-    """
-    加载账号数据，请在这个方法中修改账号数据的加载方式，如格式、文件位置
-    :return: 账号数据字典
-    """
-    data = JsonUtils.load_json(Config.TAB_ACC_JSON_PATH)
-    return data
-
-
-def _save_acc_data(data) -> bool:
+def _acc_doc() -> CachedJsonDoc:
     """
-    保存账号数据，请在这个方法中修改账号数据的保存方式，如格式、文件位置
-    :param data: 账号数据字典
+    账号数据文档，请在这个方法中修改账号数据的加载及保存方式，如格式、文件位置
+    :return: 账号数据文档
     """
-    return JsonUtils.save_json(Config.TAB_ACC_JSON_PATH, data)
+    return CachedJsonDoc.of(Config.TAB_ACC_JSON_PATH)
 
 
 def clear_some_acc_data(*addr) -> bool:
@@ -332,10 +401,7 @@ def clear_some_acc_data(*addr) -> bool:
     """
     try:
         print(f"清理{addr}处数据...")
-        data = _load_acc_data()
-        DictUtils.clear_nested_values(data, *addr)
-        _save_acc_data(data)
-        return True
+        return _acc_doc().clear_values(*addr)
     except Exception as e:
         logger.error(e)
         return False
@@ -344,10 +410,7 @@ def clear_some_acc_data(*addr) -> bool:
 def update_sw_acc_data(*front_addr, **kwargs) -> bool:
     """更新账户信息到 JSON"""
     try:
-        data = _load_acc_data()
-        success = DictUtils.set_nested_values(data, None, *front_addr, **kwargs)
-        _save_acc_data(data)
-        return success
+        return _acc_doc().set_values(None, *front_addr, **kwargs)
     except Exception as e:
         logger.error(e)
         return False
@@ -361,55 +424,37 @@ def get_sw_acc_data(*front_addr, **kwargs) -> Union[Any, Tuple[Any, ...]]:
     :return: 包含所请求数据的元组
     """
     try:
-        data = _load_acc_data()
-        return DictUtils.get_nested_values(data, None, *front_addr, **kwargs)
+        return _acc_doc().read(*front_addr, **kwargs)
     except Exception as e:
         logger.error(e)
         return tuple(None for _ in kwargs.keys())
 
 
+def acc_batch():
+    """
+    账号数据的批量修改，在 with 块结束时一次性提交:
+        with subfunc_file.acc_batch() as tx:
+            tx.set_nested_values(None, sw, acc, pid=pid, has_mutex=False)
+            tx.clear_nested_values(sw, acc, main_hwnd=None)
+    """
+    return _acc_doc().batch()
+
+
+def flush_user_docs():
+    """将账号数据、本地设置、额外配置中尚未写盘的修改立即写盘，在外部读取或删除这些文件前调用"""
+    CachedJsonDoc.flush_all()
+
+
 """统计数据相关"""
 
+statistic_store = StatisticStore(Config.STATISTIC_SAMPLES_PATH, Config.STATISTIC_HIST_JSON_PATH,
+                                 legacy_path=Config.STATISTIC_JSON_PATH)
+
 
 def update_statistic_data(sw, mode, main_key, sub_key, time_spent):
-    """更新时间统计"""
+    """更新时间统计; 只追加样本, 异常耗时也保留, 体现在最大值和高分位上"""
     print(sw, mode, main_key, sub_key, time_spent)
-    if mode == "manual" and time_spent > 20:
-        return
-    if mode == "auto" and time_spent > 60:
-        return
-    if mode == 'refresh' and time_spent > 2:
-        return
-
-    data = JsonUtils.load_json(Config.STATISTIC_JSON_PATH)
-    if sw not in data:
-        logger.info(f"sw不存在：{sw}")
-        data[sw] = {}
-    tab_info = data.get(sw, {})
-    if mode not in tab_info:
-        logger.info(f"mode不存在：{mode}")
-        tab_info[mode] = {}
-    if main_key not in tab_info[mode]:
-        logger.info(f"main_key不存在：{main_key}")
-        tab_info[mode][main_key] = {}
-    if sub_key not in tab_info[mode][main_key]:
-        logger.info(f"sub_key不存在：{sub_key}")
-        tab_info[mode][main_key][sub_key] = f"{math.inf},0,0,0"  # 初始化为“最短时间, (次数, 平均用时), 最长时间”
-
-    # 获取当前最小、最大值，次数，平均用时
-    current_min, count, avg_time, current_max = map(lambda x: float(x) if x != "null" else 0,
-                                                    tab_info[mode][main_key][sub_key].split(","))
-
-    # 更新最小和最大值
-    new_min = min(current_min or math.inf, time_spent)
-    new_max = max(current_max or 0, time_spent)
-
-    # 更新次数和平均用时
-    new_count = count + 1
-    new_avg_time = (avg_time * count + time_spent) / new_count
-
-    tab_info[mode][main_key][sub_key] = f"{new_min:.4f},{new_count},{new_avg_time:.4f},{new_max:.4f}"
-    JsonUtils.save_json(Config.STATISTIC_JSON_PATH, data)
+    statistic_store.add(sw, mode, main_key, sub_key, time_spent)
 
 
 """软件版本及更新相关"""
@@ -454,108 +499,3 @@ def get_file_with_correct_md5(folders: list, md5s: list):
                     logger.error(e)
     return None  # 如果没有找到匹配项则返回 None
 
-
-def merge_refresh_nodes():
-    """统计数据结构改变后，将所有的节点分流到classic和tree中"""
-    data = JsonUtils.load_json(Config.STATISTIC_JSON_PATH)
-    # 确保 refresh 节点存在
-    if "refresh" not in data or not isinstance(data["refresh"], dict):
-        return data
-
-    print("数据结构调整：需要进行刷新节点分流...")
-    refresh_data = data["refresh"]
-
-    # 初始化 classic 和 tree，如果不存在则创建
-    refresh_data.setdefault("classic", {})
-    refresh_data.setdefault("tree", {})
-
-    # 遍历 refresh 中的所有节点
-    for key, value in list(refresh_data.items()):
-        # 跳过 classic 和 tree 节点
-        if key in ("classic", "tree"):
-            continue
-
-        # 将当前节点合并到 classic
-        if isinstance(value, str):  # 如果是字符串
-            refresh_data["classic"][key] = value
-        elif isinstance(value, dict):  # 如果是字典
-            refresh_data["classic"].update(value)
-
-        # 将当前节点合并到 tree
-        if isinstance(value, str):  # 如果是字符串
-            refresh_data["tree"][key] = value
-        elif isinstance(value, dict):  # 如果是字典
-            refresh_data["tree"].update(value)
-
-        # 删除原始节点
-        del refresh_data[key]
-    JsonUtils.save_json(Config.STATISTIC_JSON_PATH, data)
-    return data
-
-
-def move_data_to_wechat():
-    """统计数据结构改变后，将原本所有的数据移动到WeChat节点下"""
-    data = JsonUtils.load_json(Config.STATISTIC_JSON_PATH)
-
-    # 检查是否已有 "WeChat" 节点
-    if "WeChat" not in data:
-        print("数据结构调整：将数据置于到微信节点下...")
-        wechat_data = {
-            "WeChat": data
-        }
-        JsonUtils.save_json(Config.STATISTIC_JSON_PATH, wechat_data)
-
-
-def swap_cnt_and_mode_levels_in_auto():
-    """将auto表中的次数节点和模式节点交换层级"""
-    data = JsonUtils.load_json(Config.STATISTIC_JSON_PATH)
-    for sw in data.keys():
-        auto_info = data.get(sw, {}).get("auto", {})
-        # print(auto_info)
-
-        # 已经升级结构的标志
-        if 'avg' in auto_info.keys():
-            continue
-
-        print(f"数据结构调整：对调{sw}节点下的二三级层级...")
-        tmp = {}
-        # 交换层级
-        for second_level_key, third_level_dict in auto_info.items():
-            print(auto_info[second_level_key].keys())
-            for third_level_key, value in third_level_dict.items():
-                # 如果第三级键还未在结果字典中初始化，则创建一个新的字典
-                if third_level_key not in tmp:
-                    tmp[third_level_key] = {}
-                # 将二级键作为新的第三级键
-                tmp[third_level_key][second_level_key] = value
-        # print(tmp)
-
-        # 执行完更新后就添加avg节点
-        if 'avg' not in tmp.keys():
-            tmp['avg'] = {}
-
-        # 转换好的结果重新赋给json文件中
-        data[sw]['auto'] = tmp
-    JsonUtils.save_json(Config.STATISTIC_JSON_PATH, data)
-
-
-def downgrade_item_lvl_under_manual():
-    """将manual表中的节点降级"""
-    data = JsonUtils.load_json(Config.STATISTIC_JSON_PATH)
-    for sw in data.keys():
-        manual_info = data.get(sw, {}).get("manual", {})
-        # print(manual_info)
-
-        # 已经升级结构的标志
-        if '_' in manual_info.keys():
-            continue
-
-        print("数据结构调整：将手动节点内容降低一个层级...")
-        tmp = manual_info
-        manual_info = {
-            "_": tmp
-        }
-
-        # 转换好的结果重新赋给json文件中
-        data[sw]['manual'] = manual_info
-    JsonUtils.save_json(Config.STATISTIC_JSON_PATH, data)
@@ -8,8 +8,9 @@ import subprocess
 import threading
 import time
 import winreg
+from collections import OrderedDict
 from tkinter import messagebox
-from typing import Union, Tuple, Optional, List
+from typing import Union, Tuple, Optional, List, Dict, Any
 
 import psutil
 import win32com
@@ -27,14 +28,15 @@ from public.custom_classes import FlowControlError
 from public.enums import LocalCfg, SwEnum, AccKeys, MultirunMode, RemoteCfg, CallMode, WndType
 from public.global_members import GlobalMembers
 from public.strings import NEWER_SYS_VER
-from utils import file_utils, process_utils, handle_utils, hwnd_utils, image_utils
-from utils.better_wx.inner_utils import patt2hex, custom_wildcard_tokenize
-from utils.encoding_utils import VersionUtils, PathUtils, CryptoUtils, ByteUtils
-from utils.file_utils import rw_lock
-from utils.hwnd_utils import HwndGetter, Win32HwndGetter
-from utils.logger_utils import mylogger as logger, Printer, Logger
+from utils import file_utils, process_utils, handle_utils, hwnd_utils, image_utils, pattern_utils, patch_utils, \
+    wait_utils
+from utils.encoding_utils import VersionIndex, PathUtils, CryptoUtils, ByteUtils
+from utils.file_utils import rw_lock, DllUtils, DictUtils
+from utils.hwnd_utils import HwndGetter, Win32HwndGetter, WindowSnapshot
+from utils.logger_utils import mylogger as logger, Printer, Logger, traced
 from utils.logger_utils import myprinter as printer
-from utils.process_utils import Process
+from utils.patch_utils import PatchRuleResolver
+from utils.process_utils import Process, ProcessSnapshot
 
 
 class SwSettings:
@@ -109,7 +111,6 @@ class SwInfoFunc:
     平台sw -> 补丁模式mode -> "channels" -> 方案频道channel -> "feature/precise_ver_adaptations"
      -> 版本号 -> 路径补丁包 -> 补丁包列表
     """
-
     @staticmethod
     def get_sw_class(sw) -> Sw:
         return GlobalMembers.root_class.sw_classes[sw]
@@ -186,6 +187,78 @@ class SwInfoFunc:
                 continue
         return list(addr_set)
 
+    @classmethod
+    def _collect_dll_features(cls, sw, cur_sw_ver) -> Dict[str, pattern_utils.MultiPatternScanner]:
+        """收集当前版本下所有模式、所有通道的规则特征码(含 jmp_offset 的目标特征码), 按文件分组"""
+        scanners = {}
+        for mode, channel_adaptations in cls.resolve_feature_adaptations(sw, cur_sw_ver).items():
+            for channel, addr_dicts in channel_adaptations.items():
+                if not isinstance(addr_dicts, list):
+                    continue
+                for addr_dict in addr_dicts:
+                    addr = addr_dict.get("addr")
+                    rules = addr_dict.get("patch_rules")
+                    if not isinstance(addr, str) or not isinstance(rules, list):
+                        continue
+                    patch_file = cls.resolve_sw_path(sw, addr)
+                    scanner = scanners.setdefault(patch_file, pattern_utils.MultiPatternScanner())
+                    for rule in rules:
+                        try:
+                            scanner.add(pattern_utils.get_compiled_patch_pattern(
+                                rule["original"], rule["modified"],
+                                rule.get("left_cut", 0), rule.get("right_cut", 0)))
+                            for target in rule.get("targets", []):
+                                clean_feature, _ = pattern_utils.split_marked_feature(target)
+                                scanner.add(pattern_utils.get_compiled_feature(clean_feature))
+                        except Exception as e:
+                            logger.warning(f"特征码编译失败: {e}")
+        return scanners
+
+    @staticmethod
+    def _build_feature_adaptation_index(sw_dict) -> Tuple[VersionIndex, Dict[Tuple[str, str], dict]]:
+        """为平台下所有模式、所有渠道的特征码适配版本建立合并索引"""
+        feature_vers_dicts = {}
+        for mode in (RemoteCfg.MULTI, RemoteCfg.REVOKE, RemoteCfg.COEXIST):
+            channels_dict = DictUtils.get_nested_values(sw_dict, None, mode, RemoteCfg.CHANNELS)
+            if not isinstance(channels_dict, dict):
+                continue
+            for channel, channel_dict in channels_dict.items():
+                if isinstance(channel_dict, dict) and isinstance(channel_dict.get(RemoteCfg.FEATURES), dict):
+                    feature_vers_dicts[(mode, channel)] = channel_dict[RemoteCfg.FEATURES]
+        return VersionIndex(feature_vers_dicts), feature_vers_dicts
+
+    @classmethod
+    def resolve_feature_adaptations(cls, sw, cur_sw_ver) -> Dict[str, Dict[str, Any]]:
+        """
+        一次二分查找得到所有模式、所有渠道在当前版本下的兼容特征码适配: {模式: {渠道: 地址字典列表}}
+        没有兼容版本的渠道不出现在结果中; 已弃用的渠道值为 None. 索引每个远程配置快照只构建一次
+        """
+        index, feature_vers_dicts = subfunc_file.derive_from_remote_cfg(
+            ("feature_adaptation_index", sw),
+            lambda data: cls._build_feature_adaptation_index(DictUtils.get_nested_values(data, None, sw)))
+        res = {}
+        for (mode, channel), compatible_ver in index.find_all(cur_sw_ver).items():
+            res.setdefault(mode, {})[channel] = feature_vers_dicts[(mode, channel)][compatible_ver]
+        return res
+
+    @classmethod
+    def _prescan_dll_features(cls, sw, cur_sw_ver) -> Dict[str, dict]:
+        """
+        对每个待补丁文件只做一次多特征码扫描, 返回 {文件路径: {正则字节串: [(地址, 原始字节), ...]}}
+        结果按文件内容指纹持久缓存, 内容不变的文件(含版本号变化、字节相同的共存副本)不会重扫;
+        需要扫描的文件较大时交给进程池并行扫描
+        """
+        file_features = {
+            patch_file: scanner.features
+            for patch_file, scanner in cls._collect_dll_features(sw, cur_sw_ver).items()
+        }
+        try:
+            prescanned = SwInfoUtils.scan_files_with_cache(file_features)
+        except Exception as e:
+            logger.error(e)
+            prescanned = {}
+        return prescanned
+
     @classmethod
     def _update_adaptation_from_remote_to_cache(cls, sw, mode, skip_cache=True):
         """根据远程表内容更新缓存表, skip_cache 决定已有正确格式缓存时是否跳过扫描"""
@@ -194,6 +267,9 @@ class SwInfoFunc:
         if not isinstance(channels_dict, dict):
             return
         cur_sw_ver = cls.calc_sw_ver(sw)
+        # 一次查询得到该模式下所有渠道的兼容特征码适配
+        channel_adaptations = cls.resolve_feature_adaptations(sw, cur_sw_ver).get(mode, {})
+        prescanned = None
         for channel in channels_dict:
             try:
                 precise_ver_adaptation = channels_dict[channel][RemoteCfg.PRECISES][cur_sw_ver]
@@ -205,11 +281,8 @@ class SwInfoFunc:
                 pass
 
             try:
-                feature_vers_dict = channels_dict[channel][RemoteCfg.FEATURES]
-                feature_vers = list(feature_vers_dict.keys())
-                compatible_ver = VersionUtils.pkg_find_compatible_version(cur_sw_ver, feature_vers)
-                # 用兼容版本特征码查找适配
-                feature_ver_addr_dicts = feature_vers_dict[compatible_ver]
+                # 用兼容版本特征码查找适配, 没有兼容版本时抛出 KeyError
+                feature_ver_addr_dicts = channel_adaptations[channel]
                 # 检查是否弃用
                 if feature_ver_addr_dicts is None:
                     Printer().print_vn(f"[INFO]渠道{channel}在该版本已弃用! 删除相应的本地缓存节点...")
@@ -232,6 +305,9 @@ class SwInfoFunc:
                             continue
                 else:
                     Printer().print_vn(f"[INFO]重新扫描! 将不跳过已适配的{channel}渠道!")
+                if prescanned is None:
+                    # 首个需要扫描的通道触发预扫描: 收集所有模式所有通道的特征码, 每个文件只扫一遍
+                    prescanned = cls._prescan_dll_features(sw, cur_sw_ver)
                 ver_addr_res_dicts = []
                 channel_failed = False
                 # 对每个地址的每个扫描字典, 都至少要扫描出一个, 否则判定失败!!!
@@ -247,33 +323,34 @@ class SwInfoFunc:
                         channel_failed = True
                         break
 
-                    with open(patch_file, "rb") as f:
-                        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
-                        addr_res_dicts = []  # 存放本 addr 下所有 processed 结果
-                        try:
-                            addr_failed = False
-                            for feature_rule in addr_feature_list:
-                                # Printer().debug("检查:", mode, channel, addr, feature_rule)
-                                res_dicts = SwInfoUtils.resolve_rule_dict_and_return_res_dicts(mm, feature_rule)
-                                # Printer().debug("结果:", res_dicts)
-                                if len(res_dicts) == 0:
-                                    addr_failed = True
-                                    break
-                                addr_res_dicts.extend(res_dicts)
-                            if len(addr_res_dicts) == 0 or addr_failed is True:
-                                channel_failed = True
+                    mm, is_temp = DllUtils.ensure_mmap(patch_file)
+                    # 用预扫描结果包装, 规则解析时直接取命中结果, 不再逐条扫描文件
+                    scanned = pattern_utils.ScannedData(mm, prescanned.get(patch_file, {}))
+                    addr_res_dicts = []  # 存放本 addr 下所有 processed 结果
+                    try:
+                        addr_failed = False
+                        for feature_rule in addr_feature_list:
+                            # Printer().debug("检查:", mode, channel, addr, feature_rule)
+                            res_dicts = SwInfoUtils.resolve_rule_dict_and_return_res_dicts(scanned, feature_rule)
+                            # Printer().debug("结果:", res_dicts)
+                            if len(res_dicts) == 0:
+                                addr_failed = True
                                 break
-                            # 能到达这里代表当前地址字典能够正常扫描
-                            # 将地址字典中除了 patch_rules 节点外所有节点都拷贝出来, 扫描结果放在 patches 节点中.
-                            for key in addr_dict:
-                                if key == "patch_rules":
-                                    continue
-                                ver_addr_res_dict[key] = addr_dict[key]
-                            ver_addr_res_dict["patches"] = addr_res_dicts
-                            ver_addr_res_dicts.append(ver_addr_res_dict)
-                        finally:
+                            addr_res_dicts.extend(res_dicts)
+                        if len(addr_res_dicts) == 0 or addr_failed is True:
+                            channel_failed = True
+                            break
+                        # 能到达这里代表当前地址字典能够正常扫描
+                        # 将地址字典中除了 patch_rules 节点外所有节点都拷贝出来, 扫描结果放在 patches 节点中.
+                        for key in addr_dict:
+                            if key == "patch_rules":
+                                continue
+                            ver_addr_res_dict[key] = addr_dict[key]
+                        ver_addr_res_dict["patches"] = addr_res_dicts
+                        ver_addr_res_dicts.append(ver_addr_res_dict)
+                    finally:
+                        if is_temp:
                             mm.close()
-                print(ver_addr_res_dicts)
                 if channel_failed is not True:
                     # 添加到缓存表中
                     Printer().print_vn(f"[OK]更新渠道{channel}在该版本的适配成功!")
@@ -408,6 +485,7 @@ class SwInfoFunc:
         return {"status": channel_status, "msg": msg_str}
 
     @classmethod
+    @traced("identify_dll_core", "sw", "mode", "channel")
     def identify_dll_core(
             cls, sw, mode, channel=None, coexist_channel=None, ordinal=None
     ) -> Tuple[Optional[dict], str]:
@@ -483,7 +561,8 @@ class SwInfoFunc:
         if not isinstance(type_vers_dict, dict):
             return None
         curr_ver = SwInfoFunc.calc_sw_ver(sw)
-        compatible_version = VersionUtils.pkg_find_compatible_version(curr_ver, list(type_vers_dict.keys()))
+        version_index = subfunc_file.get_remote_version_index(sw, RemoteCfg.WND_CLASS, wnd_type, "matching")
+        compatible_version = version_index.find(curr_ver)
         # Printer().debug(f"找到合适版本{compatible_version}")
         if compatible_version is None:
             return None
@@ -518,19 +597,21 @@ class SwInfoFunc:
         if not isinstance(type_vers_dict, dict):
             return None
         curr_ver = SwInfoFunc.calc_sw_ver(sw)
-        compatible_version = VersionUtils.pkg_find_compatible_version(curr_ver, list(type_vers_dict.keys()))
+        version_index = subfunc_file.get_remote_version_index(sw, RemoteCfg.WND_CLASS, wnd_type, "original")
+        compatible_version = version_index.find(curr_ver)
         if compatible_version is None:
             return None
         return type_vers_dict[compatible_version]["class_name"]
 
     @staticmethod
-    def get_login_hwnds_of_sw(sw):
-        """获取平台所有的登录窗口句柄"""
+    def get_login_hwnds_of_sw(sw, snapshot: WindowSnapshot = None):
+        """获取平台所有的登录窗口句柄; 所有进程共用一次窗口枚举, 也可传入已有的窗口快照"""
         login_hwnds = []
         login_class_check_dicts = SwInfoFunc.get_sw_wnd_class_matching_dicts(sw, WndType.LOGIN)
         all_sw_pids = SwInfoFunc.get_sw_all_exe_pids(sw)
+        snapshot = snapshot if snapshot is not None else WindowSnapshot.take()
         for pid in all_sw_pids:
-            hwnds_of_pid = Win32HwndGetter.win32_get_hwnds_by_pid_and_class_wildcards(pid)
+            hwnds_of_pid = Win32HwndGetter.win32_get_hwnds_by_pid_and_class_wildcards(pid, snapshot=snapshot)
             for matching_dict in login_class_check_dicts:
                 Printer().print_vn(f"PID: {pid}, 筛选条件: {matching_dict}")
                 hwnd_list = HwndGetter.uiautomation_filter_hwnds_by_matching_dict(hwnds_of_pid, matching_dict)
@@ -541,15 +622,16 @@ class SwInfoFunc:
     @staticmethod
     def ensure_coexist_acc_formatted(sw, coexist_exe):
         coexist_exe_dict = subfunc_file.get_sw_acc_data(sw, coexist_exe)
-        if not isinstance(coexist_exe_dict, dict):
-            subfunc_file.update_sw_acc_data(sw, **{coexist_exe: {}})
-        coexist_exe_dict = subfunc_file.get_sw_acc_data(sw, coexist_exe)
-        if "linked_acc" not in coexist_exe_dict:
-            subfunc_file.update_sw_acc_data(sw, coexist_exe, linked_acc=None)
-        if "channel" not in coexist_exe_dict:
-            subfunc_file.update_sw_acc_data(sw, coexist_exe, channel=None)
-        if RemoteCfg.ORDINALS not in coexist_exe_dict:
-            subfunc_file.update_sw_acc_data(sw, coexist_exe, **{RemoteCfg.ORDINALS: None})
+        with subfunc_file.acc_batch() as tx:
+            if not isinstance(coexist_exe_dict, dict):
+                tx.set_nested_values(None, sw, **{coexist_exe: {}})
+                coexist_exe_dict = {}
+            if "linked_acc" not in coexist_exe_dict:
+                tx.set_nested_values(None, sw, coexist_exe, linked_acc=None)
+            if "channel" not in coexist_exe_dict:
+                tx.set_nested_values(None, sw, coexist_exe, channel=None)
+            if RemoteCfg.ORDINALS not in coexist_exe_dict:
+                tx.set_nested_values(None, sw, coexist_exe, **{RemoteCfg.ORDINALS: None})
 
     @classmethod
     def _get_all_coexist_acc_and_ensure_formatted(cls, sw, inst_dir, executable_wildcards):
@@ -747,22 +829,19 @@ class SwInfoFunc:
         )
         inst_path = cls.try_get_path_of_(sw, LocalCfg.INST_PATH)
         inst_dir = os.path.dirname(inst_path)
-        name_pids_dict = {}
-        if isinstance(executable_wildcards, list):
-            name_pids_dict = process_utils.psutil_get_pids_by_wildcards_and_grouping_to_dict(executable_wildcards)
-        if len(name_pids_dict) == 0:
-            return name_pids_dict
-        # 对每组 pid 分别进行处理
-        for name in name_pids_dict.keys():
-            pid_list = name_pids_dict[name]
-            pid_list = process_utils.remove_child_pids(pid_list)
-            pid_list = process_utils.remove_pids_not_in_path(pid_list, inst_dir)
+        if not isinstance(executable_wildcards, list):
+            return {}
+        snapshot = ProcessSnapshot.current()
+        name_pids_dict = process_utils.psutil_get_pids_by_wildcards_and_grouping_to_dict(
+            executable_wildcards, snapshot)
+        # 对每组 pid 分别进行处理, 若该组全部被过滤则不保留 key
+        result = {}
+        for name, pid_list in name_pids_dict.items():
+            pid_list = process_utils.remove_child_pids(pid_list, snapshot)
+            pid_list = process_utils.remove_pids_not_in_path(pid_list, inst_dir, snapshot)
             if pid_list:
-                name_pids_dict[name] = pid_list
-            else:
-                del name_pids_dict[name]  # 若该组全部被过滤，则删除 key
-
-        return name_pids_dict
+                result[name] = pid_list
+        return result
 
     @classmethod
     def get_sw_all_exe_pids(cls, sw) -> list:
@@ -774,17 +853,22 @@ class SwInfoFunc:
         inst_path = cls.try_get_path_of_(sw, LocalCfg.INST_PATH)
         inst_dir = os.path.dirname(inst_path)
         pids = []
+        snapshot = ProcessSnapshot.current()
         if isinstance(executable_wildcards, list):
-            name_pids_dict = process_utils.psutil_get_pids_by_wildcards_and_grouping_to_dict(executable_wildcards)
+            name_pids_dict = process_utils.psutil_get_pids_by_wildcards_and_grouping_to_dict(
+                executable_wildcards, snapshot)
             pids = [pid for pid_list in name_pids_dict.values() for pid in pid_list]
-        pids = process_utils.remove_child_pids(pids)
-        pids = process_utils.remove_pids_not_in_path(pids, inst_dir)
+        pids = process_utils.remove_child_pids(pids, snapshot)
+        pids = process_utils.remove_pids_not_in_path(pids, inst_dir, snapshot)
 
         return pids
 
     @staticmethod
-    def record_sw_pid_mutex_dict_when_start_login(sw, set_all_to_true=None):
-        """在该平台登录之前,存储 pid 和 互斥体 的映射关系字典, 默认全置为True"""
+    def record_sw_pid_mutex_dict_when_start_login(sw, set_all_to_true=None, pids_has_mutex=None):
+        """
+        在该平台登录之前,存储 pid 和 互斥体 的映射关系字典, 默认全置为True
+        :param pids_has_mutex: 已(批量)查出的含有互斥体的 pid, 传入则不再单独查找
+        """
         pids = SwInfoFunc.get_sw_all_exe_pids(sw)
         pid_mutex_dict = {}
         if isinstance(set_all_to_true, bool):
@@ -803,7 +887,8 @@ class SwInfoFunc:
             else:
                 # 从当前所有进程中获取所有有互斥体的进程
                 Printer().print_vn("[INFO]不默认所有进程含有互斥体, 检查中...")
-                pids_has_mutex = SwOperator.try_kill_mutex_if_need_and_return_remained_pids(sw)
+                if pids_has_mutex is None:
+                    pids_has_mutex = SwOperator.try_kill_mutex_if_need_and_return_remained_pids(sw) or []
                 for p in pids:
                     pid_mutex_dict[p] = True if p in pids_has_mutex else False
         Printer().print_vn(f"[INFO]登录前所有互斥体:{pid_mutex_dict}")
@@ -818,21 +903,24 @@ class SwInfoFunc:
         return pids_has_mutex
 
     @staticmethod
-    def set_pid_mutex_all_values_to_false(sw):
+    def set_pid_mutex_all_values_to_false(sw, tx=None):
         """
         将所有微信进程all_acc中都置为没有互斥体，适合每次成功打开一个登录窗口后使用
         （因为登录好一个窗口，说明之前所有的微信都没有互斥体了）
+        :param tx: 可选，传入 subfunc_file.acc_batch() 的事务对象时并入该事务提交
         :return: 是否成功
         """
         # 加载当前账户数据
         pid_mutex_data = subfunc_file.get_sw_acc_data(AccKeys.RELAY, sw, AccKeys.PID_MUTEX)
-        if pid_mutex_data is None:
+        if not isinstance(pid_mutex_data, dict):
             return False
 
         # 将所有字段的值设置为 False
-        for pid in pid_mutex_data:
-            subfunc_file.update_sw_acc_data(AccKeys.RELAY, sw, AccKeys.PID_MUTEX, **{pid: False})
-        return True
+        all_false = {f"{pid}": False for pid in pid_mutex_data}
+        if tx is not None:
+            tx.set_nested_values(None, AccKeys.RELAY, sw, AccKeys.PID_MUTEX, **all_false)
+            return True
+        return subfunc_file.update_sw_acc_data(AccKeys.RELAY, sw, AccKeys.PID_MUTEX, **all_false)
 
     @staticmethod
     def update_has_mutex_from_pid_mutex(sw):
@@ -848,47 +936,90 @@ class SwInfoFunc:
         if not isinstance(pid_mutex_dict, dict):
             return False, has_mutex
 
-        for acc, acc_details in sw_dict.items():
-            if isinstance(acc_details, dict):
-                pid = acc_details.get(AccKeys.PID, None)
-                if pid is not None:
-                    acc_mutex = pid_mutex_dict.get(f"{pid}", True)
-                    if acc_mutex is True:
-                        has_mutex = True
-                    subfunc_file.update_sw_acc_data(sw, acc, has_mutex=acc_mutex)
+        with subfunc_file.acc_batch() as tx:
+            for acc, acc_details in sw_dict.items():
+                if isinstance(acc_details, dict):
+                    pid = acc_details.get(AccKeys.PID, None)
+                    if pid is not None:
+                        acc_mutex = pid_mutex_dict.get(f"{pid}", True)
+                        if acc_mutex is True:
+                            has_mutex = True
+                        tx.set_nested_values(None, sw, acc, has_mutex=acc_mutex)
         return True, has_mutex
 
 
 class SwOperator:
     @staticmethod
-    def kill_all_mutexes_now(sw):
-        """查杀所有互斥体: 进程互斥体, 配置文件锁"""
-        pids = SwInfoFunc.get_sw_all_exe_pids(sw)
+    def _get_handle_wildcards_of_sw(sw, include_config=True) -> list:
+        """平台的互斥体通配, 可选加上配置文件锁通配"""
         mutant_handle_wildcards, config_handle_wildcards = subfunc_file.get_remote_cfg(
             sw, mutant_handle_wildcards=None, config_handle_wildcards=None)
         handle_wildcards = []
         if isinstance(mutant_handle_wildcards, list):
             handle_wildcards.extend(mutant_handle_wildcards)
-        if isinstance(config_handle_wildcards, list):
+        if include_config and isinstance(config_handle_wildcards, list):
             handle_wildcards.extend(config_handle_wildcards)
-        if isinstance(handle_wildcards, list) and len(handle_wildcards) > 0:
-            handle_infos = handle_utils.pywinhandle_find_handles_by_pids_and_handle_name_wildcards(
-                pids, handle_wildcards)
-            Printer().debug(f"[INFO]查询到互斥体: {handle_infos}")
-            if len(handle_infos) == 0:
-                return True, f"{sw}已经不含互斥体和文件锁!"
-            success = handle_utils.pywinhandle_close_handles(
-                handle_infos
-            )
-            if success is True:
-                return True, f"{sw}已关闭互斥体和解锁文件!"
-            else:
-                return False, f"{sw}关闭互斥体和解锁文件失败!"
-        else:
+        return handle_wildcards
+
+    @classmethod
+    def kill_mutexes_of_sws(cls, sws, include_config=True, close=True, pids_by_sw: Dict[str, list] = None
+                            ) -> Tuple[bool, Dict[str, List[dict]], Dict[str, float]]:
+        """
+        多个平台一起查杀互斥体(及配置文件锁): 只读一次句柄表, 每个进程按所属平台的通配匹配, 按进程关闭
+        :param sws: 平台列表
+        :param include_config: 是否包含配置文件锁
+        :param close: 是否关闭, False 时只查找
+        :param pids_by_sw: 指定各平台的进程, 未指定的平台取其全部进程
+        :return: (是否全部关闭成功, {平台: 匹配到的句柄列表}, 各阶段耗时)
+        """
+        pids_by_sw = pids_by_sw or {}
+        pid_wildcards: Dict[int, list] = {}
+        pid_sw: Dict[int, str] = {}
+        start_time = time.perf_counter()
+        with ProcessSnapshot.shared():
+            for sw in dict.fromkeys(sws):
+                handle_wildcards = cls._get_handle_wildcards_of_sw(sw, include_config)
+                if len(handle_wildcards) == 0:
+                    continue
+                pids = pids_by_sw.get(sw)
+                if pids is None:
+                    pids = SwInfoFunc.get_sw_all_exe_pids(sw)
+                for pid in pids:
+                    pid = int(pid) if isinstance(pid, str) and pid.isdigit() else pid
+                    pid_wildcards.setdefault(pid, []).extend(handle_wildcards)
+                    pid_sw.setdefault(pid, sw)
+        collect_time = time.perf_counter() - start_time
+        success, matched, timings = handle_utils.sweep_handles(
+            pid_wildcards, close, handle_utils.HANDLE_TYPES_OF_INTEREST)
+        timings = {"collect": collect_time, **timings}
+        matched_by_sw: Dict[str, List[dict]] = {sw: [] for sw in sws}
+        for handle_dict in matched:
+            matched_by_sw[pid_sw[handle_dict["process_id"]]].append(handle_dict)
+        Printer().print_vn(f"[INFO]{'查杀' if close else '查找'}互斥体: {matched_by_sw}")
+        Printer().print_vn("[INFO]各阶段用时: " + ", ".join(f"{k}={v:.4f}s" for k, v in timings.items()))
+        return success, matched_by_sw, timings
+
+    @classmethod
+    def find_pids_with_mutex_of_sws(cls, sws) -> Dict[str, list]:
+        """一次扫描查出各平台含有互斥体的 pid"""
+        _, matched_by_sw, _ = cls.kill_mutexes_of_sws(sws, include_config=False, close=False)
+        return {sw: list(dict.fromkeys(h['process_id'] for h in handles)) for sw, handles in matched_by_sw.items()}
+
+    @classmethod
+    def kill_all_mutexes_now(cls, sw):
+        """查杀所有互斥体: 进程互斥体, 配置文件锁"""
+        if len(cls._get_handle_wildcards_of_sw(sw)) == 0:
             return False, f"未查询到{sw}的互斥体列表和配置文件列表!"
+        success, matched_by_sw, _ = cls.kill_mutexes_of_sws([sw])
+        if len(matched_by_sw[sw]) == 0:
+            return True, f"{sw}已经不含互斥体和文件锁!"
+        if success is True:
+            return True, f"{sw}已关闭互斥体和解锁文件!"
+        else:
+            return False, f"{sw}关闭互斥体和解锁文件失败!"
 
-    @staticmethod
-    def try_kill_mutex_if_need_and_return_remained_pids(sw, kill=None):
+    @classmethod
+    def try_kill_mutex_if_need_and_return_remained_pids(cls, sw, kill=None):
         """检查并可选择是否关闭互斥体, 返回剩余的含有互斥体的 pid 列表"""
         mutant_wildcards, = subfunc_file.get_remote_cfg(
             sw,
@@ -897,20 +1028,13 @@ class SwOperator:
         if not isinstance(mutant_wildcards, list):
             print("未获取到互斥体通配词,将不进行查找...")
             return None
-        pids_with_mutex = []
         pids = SwInfoFunc.get_sw_all_exe_pids(sw)
         Printer().debug(f"当前所有进程: {pids}")
-        mutant_handle_dicts = handle_utils.pywinhandle_find_handles_by_pids_and_handle_name_wildcards(
-            pids, mutant_wildcards)
-        Printer().debug(f"查杀前所有互斥体: {mutant_handle_dicts}")
-        if kill is True and len(mutant_handle_dicts) != 0:
-            handle_utils.pywinhandle_close_handles(mutant_handle_dicts)
-            mutant_handle_dicts = handle_utils.pywinhandle_find_handles_by_pids_and_handle_name_wildcards(
-                pids, mutant_wildcards)
-            Printer().debug(f"查杀后所有互斥体: {mutant_handle_dicts}")
-        for mutant_handle in mutant_handle_dicts:
-            pids_with_mutex.append(mutant_handle['process_id'])
-        return pids_with_mutex
+        if kill is True:
+            cls.kill_mutexes_of_sws([sw], include_config=False, pids_by_sw={sw: pids})
+        _, matched_by_sw, _ = cls.kill_mutexes_of_sws(
+            [sw], include_config=False, close=False, pids_by_sw={sw: pids})
+        return list(dict.fromkeys(h['process_id'] for h in matched_by_sw[sw]))
 
     @staticmethod
     def _ask_for_manual_terminate_or_force(sw_exe_path):
@@ -1116,11 +1240,14 @@ class SwOperator:
 
     @staticmethod
     def _wait_hwnds_close_and_do_in_root(hwnds, timeout=20, callback=None):
-        """等待所有窗口成功关闭后, 主线程执行 callback, 失败则不执行"""
+        """登记等待, 所有窗口成功关闭后主线程执行 callback, 超时则不执行; 不阻塞当前线程"""
         root = GlobalMembers.root_class.root
-        success = hwnd_utils.wait_hwnds_close(hwnds, timeout)
-        if success and callable(callback):
-            root.after(0, callback)
+
+        def on_done(success):
+            if success and callable(callback):
+                root.after(0, callback)
+
+        wait_utils.timed_waiter.wait_until(wait_utils.windows_closed(hwnds), timeout, on_done)
 
     @classmethod
     def open_sw_and_return_hwnd(cls, sw, exe=None) -> Tuple[Optional[int], str]:
@@ -1197,13 +1324,14 @@ class SwOperator:
                     return False, "用户取消创建！"
                 break
             # 检测是否登录
-            exe_pids_dict = process_utils.psutil_get_pids_by_wildcards_and_grouping_to_dict([exe_name])
+            snapshot = ProcessSnapshot.current()
+            exe_pids_dict = process_utils.psutil_get_pids_by_wildcards_and_grouping_to_dict([exe_name], snapshot)
             if not isinstance(exe_pids_dict, dict):
                 break
             exe_pids = exe_pids_dict.get(exe_name, [])
             if len(exe_pids) == 0:
                 break
-            exe_pids = process_utils.remove_pids_not_in_path(exe_pids, coexist_exe_path)
+            exe_pids = process_utils.remove_pids_not_in_path(exe_pids, coexist_exe_path, snapshot)
             if len(exe_pids) == 0:
                 break
 
@@ -1395,12 +1523,16 @@ class SwOperator:
         pids = SwInfoFunc.get_sw_all_exe_pids(sw)
         print(f"获取到的{sw}进程列表：{pids}")
         has_mutex_dict = dict()
-        for pid in pids:
-            # 没有在all_wechat节点中，则这个是尚未判断的，默认有互斥体
-            has_mutex, = subfunc_file.get_sw_acc_data(AccKeys.RELAY, sw, AccKeys.PID_MUTEX, **{f"{pid}": None})
-            if has_mutex is None:
-                subfunc_file.update_sw_acc_data(AccKeys.RELAY, sw, AccKeys.PID_MUTEX, **{f"{pid}": True})
-                has_mutex_dict.update({pid: has_mutex})
+        pid_mutex_dict = subfunc_file.get_sw_acc_data(AccKeys.RELAY, sw, AccKeys.PID_MUTEX)
+        if not isinstance(pid_mutex_dict, dict):
+            pid_mutex_dict = {}
+        with subfunc_file.acc_batch() as tx:
+            for pid in pids:
+                # 没有在all_wechat节点中，则这个是尚未判断的，默认有互斥体
+                has_mutex = pid_mutex_dict.get(f"{pid}", None)
+                if has_mutex is None:
+                    tx.set_nested_values(None, AccKeys.RELAY, sw, AccKeys.PID_MUTEX, **{f"{pid}": True})
+                    has_mutex_dict.update({pid: has_mutex})
         print(f"获取互斥体情况完成!互斥体列表：{has_mutex_dict}")
         return has_mutex_dict
 
@@ -1473,6 +1605,7 @@ class SwOperator:
             return process_utils.create_process_for_win7(executable, args, creation_flags)
 
     @classmethod
+    @traced("open_sw", "sw", "exe")
     def open_sw(cls, sw, exe=None) -> Tuple[Optional[Process], Optional[Process]]:
         """
         根据状态以不同方式打开微信
@@ -1499,10 +1632,7 @@ class SwOperator:
             pids_has_mutex = SwInfoFunc.get_pids_has_mutex_from_record(sw)
             if len(pids_has_mutex) > 0 and len(mutant_handle_wildcards) > 0:
                 Printer().print_vn(f"[INFO]以下进程含有互斥体：{pids_has_mutex}", )
-                handle_infos = handle_utils.pywinhandle_find_handles_by_pids_and_handle_name_wildcards(
-                    pids_has_mutex, mutant_handle_wildcards)
-                Printer().debug(f"[INFO]查询到互斥体：{handle_infos}")
-                handle_utils.pywinhandle_close_handles(handle_infos)
+                SwOperator.kill_mutexes_of_sws([sw], include_config=False, pids_by_sw={sw: pids_has_mutex})
             proc = cls.create_process_without_admin(sw_path, None)
         else:
             # 其余的多开模式
@@ -1510,10 +1640,10 @@ class SwOperator:
         return proc, sub_proc
 
     @classmethod
-    def get_idle_login_wnd_and_close_if_necessary(cls, sw, close=False):
-        """获取所有多余窗口,如果有需要,关闭这些窗口"""
+    def get_idle_login_wnd_and_close_if_necessary(cls, sw, close=False, snapshot: WindowSnapshot = None):
+        """获取所有多余窗口,如果有需要,关闭这些窗口; 可传入已有的窗口快照"""
         # 多余的窗口: 登录窗口 + 多开器进程
-        all_idle_hwnds = SwInfoFunc.get_login_hwnds_of_sw(sw)
+        all_idle_hwnds = SwInfoFunc.get_login_hwnds_of_sw(sw, snapshot)
         all_idle_hwnds_set = set(all_idle_hwnds)
         Printer().print_vn(f"[INFO]{sw}登录任务前已存在的登录窗口：{all_idle_hwnds}")
         if close:
@@ -1741,374 +1871,174 @@ class SwInfoUtils:
                 logger.error(f"发生意外错误: {e}")
         return results
 
+    # 规则解析见 patch_utils, 这里注入带缓存的扫描与扫描追踪
+    _rule_resolver: Optional[PatchRuleResolver] = None
+
+    @classmethod
+    def get_rule_resolver(cls) -> PatchRuleResolver:
+        if cls._rule_resolver is None:
+            cls._rule_resolver = PatchRuleResolver(
+                scan_features=cls.scan_features_with_cache,
+                record_scan=lambda *args: Printer().scan_trace.record(*args))
+        return cls._rule_resolver
+
     @classmethod
     def _resolve_simple_rule(cls, mm, patching_rule_dict):
-        """
-        simple类型的特征字典节点: 基本节点, 其余节点
-        """
-        # 调用扫描函数, 扫描函数会返回字典列表, 字典含有offset, original, modified节点
-        original_feature = patching_rule_dict["original"]
-        modified_feature = patching_rule_dict["modified"]
-        left_cut = patching_rule_dict.get("left_cut", 0)
-        right_cut = patching_rule_dict.get("right_cut", 0)
-        simple_res_dicts = cls.search_pattern_dicts_by_original_and_modified(
-            mm, original_feature, modified_feature, left_cut, right_cut)
-        # 补充额外节点
-        for key in patching_rule_dict:
-            if key in ["type", "original", "modified", "left_cut", "right_cut"]:
-                continue
-            for simple_res_dict in simple_res_dicts:
-                simple_res_dict[key] = patching_rule_dict[key]
-        return simple_res_dicts
+        return cls.get_rule_resolver().resolve_simple_rule(mm, patching_rule_dict)
 
     @classmethod
     def _resolve_custom_rule(cls, mm, patching_rule_dict):
-        """
-        custom类型的特征字典节点: 基本节点, 其余节点
-        """
-        # 调用扫描函数, 扫描函数会返回字典列表, 字典含有offset, original, modified节点
-        original_feature = patching_rule_dict["original"]
-        modified_feature = patching_rule_dict["modified"]
-        left_cut = patching_rule_dict.get("left_cut", 0)
-        right_cut = patching_rule_dict.get("right_cut", 0)
-        simple_res_dicts = cls.search_pattern_dicts_by_original_and_modified(
-            mm, original_feature, modified_feature, left_cut, right_cut)
-        # 补充额外节点
-        for key in patching_rule_dict:
-            if key in ["type", "original", "modified", "left_cut", "right_cut"]:
-                continue
-            for simple_res_dict in simple_res_dicts:
-                simple_res_dict[key] = patching_rule_dict[key]
-        for simple_res_dict in simple_res_dicts:
-            simple_res_dict["customizable"] = True
-        return simple_res_dicts
+        return cls.get_rule_resolver().resolve_custom_rule(mm, patching_rule_dict)
 
     @classmethod
     def _resolve_jmp_offset_rule(cls, mm, patching_rule_dict: dict) -> List[dict]:
-        """
-        jmp_offset类型的特征字典节点:
-            基本节点, 待计算的地址!! !! !! !!所指向区域的特征, 其余节点
-        """
-        res_dicts = []
-
-        # 预处理 target_features -> target_addrs
-        target_features = patching_rule_dict.get("targets", [])
-        target_res_dicts = SwInfoUtils.search_first_pattern_and_get_address_of_marked(mm, target_features)
-        target_addrs = [d["marked_addr"] for d in target_res_dicts]
-        if len(target_addrs) != len(target_features):
-            Logger().warning("target_features 数量与 target_addrs 数量不一致")
-            return []
-
-        # 调用扫描函数, 返回待填充的字典列表, 字典含有offset, original, modified节点
-        original_feature = patching_rule_dict.get("original")
-        modified_feature = patching_rule_dict.get("modified")
-        left_cut = patching_rule_dict.get("left_cut", 0)
-        right_cut = patching_rule_dict.get("right_cut", 0)
-        unfilled_res_dicts = cls.search_pattern_dicts_by_original_and_modified(
-            mm, original_feature, modified_feature, left_cut, right_cut)
-
-        # 遍历所有扫描到的 res_dict 并填充修改串中的 !!, 若有无法填充的!!段则宣告失败
-        for unfilled_res_dict in unfilled_res_dicts:
-            target_addr_idx = 0  # 目标地址索引
-            start_addr = unfilled_res_dict["offset"]
-            original_str = unfilled_res_dict["original"]
-            expanded_modified = unfilled_res_dict["modified"]
-            # 滑动窗口扫描
-            tokens = expanded_modified.split()
-            i = 0
-            while i < len(tokens):
-                if tokens[i] != "!!":
-                    i += 1
-                else:
-                    j = i
-                    while j < len(tokens) and tokens[j] == "!!":
-                        j += 1
-                    # 此时 i~j-1 是连续 !!
-                    relative_pos = i
-                    length = j - i
-                    if length != 4:
-                        Logger().warning("!!连续长度必须为4")
-                        return []  # 长度小于4则失败
-
-                    if target_addr_idx >= len(target_addrs):
-                        Logger().warning("所有可用的target_addr用完仍有!!待填充, 视为失败")
-                        return []  # target 不够
-                    target_addr = target_addrs[target_addr_idx]
-                    target_addr_idx += 1
-
-                    if target_addr is None:
-                        Logger().warning(f"某个目标特征未扫描到匹配串, 无目标地址")
-                        return []  # 有某个目标地址未获得, 填充失败
-                    print(f"目标地址: {target_addr}")
-                    next_instr_addr = start_addr + relative_pos + length
-                    print(f"下一条指令地址: {next_instr_addr}")
-                    offset = target_addr - next_instr_addr
-                    # 计算成小端序 4 字节 hex
-                    offset_hex = ByteUtils.int_to_little_endian_hex(offset, 4)
-                    print(f"作差计算偏移并小端存储: {offset_hex}")
-
-                    # 直接替换连续 !!
-                    replace_parts = offset_hex.split()
-                    if len(replace_parts) != 4:
-                        Logger().warning(f"小端序地址字节 {replace_parts} 长度不为4!")
-                        return []  # 替换字节长度 {len(replace_parts)} 与连续 !! 长度 {length} 不匹配")
-                    tokens[i:j] = replace_parts
-                    filled_modified = " ".join(tokens)
-                    print(f"偏移写入后的补丁串: {filled_modified}")
-
-                    i = j
-
-            filled_modified = " ".join(tokens)
-            res_dicts.append(
-                {
-                    "offset": start_addr,
-                    "original": original_str,
-                    "modified": filled_modified
-                }
-            )
-
-        # 补充额外节点
-        for key in patching_rule_dict:
-            if key in ["type", "original", "modified", "left_cut", "right_cut", "targets"]:
-                continue
-            for res_dict in res_dicts:
-                res_dict[key] = patching_rule_dict[key]
-
-        return res_dicts
+        return cls.get_rule_resolver().resolve_jmp_offset_rule(mm, patching_rule_dict)
 
     @classmethod
-    def resolve_rule_dict_and_return_res_dicts(cls, mm, feature_rule_dict: dict) -> List[dict]:
+    def resolve_rule_dict_and_return_res_dicts(cls, mm, feature_rule_dict: dict, fingerprint: str = None) -> List[dict]:
         """
-        各类型基本节点: 原始特征码original, 修改特征码modified, 截断字节长度???_cut(可选, 没有则认为截断长度为0)
-        输出符合特征的字典列表, 字典节点: 截断后的地址偏移offset, 截断后的原始串original, 截断后的修改串modified, 特征字典中的其余节点
+        按规则类型输出符合特征的补丁字典列表
+        :param mm: 文件映射, 或已包装预扫描结果的 ScannedData(逐条解析多条规则时应预先包装一次)
+        :param fingerprint: 文件映射的内容指纹; 传入时走带缓存的扫描, 不传则直接扫描, 不对整个文件计算摘要
         """
-        res_dicts = []
-        if feature_rule_dict.get("type") == "simple":
-            simple_res_dicts = cls._resolve_simple_rule(mm, feature_rule_dict)
-            if isinstance(simple_res_dicts, list):
-                res_dicts.extend(simple_res_dicts)
-
-        elif feature_rule_dict.get("type") == "custom":
-            custom_res_dicts = cls._resolve_custom_rule(mm, feature_rule_dict)
-            if isinstance(custom_res_dicts, list):
-                res_dicts.extend(custom_res_dicts)
-
-        elif feature_rule_dict.get("type") == "jmp_offset":
-            jmp_offset_res_dicts = cls._resolve_jmp_offset_rule(mm, feature_rule_dict)
-            if isinstance(jmp_offset_res_dicts, list):
-                res_dicts.extend(jmp_offset_res_dicts)
-
-        else:
-            print("未知类型")
-
-        return res_dicts
-
-    @staticmethod
-    def _get_replacement_pairs(mm, regex, repl_bytes):
-        """返回(匹配的串, 相应替换后的串, 匹配起始地址)元组列表"""
-        replacement_pairs = []
-        with rw_lock.gen_rlock():
-            matches = list(regex.finditer(mm))
-        for match in matches:
-            start_addr = match.start()
-            original = match.group()  # 原始匹配的字节串
-            replaced = regex.sub(repl_bytes, original)  # 替换后的字节串
-            replacement_pairs.append({
-                "addr": start_addr,
-                "original": original,
-                "modified": replaced
-            })
-        return replacement_pairs
+        return cls.get_rule_resolver().resolve_rule_dict_and_return_res_dicts(mm, feature_rule_dict, fingerprint)
 
     @staticmethod
     def bytes_to_hex_str(byte_data) -> str:
         """将 bytes 转换为 'xx xx xx' 形式的十六进制字符串"""
-        return ' '.join([f"{byte:02x}" for byte in byte_data])
+        return patch_utils.bytes_to_hex_str(byte_data)
 
     @staticmethod
     def convert_hex_to_list_and_align_modified_to_original(
             original_hex, modified_hex, left_cut=0, right_cut=0) -> Optional[Tuple[list, list]]:
-        # === 分词原始串并检验 ===
-        listed_original_hex = custom_wildcard_tokenize(original_hex)
-        if (not isinstance(listed_original_hex, list) or len(listed_original_hex) == 0
-                or len(listed_original_hex) <= left_cut + right_cut or "..." in listed_original_hex):
-            print(f"[ERR] 原始特征码格式错误!")
-            return None
+        return pattern_utils.align_modified_to_original(original_hex, modified_hex, left_cut, right_cut)
 
-        # === 分词修改串并检验 ===
-        listed_modified_hex = custom_wildcard_tokenize(modified_hex)
-        if not isinstance(listed_modified_hex, list) or len(listed_modified_hex) == 0:
-            print(f"[ERR] 修改特征码格式错误!")
-            return None
-        # === 修改串处理 ===
-        truncated_len = len(listed_original_hex) - left_cut - right_cut
-        if listed_modified_hex[0] is ...:
-            # 向前补齐到截断后的长度
-            if len(listed_modified_hex) - 1 > truncated_len:
-                print(f"[ERR] Modified pattern too long: <{patt2hex(listed_modified_hex)}>")
-                return None
-            listed_modified_hex = (
-                    ["??"] * (truncated_len - (len(listed_modified_hex) - 1))
-                    + listed_modified_hex[1:]
-            )
-        elif ... not in listed_modified_hex:
-            # 向后补齐到截断后的长度
-            if len(listed_modified_hex) > truncated_len:
-                print(f"[ERR] Modified pattern too long: <{patt2hex(listed_modified_hex)}>")
-                return None
-            listed_modified_hex += ["??"] * (truncated_len - len(listed_modified_hex))
-        else:
-            # ... 出现在中间位置 → 错误
-            print(f"[ERR] Wildcard <{patt2hex(listed_modified_hex)}> has invalid token ...")
-            return None
-        # === 最后统一补齐左右 cut ===
-        listed_modified_hex = ["??"] * left_cut + listed_modified_hex + ["??"] * right_cut
-        # === 校验最终长度 ===
-        if len(listed_modified_hex) != len(listed_original_hex):
-            print(f"[ERR] Pattern and listed_modified_hex length mismatch")
-            return None
-
-        return listed_original_hex, listed_modified_hex
+    # 进程内的扫描结果: {内容指纹: {正则字节串: [(地址, 原始字节), ...]}}, 与磁盘缓存一样只保留最近使用的若干个指纹
+    _scan_memo: "OrderedDict[str, Dict[bytes, list]]" = OrderedDict()
+    _scan_memo_lock = threading.Lock()
+    # 待扫描文件总大小达到该值时才启用进程池, 小文件直接在本进程扫描更快
+    PARALLEL_SCAN_MIN_BYTES = 16 * 1024 * 1024
+    # 单个文件超过该大小时按块切分, 让单个大文件也能用满所有核
+    PARALLEL_SCAN_CHUNK_BYTES = 8 * 1024 * 1024
 
     @classmethod
-    def search_pattern_dicts_by_original_and_modified(
-            cls, mm, original_hex: str, modified_hex: str,
-            left_cut: int = 0, right_cut: int = 0) -> Optional[List[dict]]:
-        """
-        根据特征码得到所有符合的补丁字典
-        :param mm: 数据
-        :param original_hex: 原始特征码字符串
-        :param modified_hex: 修改后的特征码字符串（可包含...）
-        :param left_cut: 左截断字节数
-        :param right_cut: 右截断字节数
-        :return: List[Dict{offset, original, modified}]
-        """
-
-        res_dicts = []
+    def _memo_of(cls, fingerprint) -> Dict[bytes, list]:
+        """取某指纹的进程内结果并标记为最近使用, 超出上限时先淘汰最早使用的指纹"""
+        with cls._scan_memo_lock:
+            memo = cls._scan_memo.get(fingerprint)
+            if memo is None:
+                memo = cls._scan_memo[fingerprint] = {}
+            cls._scan_memo.move_to_end(fingerprint)
+            while len(cls._scan_memo) > subfunc_file.SCAN_CACHE_MAX_FILES:
+                cls._scan_memo.popitem(last=False)
+            return memo
 
-        print("--------------------------------------------------------")
-        print(f"原始特征码: {original_hex}")
-        print(f"补丁特征码: {modified_hex}")
-
-        try:
-            listed_original_hex, listed_modified_hex = cls.convert_hex_to_list_and_align_modified_to_original(
-                original_hex, modified_hex, left_cut, right_cut
-            )
-            if (not isinstance(listed_original_hex, list) or not isinstance(listed_modified_hex, list)
-                    or len(listed_original_hex) != len(listed_modified_hex)):
-                print(f"[ERR] Pattern and listed_modified_hex length mismatch")
-                return None
-        except Exception as e:
-            print(f"[ERR] {e}")
-            return None
+    @classmethod
+    def _get_unscanned_features(cls, fingerprint, features: list) -> Tuple[Dict[bytes, list], list]:
+        """从进程内与磁盘缓存中取回已有结果, 返回该指纹的进程内结果及仍需扫描的特征码"""
+        memo = cls._memo_of(fingerprint)
+        missing = [f for f in features if f.regex_bytes not in memo]
+        if missing:
+            stored = subfunc_file.get_scan_cache(fingerprint)
+            for feature in missing:
+                encoded = stored.get(pattern_utils.feature_key(feature))
+                if isinstance(encoded, list):
+                    memo[feature.regex_bytes] = pattern_utils.decode_matches(encoded)
+        return memo, list({f.regex_bytes: f for f in missing if f.regex_bytes not in memo}.values())
 
-        print(f"> 特征码翻译: {patt2hex(listed_original_hex, 0)} => {patt2hex(listed_modified_hex, 0)}")
-
-        # print(f"构建正则表达式和替换模式：对原始的:将??替换为(.);对补丁和替换:非??则保持,对??的话,若原始为??,则替换为(.)和补位符号,否则摘抄原始值")
-        original_regex_bytes = b""
-        modified_regex_bytes = b""
-        repl_bytes = b""
-        group_count = 1
-        repl_pos_list = []  # 索引列表
-        cur_pos = 0
-        for p, r in zip(listed_original_hex, listed_modified_hex):
-            if p == "??":
-                original_regex_bytes += b"(.)"
-                if r == "??":
-                    repl_bytes += b"\\" + str(group_count).encode()
-                    modified_regex_bytes += b"(.)"
-                elif r == "!!":
-                    repl_bytes += b"!"
-                    modified_regex_bytes += re.escape(b"!")
-                    repl_pos_list.append(cur_pos)
-                else:
-                    repl_bytes += bytes.fromhex(r)
-                    modified_regex_bytes += re.escape(bytes.fromhex(r))
-                group_count += 1
-            else:
-                original_regex_bytes += re.escape(bytes.fromhex(p))
-                if r == "??":
-                    repl_bytes += bytes.fromhex(p)
-                    modified_regex_bytes += re.escape(bytes.fromhex(p))
-                elif r == "!!":
-                    repl_bytes += b"!"
-                    modified_regex_bytes += re.escape(b"!")
-                    repl_pos_list.append(cur_pos)
-                else:
-                    repl_bytes += bytes.fromhex(r)
-                    modified_regex_bytes += re.escape(bytes.fromhex(r))
-            cur_pos += 1
-        print("构建匹配模式：")
-        print(f"original_regex_bytes: {original_regex_bytes}")
-        print(f"modified_regex_bytes: {modified_regex_bytes}")
-        print(f"repl_bytes: {repl_bytes}")
-        if len(original_regex_bytes) == 0:
-            return None
-        # print(f"regex_hex: {bytes_to_hex_str(original_regex_bytes)}")
-        # print(f"patched_hex: {bytes_to_hex_str(modified_regex_bytes)}")
-        # print(f"repl_hex: {bytes_to_hex_str(repl_bytes)}")
-        original_regex = re.compile(original_regex_bytes, re.DOTALL)
-
-        pairs = SwInfoUtils._get_replacement_pairs(mm, original_regex, repl_bytes)
-        if len(pairs) == 0:
-            print("未识别到特征码")
-            return None
+    @staticmethod
+    def _save_scan_results(memo, fingerprint, features: list, matches: Dict[bytes, list]):
+        memo.update(matches)
+        subfunc_file.update_scan_cache(fingerprint, **{
+            pattern_utils.feature_key(f): pattern_utils.encode_matches(matches[f.regex_bytes]) for f in features
+        })
 
-        for pair_dict in pairs:
-            original_bytes = pair_dict["original"]
-            modified_bytes = pair_dict["modified"]
-            start_addr = pair_dict["addr"]
-
-            original_hex_str = SwInfoUtils.bytes_to_hex_str(original_bytes)
-            modified_hex_str = SwInfoUtils.bytes_to_hex_str(modified_bytes)
-
-            # repl_pos_list 中记录的是第几个字节需要替换
-            for pos in repl_pos_list:
-                hex_pos = pos * 3  # 每个字节对应两个 hex 字符和一个空格
-                modified_hex_str = modified_hex_str[:hex_pos] + "!!" + modified_hex_str[hex_pos + 2:]
-
-            # === 在扫描后进行截断 ===
-            if left_cut or right_cut:
-                orig_list = original_hex_str.split()
-                mod_list = modified_hex_str.split()
-                orig_list = orig_list[left_cut: len(orig_list) - right_cut]
-                mod_list = mod_list[left_cut: len(mod_list) - right_cut]
-                original_hex_str = " ".join(orig_list)
-                modified_hex_str = " ".join(mod_list)
-                start_addr += left_cut  # 重新计算偏移
-
-            print("识别到：")
-            print(f"Original: {original_hex_str}")
-            print(f"Modified: {modified_hex_str}")
-
-            # 每条记录封装成字典存入列表
-            res_dicts.append({
-                "offset": start_addr,
-                "original": original_hex_str,
-                "modified": modified_hex_str
-            })
+    @classmethod
+    def scan_features_with_cache(cls, data, features: list, fingerprint: str = None) -> Dict[bytes, list]:
+        """
+        扫描一组已编译特征码, 结果按 数据内容指纹 + 特征码键 缓存(进程内 + 磁盘);
+        只有缓存中没有的特征才会进入一次多特征码扫描
+        :param data: mmap 或 bytes
+        :param features: CompiledFeature 列表
+        :param fingerprint: 内容指纹, 传入文件路径对应的指纹可免去对 data 计算摘要
+        :return: {正则字节串: [(地址, 原始字节), ...]}
+        """
+        features = [f for f in features if f is not None]
+        if len(features) == 0:
+            return {}
+        if fingerprint is None:
+            with rw_lock.gen_rlock():
+                fingerprint = pattern_utils.content_fingerprint(data)
+        memo, missing = cls._get_unscanned_features(fingerprint, features)
+        if missing:
+            scanner = pattern_utils.MultiPatternScanner(missing)
+            start_time = time.perf_counter()
+            with rw_lock.gen_rlock():
+                new_matches = scanner.scan(data)
+            Printer().print_vn(
+                f"[INFO]单遍扫描{len(scanner)}个特征码, 用时{time.perf_counter() - start_time:.3f}s")
+            cls._save_scan_results(memo, fingerprint, missing, new_matches)
+        return {f.regex_bytes: memo[f.regex_bytes] for f in features}
 
-        return res_dicts
+    @classmethod
+    def scan_files_with_cache(cls, file_features: Dict[str, list]) -> Dict[str, Dict[bytes, list]]:
+        """
+        扫描多个文件的特征码, 缓存规则同 scan_features_with_cache;
+        未命中缓存的部分总量较大时, 以 (文件, 特征组/块) 为任务分发到进程池并行扫描
+        :param file_features: {文件路径: CompiledFeature 列表}
+        :return: {文件路径: {正则字节串: [(地址, 原始字节), ...]}}
+        """
+        file_features = {path: [f for f in features if f is not None] for path, features in file_features.items()}
+        fingerprints = {}
+        memos = {}
+        missing_dict = {}
+        for path, features in file_features.items():
+            if len(features) == 0 or not os.path.exists(path):
+                continue
+            fingerprints[path] = pattern_utils.file_fingerprint(path)
+            memos[path], missing = cls._get_unscanned_features(fingerprints[path], features)
+            if missing:
+                missing_dict[path] = missing
+
+        if missing_dict:
+            start_time = time.perf_counter()
+            total_bytes = sum(os.path.getsize(path) for path in missing_dict)
+            scanned = None
+            if total_bytes >= cls.PARALLEL_SCAN_MIN_BYTES and (os.cpu_count() or 1) > 1:
+                try:
+                    with rw_lock.gen_rlock():
+                        scanned = pattern_utils.scan_files_parallel(
+                            missing_dict, chunk_size=cls.PARALLEL_SCAN_CHUNK_BYTES)
+                except Exception as e:
+                    logger.warning(f"并行扫描失败, 改为单进程扫描: {e}")
+            if scanned is None:
+                scanned = {}
+                for path, missing in missing_dict.items():
+                    mm, is_temp = DllUtils.ensure_mmap(path)
+                    try:
+                        with rw_lock.gen_rlock():
+                            scanned[path] = pattern_utils.MultiPatternScanner(missing).scan(mm)
+                    finally:
+                        if is_temp:
+                            mm.close()
+            Printer().print_vn(
+                f"[INFO]扫描{len(missing_dict)}个文件共{sum(len(m) for m in missing_dict.values())}个特征码, "
+                f"用时{time.perf_counter() - start_time:.3f}s")
+            for path, missing in missing_dict.items():
+                cls._save_scan_results(memos[path], fingerprints[path], missing, scanned[path])
+
+        results = {}
+        for path, memo in memos.items():
+            results[path] = {f.regex_bytes: memo[f.regex_bytes] for f in file_features[path]}
+        return results
 
-    @staticmethod
-    def _calc_feature_to_regex(feature) -> Optional[re.Pattern]:
-        # 分词处理
-        listed_target_hex = custom_wildcard_tokenize(feature)
-        # 检查非法 ... 使用
-        if ... in listed_target_hex:
-            print(f"[ERR] Wildcard <{patt2hex(listed_target_hex)}> has invalid token ...")
-            return None
-        # 构建正则表达式
-        regex_bytes = b""
-        for p in listed_target_hex:
-            if p == "??":
-                regex_bytes += b"(.)"
-            else:
-                regex_bytes += re.escape(bytes.fromhex(p))
-        print("构建匹配模式：")
-        print(f"regex_bytes: {regex_bytes}")
-        regex = re.compile(regex_bytes, re.DOTALL)
-        return regex
+    @classmethod
+    def search_pattern_dicts_by_original_and_modified(
+            cls, mm, original_hex: str, modified_hex: str,
+            left_cut: int = 0, right_cut: int = 0) -> Optional[List[dict]]:
+        """根据特征码得到所有符合的补丁字典: List[Dict{offset, original, modified}]"""
+        return cls.get_rule_resolver().search_pattern_dicts_by_original_and_modified(
+            mm, original_hex, modified_hex, left_cut, right_cut)
 
     @classmethod
     def search_patterns_by_features(cls, dll_path: str, features: list) -> Optional[List[dict]]:
@@ -2119,30 +2049,31 @@ class SwInfoUtils:
         :return: [{'original': 匹配到的原始串, 'addr': 起始地址}, ...]
         """
         res_dicts = []
-        with open(dll_path, "rb") as f:
-            data = f.read()
+        compiled_features = []
         for feature in features:
-            print("--------------------------------------------------------")
-            print(f"目标特征码: {feature}")
-            regex = cls._calc_feature_to_regex(feature)
-            if regex is None:
+            try:
+                compiled_features.append(pattern_utils.get_compiled_feature(feature))
+            except Exception as e:
+                print(f"[ERR] {e}")
+                compiled_features.append(None)
+        start_time = time.perf_counter()
+        matches_dict = cls.scan_files_with_cache({dll_path: compiled_features}).get(dll_path, {})
+        elapsed = time.perf_counter() - start_time
+        tracer = Printer().scan_trace
+        for feature, compiled in zip(features, compiled_features):
+            if compiled is None:
                 continue
             # 找匹配
-            matches = list(regex.finditer(data))
+            matches = matches_dict.get(compiled.regex_bytes, [])
+            # 各特征码共用一次扫描, 耗时只记在第一个特征码上
+            tracer.record(feature, len(matches), elapsed, matches)
+            elapsed = 0
             if len(matches) == 0:
-                print("未识别到目标特征码")
+                print(f"[WARN] 未识别到目标特征码: {feature}")
                 return None
-            for match in matches:
-                original = match.group()
-                start_addr = match.start()
-
-                original_hex = SwInfoUtils.bytes_to_hex_str(original)
-
-                print("识别到：")
-                print(f"Original: {original_hex}, Addr: {start_addr:#x}")
-
+            for start_addr, original in matches:
                 res_dicts.append({
-                    "original": original_hex,
+                    "original": SwInfoUtils.bytes_to_hex_str(original),
                     "addr": start_addr
                 })
         return res_dicts
@@ -2150,47 +2081,8 @@ class SwInfoUtils:
     @classmethod
     def search_first_pattern_and_get_address_of_marked(
             cls, mm, target_features: list) -> List[dict]:
-        """
-        对目标特征码列表中的每个特征码: 扫描返回出第一个结果及其第一个!标记处所在偏移. 其余结果会忽略, 结果中的标记!会被清洗
-        若无!则默认取第一个字节位置. 保证返回结果长度与输入一致.
-        :param mm: 文件映射
-        :param target_features: 带!的特征码列表 (特征码如: "48 8B !05 ?? ?? ?? ?? 48 8B")
-        :return:
-            []List:
-                {}Optional[Dict]:
-                    'original': 原始特征码匹配串, 'marked_addr': 地址(基地址 + !偏移) ...
-        """
-        res_dicts = []
-        for feature in target_features:
-            # 找第一个 ! 出现的位置
-            tokens = feature.split()
-            bang_index = 0  # 默认 0 → 即使没有!也会取第一个
-            for i, tok in enumerate(tokens):
-                if tok.startswith("!"):
-                    bang_index = i
-                    tokens[i] = tok[1:]  # 去掉 !
-                    break
-            # 清洗掉剩余的 ! 符号
-            clean_feature = " ".join(tok.lstrip("!") for tok in tokens)
-            # 扫描
-            regex = cls._calc_feature_to_regex(clean_feature)
-            with rw_lock.gen_rlock():
-                match = regex.search(mm)
-            if match:
-                original = match.group()
-                start_addr = match.start()
-                original_hex = SwInfoUtils.bytes_to_hex_str(original)
-                res_dicts.append({
-                    "original": original_hex,
-                    "marked_addr": start_addr + bang_index
-                })
-            else:
-                # 保持长度一致 → 没匹配到时补个 None
-                res_dicts.append({
-                    "original": None,
-                    "marked_addr": None
-                })
-        return res_dicts
+        """对每个带!的目标特征码取第一个匹配及其!标记处地址, 结果长度与输入一致: [{'original', 'marked_addr'}, ...]"""
+        return cls.get_rule_resolver().search_first_pattern_and_get_address_of_marked(mm, target_features)
 
     @staticmethod
     def _create_path_finders_of_(path_tag) -> list:
@@ -116,52 +116,53 @@ class DetailWndFunc:
 
         try:
             cursor = conn.cursor()
-            for acc in acc_folders:
-                success, result = decrypt_impl.get_acc_id_and_alias_from_db(cursor, acc)
-                if success is not True:
-                    logger.error(f"账号{acc}查询失败")
-                    continue
-                if isinstance(result, list) and len(result) > 0:
-                    user_name, alias = result[0]
-                    subfunc_file.update_sw_acc_data(sw, acc, alias=alias or user_name)
-                else:
-                    logger.warning(f"账号{acc}未能获取到微信号")
-
-                success, result = decrypt_impl.get_acc_nickname_from_db(cursor, acc)
-                if success is not True:
-                    logger.error(f"账号{acc}查询失败")
-                    continue
-                if isinstance(result, list) and len(result) > 0:
-                    user_name, nickname = result[0]
-                    subfunc_file.update_sw_acc_data(sw, acc, nickname=nickname)
-                else:
-                    logger.warning(f"账号{acc}未能获取到昵称")
-
-                success, result = decrypt_impl.get_acc_avatar_from_db(cursor, acc)
-                if success is not True:
-                    logger.error(f"账号{acc}查询失败")
-                    continue
-                if isinstance(result, list) and len(result) > 0:
-                    usr_name, url = result[0]
-                    origin_url, = subfunc_file.get_sw_acc_data(sw, acc, avatar_url=None)
-                    save_path = os.path.join(Config.PROJ_USER_PATH, sw, f"{acc}", f"{acc}.jpg").replace('\\', '/')
-                    if not os.path.exists(os.path.dirname(save_path)):
-                        os.makedirs(os.path.dirname(save_path))
-
-                    # 下载头像逻辑：对于非选定的账号，若图像文件不存在或者url更新了，将会下载。对选定账号则一定下载。
-                    if usr_name != account:
-                        if not os.path.exists(save_path) or origin_url != url:
-                            success = image_utils.download_image(url, save_path)
+            with subfunc_file.acc_batch() as tx:
+                for acc in acc_folders:
+                    success, result = decrypt_impl.get_acc_id_and_alias_from_db(cursor, acc)
+                    if success is not True:
+                        logger.error(f"账号{acc}查询失败")
+                        continue
+                    if isinstance(result, list) and len(result) > 0:
+                        user_name, alias = result[0]
+                        tx.set_nested_values(None, sw, acc, alias=alias or user_name)
+                    else:
+                        logger.warning(f"账号{acc}未能获取到微信号")
+
+                    success, result = decrypt_impl.get_acc_nickname_from_db(cursor, acc)
+                    if success is not True:
+                        logger.error(f"账号{acc}查询失败")
+                        continue
+                    if isinstance(result, list) and len(result) > 0:
+                        user_name, nickname = result[0]
+                        tx.set_nested_values(None, sw, acc, nickname=nickname)
+                    else:
+                        logger.warning(f"账号{acc}未能获取到昵称")
+
+                    success, result = decrypt_impl.get_acc_avatar_from_db(cursor, acc)
+                    if success is not True:
+                        logger.error(f"账号{acc}查询失败")
+                        continue
+                    if isinstance(result, list) and len(result) > 0:
+                        usr_name, url = result[0]
+                        origin_url, = subfunc_file.get_sw_acc_data(sw, acc, avatar_url=None)
+                        save_path = os.path.join(Config.PROJ_USER_PATH, sw, f"{acc}", f"{acc}.jpg").replace('\\', '/')
+                        if not os.path.exists(os.path.dirname(save_path)):
+                            os.makedirs(os.path.dirname(save_path))
+
+                        # 下载头像逻辑：对于非选定的账号，若图像文件不存在或者url更新了，将会下载。对选定账号则一定下载。
+                        if usr_name != account:
+                            if not os.path.exists(save_path) or origin_url != url:
+                                success = image_utils.download_image(url, save_path)
+                            else:
+                                success = "无需下载"
+                                logger.info(f"{acc}无需下载")
                         else:
-                            success = "无需下载"
-                            logger.info(f"{acc}无需下载")
+                            success = image_utils.download_image(url, save_path)
+                        if success is True:
+                            tx.set_nested_values(None, sw, acc, avatar_url=url)
                     else:
-                        success = image_utils.download_image(url, save_path)
-                    if success is True:
-                        subfunc_file.update_sw_acc_data(sw, acc, avatar_url=url)
-                else:
-                    logger.warning(f"账号{acc}未能获取头像url")
-                    continue
+                        logger.warning(f"账号{acc}未能获取头像url")
+                        continue
         finally:
             conn.close()
             # if os.path.isfile(decrypted_mm_db_path):
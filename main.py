@@ -1,11 +1,10 @@
 import argparse
 import ctypes
+import multiprocessing
 import os
 import sys
 import tkinter as tk
 
-from ui import main_ui
-
 
 def elevate():
     if ctypes.windll.shell32.IsUserAnAdmin():
@@ -49,12 +48,17 @@ def main():
     print("权限：" + "管理员身份" if ctypes.windll.shell32.IsUserAnAdmin() == 1 else "非管理员身份")
     print("调试模式：" + str(args.debug))
 
+    # 界面模块在此处导入: 进程池子进程会重新导入本文件, 避免子进程加载整个界面
+    from ui import main_ui
+
     root = tk.Tk()
     main_ui.RootClass(root, args)
     root.mainloop()
 
 
 if __name__ == "__main__":
+    # 打包后的程序使用进程池时需要
+    multiprocessing.freeze_support()
     # if sys.platform == 'win32':
     #     kernel32 = ctypes.WinDLL('kernel32')
     #     user32 = ctypes.WinDLL('user32')
@@ -111,7 +111,8 @@ class Config:
             LocalCfg.REST_MULTIRUN_MODE: MultirunMode.BUILTIN,
             LocalCfg.STATE: SwStates.VISIBLE,
             LocalCfg.COEXIST_MODE: "default",
-            LocalCfg.CLICK_BTNS: ""
+            LocalCfg.CLICK_BTNS: "",
+            LocalCfg.LOGIN_CONCURRENCY: 3
         }
     }
 
@@ -127,12 +128,16 @@ class Config:
     REWARDS_PNG_PATH = fr'{PROJ_EXTERNAL_RES_PATH}/Rewards.png'
     FEEDBACK_PNG_PATH = fr'{PROJ_EXTERNAL_RES_PATH}/Feedback.png'
     TASK_TP_XML_PATH = fr'{PROJ_USER_PATH}/task_template.xml'
-    STATISTIC_JSON_PATH = fr'{PROJ_USER_PATH}/statistics.json'
+    STATISTIC_JSON_PATH = fr'{PROJ_USER_PATH}/statistics.json'  # 旧版统计, 仅用于首次导入
+    STATISTIC_HIST_JSON_PATH = fr'{PROJ_USER_PATH}/statistics_hist.json'
+    STATISTIC_SAMPLES_PATH = fr'{PROJ_USER_PATH}/statistics_samples.jsonl'
     TAB_ACC_JSON_PATH = fr'{PROJ_USER_PATH}/tab_acc_data.json'
     SETTING_INI_PATH = fr'{PROJ_USER_PATH}/setting.ini'
     VER_ADAPTATION_JSON_PATH = fr'{PROJ_USER_PATH}/version_adaptation.json'
     REMOTE_SETTING_JSON_PATH = fr'{PROJ_USER_PATH}/remote_setting.json'
+    REMOTE_FETCH_STATE_JSON_PATH = fr'{PROJ_USER_PATH}/remote_fetch_state.json'
     CACHE_SETTING_JSON_PATH = fr'{PROJ_USER_PATH}/cache_setting.json'
+    SCAN_CACHE_JSON_PATH = fr'{PROJ_USER_PATH}/scan_cache.json'
     LOCAL_SETTING_JSON_PATH = fr'{PROJ_USER_PATH}/local_setting.json'
 
     # 尺寸定义
@@ -113,6 +113,7 @@ class LocalCfg(str, Enum):
     REMARK = "remark"
     COEXIST_MODE = "coexist_mode"
     CLICK_BTNS = "click_buttons"
+    LOGIN_CONCURRENCY = "login_concurrency"
 
 
 class WndType(str, Enum):
@@ -0,0 +1,287 @@
+"""
+补丁规则解析流水线基准测试
+
+- 按 original_remote_setting_v7.json 中的补丁规则生成合成 DLL (10~200 MB), 在互不重叠的随机位置植入特征
+- 直接调用程序使用的 patch_utils 规则解析与原子替换(SwInfoUtils / DllUtils 只是对它的包装), 不依赖 Windows 模块,
+  在 Linux 上用普通 python 即可运行
+- 分别计时: 单遍多特征码扫描, simple / custom / jmp_offset 规则解析, 补丁写入与回滚, 原子替换失败回滚;
+  写入与回滚后都会校验文件内容与原始一致
+- 输出 MB/s 与 matches/s, 与基线 JSON 对比检测性能回退. 仓库中提交了一份参考基线(文件中记录了机器与 Python 版本),
+  机器不同时对比结果仅供参考, 可用 --save-baseline 在本机覆盖
+
+用法:
+    python scripts/bench_patch_rules.py                        # 默认 10MB 与 50MB
+    python scripts/bench_patch_rules.py --sizes 10 50 200
+    python scripts/bench_patch_rules.py --save-baseline        # 用本机结果覆盖基线
+    python scripts/bench_patch_rules.py --compare              # 与基线对比, 回退超过阈值时退出码为 1
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import pattern_utils, patch_utils  # noqa: E402
+from utils.better_wx.inner_utils import custom_wildcard_tokenize  # noqa: E402
+
+RULES_JSON = os.path.join(os.path.dirname(os.path.abspath(__file__)), "original_remote_setting_v7.json")
+BASELINE_JSON = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_patch_rules_baseline.json")
+RULE_TYPES = ("simple", "custom", "jmp_offset")
+# 合成数据中高频出现的 x64 指令字节, 让锚点的误命中率接近真实 DLL
+COMMON_OPCODES = bytes.fromhex("00 00 00 00 48 48 8B 89 FF CC 0F E8 85 84 C0 4C 8D 24 41 90")
+
+
+def collect_rules(rules_json=RULES_JSON) -> list:
+    """收集配置中全部 simple / custom / jmp_offset 规则(去重)"""
+    with open(rules_json, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    rules, seen = [], set()
+
+    def walk(node):
+        if isinstance(node, dict):
+            if node.get("type") in RULE_TYPES and "original" in node and "modified" in node:
+                key = json.dumps(node, sort_keys=True)
+                if key not in seen:
+                    seen.add(key)
+                    rules.append(node)
+                return
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+
+    walk(data)
+    return rules
+
+
+def concretize(feature: str, rng: random.Random) -> bytes:
+    """把特征码中的 ?? 填成随机字节, 得到一段能被该特征码匹配的具体字节"""
+    tokens = custom_wildcard_tokenize(pattern_utils.split_marked_feature(feature)[0])
+    return bytes(rng.randrange(256) if t == "??" else int(t, 16) for t in tokens)
+
+
+def rule_features(rule) -> list:
+    """规则用到的全部特征码: 原始串及 jmp_offset 的目标(与 SwInfoFunc 预扫描时收集的一致)"""
+    features = [pattern_utils.get_compiled_patch_pattern(
+        rule["original"], rule["modified"], rule.get("left_cut", 0), rule.get("right_cut", 0))]
+    for target in rule.get("targets", []):
+        features.append(pattern_utils.get_compiled_feature(pattern_utils.split_marked_feature(target)[0]))
+    return [f for f in features if f is not None]
+
+
+def build_synthetic_dll(path, size_mb, rules, rng: random.Random) -> int:
+    """生成合成 DLL 并植入每条规则的原始串及其目标特征, 每段植入各自独占的一个分区, 互不重叠; 返回植入的特征段数"""
+    size = size_mb * 1024 * 1024
+    table = bytes(COMMON_OPCODES[i % len(COMMON_OPCODES)] if i < 128 else i for i in range(256))
+    block_size = 1024 * 1024
+    with open(path, "wb") as f:
+        f.write(b"MZ" + b"\x00" * 0x3E)
+        written = 0x40
+        while written < size:
+            block = os.urandom(min(block_size, size - written)).translate(table)
+            f.write(block)
+            written += len(block)
+    blobs = [concretize(feature, rng) for rule in rules for feature in [rule["original"]] + list(rule.get("targets", []))]
+    slot_size = (size - 0x2000) // len(blobs)
+    slots = list(range(len(blobs)))
+    rng.shuffle(slots)
+    with open(path, "r+b") as f:
+        with mmap.mmap(f.fileno(), 0) as mm:
+            for blob, slot in zip(blobs, slots):
+                if len(blob) > slot_size:
+                    raise ValueError(f"合成 DLL 过小, 无法不重叠地植入 {len(blobs)} 段特征")
+                pos = 0x1000 + slot * slot_size + rng.randrange(slot_size - len(blob) + 1)
+                mm[pos:pos + len(blob)] = blob
+            mm.flush()
+    return len(blobs)
+
+
+def write_patches(mm, patches, target):
+    """与 SwOperator 切换补丁时的写入循环一致"""
+    for patch in patches:
+        file_offset = patch["offset"]
+        hex_str = patch["modified"] if target else patch["original"]
+        patch_bytes = bytes.fromhex(hex_str.replace(" ", ""))
+        mm[file_offset:file_offset + len(patch_bytes)] = patch_bytes
+
+
+def select_replace_pairs(data: bytes, patches) -> list:
+    """
+    按 DllUtils 原子替换的做法(每组依次 find 第一个出现处并替换)模拟一遍,
+    只保留能找到且与已选替换区域不重叠的补丁, 保证整组替换都能执行到最后
+    """
+    buf = bytearray(data)
+    pairs, spans = [], []
+    for d in patches:
+        old = bytes.fromhex(d["original"].replace(" ", ""))
+        new = bytes.fromhex(d["modified"].replace(" ", ""))
+        pos = buf.find(old)
+        if pos == -1 or data.find(old) == -1 or any(pos < e and s < pos + len(old) for s, e in spans):
+            continue
+        buf[pos:pos + len(old)] = new
+        spans.append((pos, pos + len(old)))
+        pairs.append((old.hex(), new.hex()))
+    return pairs
+
+
+def file_digest(path) -> str:
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def best_of(repeat, func):
+    """多次运行取最短耗时, 返回 (耗时, 最后一次结果)"""
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def stage(seconds, size_mb, matches=None) -> dict:
+    res = {"seconds": round(seconds, 4), "mb_s": round(size_mb / seconds, 2) if seconds > 0 else None}
+    if matches is not None:
+        res["matches"] = matches
+        res["matches_s"] = round(matches / seconds, 1) if seconds > 0 else None
+    return res
+
+
+def run_size(size_mb, rules, repeat, seed) -> dict:
+    rng = random.Random(seed)
+    fd, path = tempfile.mkstemp(suffix=".dll")
+    os.close(fd)
+    try:
+        build_synthetic_dll(path, size_mb, rules, rng)
+        results = {}
+        # 与程序中 SwInfoUtils 的解析相同, 只是不注入扫描缓存与追踪
+        resolver = patch_utils.PatchRuleResolver()
+        with open(path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                # 单遍扫描所有规则的全部特征码
+                scanner = pattern_utils.MultiPatternScanner(f for rule in rules for f in rule_features(rule))
+                seconds, matches = best_of(repeat, lambda: scanner.scan(mm))
+                results["multi_scan"] = stage(seconds, size_mb, sum(len(m) for m in matches.values()))
+                scanned = pattern_utils.ScannedData(mm, matches)
+
+                # 各类型规则逐条解析(不预扫描, 每条规则自己扫描)
+                for rule_type in RULE_TYPES:
+                    typed_rules = [r for r in rules if r["type"] == rule_type]
+                    if not typed_rules:
+                        continue
+                    seconds, res = best_of(repeat, lambda: [
+                        d for r in typed_rules for d in resolver.resolve_rule_dict_and_return_res_dicts(mm, r)])
+                    results[f"resolve_{rule_type}"] = stage(seconds, size_mb, len(res))
+
+                # 预扫描后的全部规则解析
+                seconds, patches = best_of(repeat, lambda: [
+                    d for r in rules for d in resolver.resolve_rule_dict_and_return_res_dicts(scanned, r)])
+                results["resolve_all_prescanned"] = stage(seconds, size_mb, len(patches))
+                data = mm[:]
+
+        # custom 规则的 !! 为用户自定义字节, 写入前需填成具体值
+        patches = [{**d, "modified": d["modified"].replace("!!", "90")} for d in patches]
+        original_digest = file_digest(path)
+        # 补丁写入与回滚
+        with open(path, "r+b") as f:
+            with mmap.mmap(f.fileno(), 0) as mm:
+                seconds, _ = best_of(repeat, lambda: (write_patches(mm, patches, True),
+                                                      write_patches(mm, patches, False)))
+                results["patch_apply_and_restore"] = stage(seconds, size_mb, len(patches) * 2)
+                mm.flush()
+        assert file_digest(path) == original_digest, "补丁写入后未能还原文件"
+
+        # 原子替换: 第一组替换全部成功写入, 第二组为不存在的模式, 触发整个文件的回滚
+        pairs = select_replace_pairs(data, patches)
+        missing = "deadbeef0badf00d5ea1"
+        assert data.find(bytes.fromhex(missing)) == -1
+        file_patterns_map = {path: [([o for o, _ in pairs], [n for _, n in pairs]), ([missing], [missing])]}
+        seconds, ok = best_of(repeat, lambda: patch_utils.batch_atomic_replace_multi_files(file_patterns_map))
+        assert ok is False
+        assert file_digest(path) == original_digest, "原子替换失败后未能回滚到原始内容"
+        results["atomic_replace_rollback"] = stage(seconds, size_mb, len(pairs))
+        return results
+    finally:
+        os.remove(path)
+
+
+def compare_with_baseline(current: dict, baseline: dict, tolerance: float, min_delta: float) -> list:
+    """返回耗时超出基线 (1 + tolerance) 倍且绝对增长超过 min_delta 秒的阶段, 避免把亚毫秒级的抖动当作回退"""
+    regressions = []
+    for size, stages in current["sizes"].items():
+        for name, res in stages.items():
+            base = baseline.get("sizes", {}).get(size, {}).get(name)
+            if not base:
+                continue
+            if res["seconds"] > base["seconds"] * (1 + tolerance) and res["seconds"] - base["seconds"] > min_delta:
+                regressions.append(f"{size}MB {name}: {base['seconds']}s -> {res['seconds']}s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="补丁规则解析流水线基准测试")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 50], help="合成 DLL 大小(MB), 10~200")
+    parser.add_argument("--repeat", type=int, default=3, help="每个阶段重复次数, 取最短耗时")
+    parser.add_argument("--seed", type=int, default=20240601)
+    parser.add_argument("--save-baseline", action="store_true", help="将结果写入基线文件")
+    parser.add_argument("--compare", action="store_true", help="与基线对比")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="允许的耗时增长比例")
+    parser.add_argument("--min-delta", type=float, default=0.01, help="判定回退所需的最小耗时增长(秒)")
+    parser.add_argument("--baseline", default=BASELINE_JSON)
+    args = parser.parse_args()
+
+    rules = collect_rules()
+    print(f"规则数: {len(rules)} " + ", ".join(
+        f"{t}={sum(r['type'] == t for r in rules)}" for t in RULE_TYPES))
+    current = {
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()} x{os.cpu_count()}",
+        "sizes": {}
+    }
+    for size_mb in args.sizes:
+        if not 10 <= size_mb <= 200:
+            print(f"[WARN] 跳过超出 10~200MB 范围的大小: {size_mb}")
+            continue
+        stages = run_size(size_mb, rules, args.repeat, args.seed)
+        current["sizes"][str(size_mb)] = stages
+        print(f"== {size_mb} MB ==")
+        for name, res in stages.items():
+            extra = f", {res['matches']} matches, {res['matches_s']} matches/s" if "matches" in res else ""
+            print(f"  {name:<26} {res['seconds']:>8.4f}s  {res['mb_s']:>9} MB/s{extra}")
+
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            print(f"[ERR] 基线文件不存在: {args.baseline}")
+            sys.exit(2)
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        for key in ("python", "machine"):
+            if baseline.get(key) != current[key]:
+                print(f"[WARN] 基线的 {key} 与本机不同: {baseline.get(key)} != {current[key]}, 对比结果仅供参考")
+        regressions = compare_with_baseline(current, baseline, args.tolerance, args.min_delta)
+        if regressions:
+            print("[ERR] 性能回退:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("[OK] 未发现性能回退")
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(current, f, ensure_ascii=False, indent=2)
+        print(f"[OK] 基线已写入 {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
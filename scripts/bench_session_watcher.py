@@ -0,0 +1,119 @@
+"""
+账号会话监视器基准测试 (纯 Python, 使用模拟进程源, 可在无 Windows 依赖的 Linux 上运行)
+
+- 模拟若干平台, 每个平台若干已登录进程与未登录进程, 每轮随机发生 登录/登出/新窗口/新进程
+- 模拟的账号识别每个 pid 耗时 --identify-ms 毫秒, 代表逐个读取进程 memory_maps 的开销
+- 分别计时: 每轮对所有进程全量识别(原先刷新界面时的做法) / 会话监视器增量轮询,
+  输出每轮耗时、每轮识别的进程数与事件数
+
+用法:
+    python scripts/bench_session_watcher.py
+    python scripts/bench_session_watcher.py --platforms 3 --procs 20 --rounds 50 --identify-ms 5
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.session_utils import SimulatedProcessSource  # noqa: E402
+
+PLATFORMS = ("Weixin", "QQ", "WXWork", "TIM", "DingTalk")
+
+
+class SlowSource(SimulatedProcessSource):
+    """账号识别带固定的逐 pid 耗时"""
+
+    def __init__(self, identify_seconds):
+        super().__init__()
+        self.identify_seconds = identify_seconds
+
+    def identify_acc(self, sw, pids):
+        time.sleep(self.identify_seconds * len(pids))
+        return super().identify_acc(sw, pids)
+
+
+def populate(source, sws, procs, rng: random.Random) -> dict:
+    """每个平台创建 procs 个主进程(约三分之二已登录)及其子进程, 返回 {平台: 主进程列表}"""
+    mains = {}
+    for sw in sws:
+        mains[sw] = []
+        for i in range(procs):
+            acc = f"{sw}_acc{i}" if rng.random() < 2 / 3 else None
+            pid = source.spawn(f"{sw}.exe", acc=acc)
+            source.spawn(f"{sw}Helper.exe", ppid=pid)
+            source.open_window(pid)
+            mains[sw].append(pid)
+    return mains
+
+
+def churn(source, mains, rng: random.Random, counter):
+    """每轮随机变化: 登录一个未登录进程 / 结束一个进程 / 打开一个新窗口 / 启动一个新进程"""
+    sw = rng.choice(list(mains))
+    pids = mains[sw]
+    action = rng.random()
+    if action < 0.25 and pids:
+        pid = rng.choice(pids)
+        source.login(pid, f"{sw}_new{next(counter)}")
+        source.open_window(pid)
+    elif action < 0.4 and pids:
+        pid = pids.pop(rng.randrange(len(pids)))
+        source.kill(pid)
+    elif action < 0.7 and pids:
+        source.open_window(rng.choice(pids))
+    else:
+        pids.append(source.spawn(f"{sw}.exe"))
+
+
+def run_mode(mode, args) -> dict:
+    rng = random.Random(args.seed)
+    source = SlowSource(args.identify_ms / 1000)
+    sws = PLATFORMS[:args.platforms]
+    mains = populate(source, sws, args.procs, rng)
+    counter = iter(range(10 ** 9))
+    watcher = source.create_watcher()
+    for sw in sws:
+        watcher.watch(sw)
+    if mode == "watcher":
+        # 首次轮询需识别全部进程, 不计入每轮耗时
+        watcher.poll()
+    source.identify_calls = 0
+    events = 0
+    start = time.perf_counter()
+    for _ in range(args.rounds):
+        churn(source, mains, rng, counter)
+        if mode == "full_rescan":
+            snapshot = source.take_snapshot()
+            for sw in sws:
+                pids = source.select_pids(sw, snapshot)
+                source.identify_acc(sw, pids)
+                source.list_windows(sw, pids)
+        else:
+            events += len(watcher.poll())
+    elapsed = time.perf_counter() - start
+    return {"mode": mode, "ms_per_round": elapsed / args.rounds * 1000,
+            "identify_per_round": source.identify_calls / args.rounds, "events": events}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--platforms", type=int, default=2, help=f"平台数, 最多 {len(PLATFORMS)}")
+    parser.add_argument("--procs", type=int, default=10, help="每个平台的初始主进程数")
+    parser.add_argument("--rounds", type=int, default=30)
+    parser.add_argument("--identify-ms", type=float, default=2.0, help="每个 pid 的账号识别耗时(毫秒)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    args.platforms = max(1, min(args.platforms, len(PLATFORMS)))
+
+    print(f"平台 {args.platforms} 个, 每平台初始进程 {args.procs} 个, 识别耗时 {args.identify_ms}ms/pid, "
+          f"{args.rounds} 轮")
+    for mode in ("full_rescan", "watcher"):
+        r = run_mode(mode, args)
+        print(f"{r['mode']:<12} {r['ms_per_round']:>9.2f} ms/轮 {r['identify_per_round']:>7.2f} 次识别/轮"
+              f" {r['events']:>5} 个事件")
+
+
+if __name__ == "__main__":
+    main()
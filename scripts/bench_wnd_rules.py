@@ -0,0 +1,108 @@
+"""
+窗口匹配规则基准测试 (纯 Python, 使用假控件, 可在无 Windows 依赖的 Linux 上运行)
+
+- 规则取自 original_remote_setting_v7.json 中 wnd_class 的全部匹配字典, 另加一条含 OR/!/FirstChild/FinalSelect 的复合规则
+- 假控件每次读取耗时 --latency 微秒, 模拟跨进程的 UIA 调用
+- 分别计时: 每次重新编译且不缓存属性 / 编译一次但不缓存属性 / 编译一次并缓存属性, 输出每次筛选耗时与控件读取次数
+
+用法:
+    python scripts/bench_wnd_rules.py
+    python scripts/bench_wnd_rules.py --windows 50 --rounds 200 --latency 50
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.wnd_rule_utils import (CompiledWndRule, ControlPropertyCache, FakeControl,  # noqa: E402
+                                  FakeControlBackend, compile_wnd_rule)
+
+RULES_JSON = os.path.join(os.path.dirname(os.path.abspath(__file__)), "original_remote_setting_v7.json")
+COMPOSITE_RULE = {
+    "ClassNameWildcards": ["Qt5*QWindowIcon", "mmui::*"],
+    "!Name": "",
+    "OR": [{"FirstChild": {"ClassNameWildcards": ["Title*"]}}, {"AutomationId": "main"}],
+    "FinalSelect": [{"SizeEquals": 0}, {"SizeExtreme": "max"}],
+}
+
+
+def collect_matching_dicts(rules_json=RULES_JSON) -> list:
+    """收集配置中 wnd_class 下全部匹配字典(去重)"""
+    with open(rules_json, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    result, seen = [], set()
+
+    def walk(node):
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if key == "matching" and isinstance(value, dict):
+                    for dicts in value.values():
+                        for d in dicts:
+                            k = json.dumps(d, sort_keys=True)
+                            if k not in seen:
+                                seen.add(k)
+                                result.append(d)
+                else:
+                    walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+
+    walk(data)
+    return result
+
+
+def make_controls(count, rng: random.Random) -> list:
+    class_names = ["Qt51514QWindowIcon", "Qt51514QWindowToolSaveBits", "mmui::MainWindow", "mmui::LoginWindow",
+                   "WeChatMainWndForPC", "Chrome_WidgetWin_1", "TXGuiFoundation", "IME", "MSCTFIME UI"]
+    controls = []
+    for i in range(count):
+        hwnd = 0x10000 + i * 2
+        w, h = rng.choice([(0, 0), (300, 200), (800, 600), (1200, 900)])
+        children = [FakeControl(hwnd + 1, rng.choice(["TitleBar", "Pane"]))] if rng.random() < 0.5 else []
+        controls.append(FakeControl(hwnd, rng.choice(class_names), rect=(0, 0, w, h), children=children,
+                                    Name=rng.choice(["", "微信", "QQ"]), AutomationId=rng.choice(["", "main"])))
+    return controls
+
+
+def run_mode(mode, rules_list, hwnds, backend, rounds) -> dict:
+    ttl = 60.0 if mode == "compiled_cached" else 0
+    cache = ControlPropertyCache(backend, ttl=ttl)
+    compiled = [compile_wnd_rule(r) for r in rules_list]
+    backend.calls = 0
+    start = time.perf_counter()
+    filters = 0
+    for _ in range(rounds):
+        for rules, rule in zip(rules_list, compiled):
+            if mode == "compile_each_call":
+                rule = CompiledWndRule(rules)
+            rule.filter(hwnds, cache)
+            filters += 1
+    elapsed = time.perf_counter() - start
+    return {"mode": mode, "us_per_filter": elapsed / filters * 1e6, "reads_per_filter": backend.calls / filters}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--windows", type=int, default=30, help="每次筛选的窗口数")
+    parser.add_argument("--rounds", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=20, help="每次控件读取耗时(微秒)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rules_list = collect_matching_dicts() + [COMPOSITE_RULE]
+    backend = FakeControlBackend(make_controls(args.windows, rng), latency=args.latency / 1e6)
+    hwnds = [0x10000 + i * 2 for i in range(args.windows)]
+    print(f"规则 {len(rules_list)} 条, 窗口 {args.windows} 个, 读取耗时 {args.latency}us")
+    for mode in ("compile_each_call", "compiled_uncached", "compiled_cached"):
+        r = run_mode(mode, rules_list, hwnds, backend, args.rounds)
+        print(f"{r['mode']:<20} {r['us_per_filter']:>10.1f} us/筛选 {r['reads_per_filter']:>8.1f} 次读取/筛选")
+
+
+if __name__ == "__main__":
+    main()
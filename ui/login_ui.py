@@ -20,6 +20,7 @@ from ui.treeview_row_ui import TreeviewLoginUI
 from ui.wnd_ui import WndCreator
 from utils.logger_utils import mylogger as logger, Printer
 from utils.logger_utils import myprinter as printer
+from utils.session_utils import SessionWatcher
 
 customized_btn_pad = Config.CUS_BTN_PAD
 customized_btn_ipad_y = Config.CUS_BTN_IPAD_Y
@@ -65,6 +66,8 @@ class LoginUI:
         self.start_time = None
         self.tab_frame = None
         self.sw = None
+        self._session_token = None
+        self._session_refresh_pending = False
 
         self.root_class = GlobalMembers.root_class
         self.sw_classes = self.root_class.sw_classes
@@ -107,6 +110,7 @@ class LoginUI:
             logger.error(re)
             messagebox.showerror("错误", "配置文件损坏，将关闭软件，请检查网络后重启")
             self.root.destroy()
+        self._watch_sessions()
         # 是否只刷新菜单
         if not (only_menu is True):
             # 刷新界面
@@ -135,6 +139,31 @@ class LoginUI:
 
         threading.Thread(target=_thread).start()
 
+    def _watch_sessions(self):
+        """由会话监视器的登录/登出事件驱动刷新当前页, 代替重复的全量扫描"""
+        watcher = AccInfoFunc.get_session_watcher()
+        watcher.watch(self.sw)
+        if self._session_token is None:
+            self._session_token = watcher.subscribe(
+                self._on_session_event, kinds=(SessionWatcher.LOGIN, SessionWatcher.LOGOUT))
+        watcher.start()
+
+    def _on_session_event(self, event):
+        """在轮询线程中调用; 同一批事件只安排一次刷新"""
+        if event.sw != self.sw or self._session_refresh_pending:
+            return
+        self._session_refresh_pending = True
+
+        def _refresh():
+            # 正在刷新时稍后再试, 以免漏掉本次变化
+            if self.refreshing is True:
+                self.root.after(500, _refresh)
+                return
+            self._session_refresh_pending = False
+            self.refresh_frame(event.sw)
+
+        self.root.after(100, _refresh)
+
     def _ui_pre_load(self):
         printer.vital("刷新")
         print(f"清除旧界面...")
@@ -577,6 +577,8 @@ class HotkeyManager:
 
     def load_hotkeys_from_json(self, json_path):
         """ 从 JSON 文件加载快捷键映射 """
+        # 账号数据可能还有未写盘的修改
+        subfunc_file.flush_user_docs()
         with open(json_path, "r", encoding="utf-8") as f:
             data = json.load(f)
 
@@ -520,9 +520,10 @@ class SidebarUI:
         hwnd_list.append(self.root_hwnd)
 
         self.linked_hwnd = None
-        # 寻找前台窗口
+        # 寻找前台窗口: 只取一次前台窗口; 与前台窗口相同即说明窗口存在, 无需再判断
+        foreground_hwnd = win32gui.GetForegroundWindow()
         for hwnd in hwnd_list:
-            if hwnd and win32gui.IsWindow(hwnd) and win32gui.GetForegroundWindow() == hwnd:
+            if hwnd and foreground_hwnd == hwnd:
                 self.linked_hwnd = hwnd
                 self._update_sidebar(self.get_linked_wnd_state(self.linked_hwnd))
                 break
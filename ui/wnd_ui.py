@@ -31,7 +31,7 @@ from public.enums import LocalCfg, RemoteCfg, SwStates
 from public.global_members import GlobalMembers
 from utils import file_utils, sys_utils, widget_utils
 from utils.encoding_utils import StringUtils
-from utils.file_utils import JsonUtils, PatchUtils
+from utils.file_utils import PatchUtils
 from utils.logger_utils import mylogger as logger, myprinter as printer, DebugUtils, Printer
 from utils.sys_utils import Tk2Sys
 from utils.widget_utils import UnlimitedClickHandler
@@ -695,6 +695,8 @@ class DebugWndUI(SubToolWndUI):
         self.max_indent_scale = None
         self.min_indent_scale = None
         self.indent_var = None
+        self.scan_detail_var = None
+        self.span_trace_var = None
         super().__init__(wnd, title)
 
     def initialize_members_in_init(self):
@@ -742,6 +744,23 @@ class DebugWndUI(SubToolWndUI):
         self.simplify_checkbox = tk.Checkbutton(toolbar, text="简化调用栈",
                                                 variable=self.simplify_var, command=self.refresh_text)
         self.simplify_checkbox.pack(side="left")
+        # 扫描追踪: 明细开关与统计按钮
+        scan_trace = Printer().scan_trace
+        self.scan_detail_var = tk.BooleanVar(value=scan_trace.detail_enabled)
+        scan_detail_checkbox = tk.Checkbutton(toolbar, text="扫描明细", variable=self.scan_detail_var,
+                                              command=self._update_scan_trace_level)
+        scan_detail_checkbox.pack(side="left")
+        scan_trace_button = tk.Button(toolbar, text="扫描统计", command=self.show_scan_trace)
+        scan_trace_button.pack(side="left")
+        # 区间追踪: 开关、统计与导出
+        self.span_trace_var = tk.BooleanVar(value=Printer().span_trace.enabled)
+        span_trace_checkbox = tk.Checkbutton(toolbar, text="区间追踪", variable=self.span_trace_var,
+                                             command=self._update_span_trace_enabled)
+        span_trace_checkbox.pack(side="left")
+        span_summary_button = tk.Button(toolbar, text="追踪统计", command=self.show_span_trace)
+        span_summary_button.pack(side="left")
+        span_export_button = tk.Button(toolbar, text="导出追踪", command=self.export_span_trace_to_desktop)
+        span_export_button.pack(side="left")
         # 创建带滚动条的文本框
         self.text_area = scrolledtext.ScrolledText(self.wnd_frame, wrap=tk.NONE)
         self.text_area.pack(fill="both", expand=True)
@@ -815,6 +834,43 @@ class DebugWndUI(SubToolWndUI):
         self.text_area.yview_moveto(current_scroll_position[0])  # 恢复滚动条位置
         self.text_area.config(state="disabled")
 
+    def _update_scan_trace_level(self):
+        """开启明细后, 之后的扫描才会记录每个匹配"""
+        scan_trace = Printer().scan_trace
+        scan_trace.set_level(scan_trace.DETAIL if self.scan_detail_var.get() else scan_trace.SUMMARY)
+
+    def show_scan_trace(self):
+        """在文本区域显示扫描追踪的统计及明细, 点击刷新可回到日志"""
+        scan_trace = Printer().scan_trace
+        lines = scan_trace.summary_lines()
+        if self.scan_detail_var.get():
+            lines += [""] + scan_trace.detail_lines()
+        self.text_area.config(state=tk.NORMAL)
+        self.text_area.delete(1.0, tk.END)
+        self.text_area.insert(tk.END, "\n".join(lines) + "\n")
+        self.text_area.config(state="disabled")
+
+    def _update_span_trace_enabled(self):
+        """开启后, 之后的登录、打开、句柄扫描等流程才会记录区间"""
+        Printer().span_trace.set_enabled(self.span_trace_var.get())
+
+    def show_span_trace(self):
+        """在文本区域显示各调用路径的次数与总耗时, 点击刷新可回到日志"""
+        lines = Printer().span_trace.summary_lines()
+        self.text_area.config(state=tk.NORMAL)
+        self.text_area.delete(1.0, tk.END)
+        self.text_area.insert(tk.END, "\n".join(lines) + "\n")
+        self.text_area.config(state="disabled")
+
+    def export_span_trace_to_desktop(self):
+        """导出 Chrome trace(chrome://tracing 或 Perfetto 打开) 和折叠栈(火焰图)文件到桌面"""
+        current_time = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        try:
+            trace_path, folded_path = Printer().span_trace.export(winshell.desktop(), f"mwm_trace_{current_time}")
+            print(f"追踪已导出到：{trace_path}, {folded_path}")
+        except Exception as e:
+            print(f"导出追踪时发生错误：{e}")
+
     def save_log_to_desktop(self):
         desktop = winshell.desktop()
         current_time = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
@@ -1378,16 +1434,21 @@ class UpdateLogWndUI(SubToolWndUI):
 
 
 class StatisticWndUI(SubToolWndUI):
+    STAT_COLUMNS = ("最短时间", "使用次数", "平均时间", "中位时间", "P95时间", "最长时间")
+
     def __init__(self, wnd, title, sw):
         self.refresh_mode_combobox = None
         self.refresh_tree = None
         self.manual_tree = None
         self.auto_tree = None
         self.auto_count_combobox = None
+        self.stage_tree = None
+        self.stage_combobox = None
         self.tree_dict = None
         self.main_frame = None
         self.scrollable_canvas = None
         self.view = None
+        self.stats = None
 
         self.sw = sw
         super().__init__(wnd, title)
@@ -1402,6 +1463,9 @@ class StatisticWndUI(SubToolWndUI):
             "auto": {
                 "sort": False
             },
+            "stage": {
+                "sort": False
+            },
             "refresh": {
                 "sort": False
             }
@@ -1414,6 +1478,7 @@ class StatisticWndUI(SubToolWndUI):
 
         self.create_manual_table()
         self.create_auto_table()
+        self.create_stage_table()
         self.create_refresh_table()
 
     def update_content(self):
@@ -1424,14 +1489,14 @@ class StatisticWndUI(SubToolWndUI):
         label = tk.Label(self.main_frame, text="手动登录", font=("Microsoft YaHei", 14, "bold"))
         label.pack(padx=(20, 5))
 
-        columns = ("模式", "最短时间", "使用次数", "平均时间", "最长时间")
+        columns = ("模式",) + self.STAT_COLUMNS
         self.manual_tree = ttk.Treeview(self.main_frame,
                                         columns=columns,
                                         show='headings', height=1)
         for col in columns:
             self.manual_tree.heading(col, text=col,
                                      command=lambda c=col: self.sort_column("manual", c))
-            self.manual_tree.column(col, anchor='center' if col == "模式" else 'e', width=100)  # 设置列宽
+            self.manual_tree.column(col, anchor='center' if col == "模式" else 'e', width=70)  # 设置列宽
 
         self.manual_tree.pack(fill="x", expand=True, padx=(20, 5), pady=(0, 10))
         self.tree_dict["manual"]["tree"] = self.manual_tree
@@ -1448,18 +1513,41 @@ class StatisticWndUI(SubToolWndUI):
         self.auto_count_combobox.pack()
         self.auto_count_combobox.bind("<<ComboboxSelected>>", self.on_selected_auto)
 
-        columns = ("模式", "最短时间", "使用次数", "平均时间", "最长时间")
+        columns = ("模式",) + self.STAT_COLUMNS
 
         self.auto_tree = ttk.Treeview(self.main_frame, columns=columns,
                                       show='headings', height=1)
         for col in columns:
             self.auto_tree.heading(col, text=col,
                                    command=lambda c=col: self.sort_column("auto", c))
-            self.auto_tree.column(col, anchor='center' if col == "模式" else 'e', width=100)  # 设置列宽
+            self.auto_tree.column(col, anchor='center' if col == "模式" else 'e', width=70)  # 设置列宽
 
         self.auto_tree.pack(fill="x", expand=True, padx=(20, 5), pady=(0, 10))
         self.tree_dict["auto"]["tree"] = self.auto_tree
 
+    def create_stage_table(self):
+        """定义自动登录各阶段表格"""
+        label = tk.Label(self.main_frame, text="自动登录各阶段", font=("Microsoft YaHei", 14, "bold"))
+        label.pack(padx=(20, 5))
+
+        description = tk.Label(self.main_frame, text="选择阶段查看(每个账号的平均用时)：")
+        description.pack()
+
+        self.stage_combobox = ttk.Combobox(self.main_frame, values=[], state="readonly")
+        self.stage_combobox.pack()
+        self.stage_combobox.bind("<<ComboboxSelected>>", self.on_selected_stage)
+
+        columns = ("模式",) + self.STAT_COLUMNS
+        self.stage_tree = ttk.Treeview(self.main_frame, columns=columns,
+                                       show='headings', height=1)
+        for col in columns:
+            self.stage_tree.heading(col, text=col,
+                                    command=lambda c=col: self.sort_column("stage", c))
+            self.stage_tree.column(col, anchor='center' if col == "模式" else 'e', width=70)  # 设置列宽
+
+        self.stage_tree.pack(fill="x", expand=True, padx=(20, 5), pady=(0, 10))
+        self.tree_dict["stage"]["tree"] = self.stage_tree
+
     def create_refresh_table(self):
         """定义刷新表格"""
         label = tk.Label(self.main_frame, text="刷新", font=("Microsoft YaHei", 14, "bold"))
@@ -1472,85 +1560,75 @@ class StatisticWndUI(SubToolWndUI):
         self.refresh_mode_combobox.pack()
         self.refresh_mode_combobox.bind("<<ComboboxSelected>>", self.on_selected_refresh)
 
-        columns = ("账号数", "最短时间", "使用次数", "平均时间", "最长时间")
+        columns = ("账号数",) + self.STAT_COLUMNS
         self.refresh_tree = ttk.Treeview(self.main_frame,
                                          columns=columns,
                                          show='headings', height=1)
         for col in columns:
             self.refresh_tree.heading(col, text=col,
                                       command=lambda c=col: self.sort_column("refresh", c))
-            self.refresh_tree.column(col, anchor='center' if col == "账号数" else 'e', width=100)  # 设置列宽
+            self.refresh_tree.column(col, anchor='center' if col == "账号数" else 'e', width=70)  # 设置列宽
 
         self.refresh_tree.pack(fill="x", expand=True, padx=(20, 5), pady=(0, 10))
         self.refresh_tree.var = "refresh"
         self.tree_dict["refresh"]["tree"] = self.refresh_tree
 
     def display_table(self):
-        data = JsonUtils.load_json(Config.STATISTIC_JSON_PATH)
-        if self.sw not in data:
-            data[self.sw] = {}
-        tab_info = data.get(self.sw, {})
+        # 一次查询该平台的全部统计: {(模式, 主键, 子键): 统计摘要}
+        self.stats = subfunc_file.statistic_store.query(self.sw)
+        main_keys = {}
+        for mode, main_key, _ in self.stats:
+            main_keys.setdefault(mode, set()).add(main_key)
 
         # 添加手动统计数据
-        manual_data = tab_info.get("manual", {}).get("_", {})
-        for mode, stats in manual_data.items():
-            min_time, count, avg_time, max_time = stats.split(",")
-            self.manual_tree.insert("", "end",
-                                    values=(mode, min_time.replace("inf", "null"),
-                                            int(float(count)), avg_time, max_time))
-        self.manual_tree.config(height=len(manual_data.items()) + 1)
+        self.update_table_from_selection('manual', '_')
 
         # 更新下拉框选项
-        auto_data = tab_info.get("auto", {})
-        index_values = set()  # 使用集合去重
-        for mode, _ in auto_data.items():
-            if mode == 'avg':
-                continue
-            index_values.add(mode)  # 添加索引值
-        sorted_index_values = sorted(map(int, index_values))  # 将字符串转为整数后排序
-        self.auto_count_combobox['values'] = ['avg'] + sorted_index_values  # 设置为排序后的列表
+        index_values = [k for k in main_keys.get("auto", set()) if k != 'avg']
+        sorted_index_values = sorted(index_values, key=lambda k: (not k.isdigit(), int(k) if k.isdigit() else k))
+        self.auto_count_combobox['values'] = ['avg'] + sorted_index_values
         # 添加自动统计数据
         if self.auto_count_combobox['values']:  # 确保下拉框有值
             self.auto_count_combobox.current(0)  # 默认选择第一个
-            # self.update_auto_table_from_selection(self.auto_count_combobox.get())
             self.update_table_from_selection('auto', self.auto_count_combobox.get())
 
         # 更新下拉框选项
-        refresh_data = tab_info.get("refresh", {})
-        view_values = set()  # 使用集合去重
-        for mode, _ in refresh_data.items():
-            # print(f"mode={mode}")
-            view_values.add(mode)  # 添加索引值
-        # print(view_values)
-        sorted_view_values = sorted(map(str, view_values))  # 字符串排序
-        self.refresh_mode_combobox['values'] = sorted_view_values  # 设置为排序后的列表
+        self.stage_combobox['values'] = sorted(main_keys.get("stage", set()))
+        # 添加各阶段统计数据
+        if self.stage_combobox['values']:  # 确保下拉框有值
+            self.stage_combobox.current(0)  # 默认选择第一个
+            self.update_table_from_selection('stage', self.stage_combobox.get())
+
+        # 更新下拉框选项
+        sorted_view_values = sorted(main_keys.get("refresh", set()))  # 字符串排序
+        self.refresh_mode_combobox['values'] = sorted_view_values
         # 添加刷新统计数据
         if self.refresh_mode_combobox['values']:  # 确保下拉框有值
-            if self.view in self.refresh_mode_combobox['values']:
+            if self.view in sorted_view_values:
                 self.refresh_mode_combobox.current(sorted_view_values.index(self.view))  # 选择当前的视图
             else:
                 self.refresh_mode_combobox.current(0)  # 默认选择第一个
-            # self.update_refresh_table_from_selection(self.refresh_mode_combobox.get())
             self.update_table_from_selection('refresh', self.refresh_mode_combobox.get())
 
         for t in self.tree_dict.keys():
             self.sort_column(t, "平均时间")
 
     def update_table_from_selection(self, mode, selected):
-        """根据下拉框的选择，更新对应的表数据"""
-        data = JsonUtils.load_json(Config.STATISTIC_JSON_PATH)
+        """根据下拉框的选择，从已查询的统计中更新对应的表数据"""
+        if self.stats is None:
+            self.stats = subfunc_file.statistic_store.query(self.sw)
         tree = self.tree_dict[mode]['tree']
         # 清空之前的数据
         for item in tree.get_children():
             tree.delete(item)
-        refresh_data = data.get(self.sw, {}).get(mode, {}).get(selected, {}).items()
+        rows = [(sub_key, summary) for (m, main_key, sub_key), summary in self.stats.items()
+                if m == mode and main_key == str(selected)]
         try:
-            for acc_count, stats in refresh_data:
-                min_time, count, avg_time, max_time = stats.split(",")
+            for sub_key, summary in rows:
                 tree.insert("", "end",
-                            values=(acc_count, min_time.replace("inf", "null"),
-                                    int(float(count)), avg_time, max_time))
-            tree.config(height=len(refresh_data) + 1)
+                            values=(sub_key, f"{summary.min:.4f}", summary.count, f"{summary.avg:.4f}",
+                                    f"{summary.p50:.4f}", f"{summary.p95:.4f}", f"{summary.max:.4f}"))
+            tree.config(height=len(rows) + 1)
         except Exception as e:
             logger.error(e)
 
@@ -1559,6 +1637,11 @@ class StatisticWndUI(SubToolWndUI):
         selected_index = event.widget.get()  # 获取选中的index
         self.update_table_from_selection('auto', selected_index)
 
+    def on_selected_stage(self, event):
+        """选中下拉框中的阶段时"""
+        selected_stage = event.widget.get()  # 获取选中的阶段
+        self.update_table_from_selection('stage', selected_stage)
+
     def on_selected_refresh(self, event):
         """选中下拉框中的数值时"""
         selected_view = event.widget.get()  # 获取选中的index
@@ -1,9 +1,12 @@
+import bisect
+import json
 import mmap
 import os
+import re
 import sys
-from typing import Tuple
+from typing import Tuple, List, Iterator
 
-# 用法: 将两个文件拖到脚本上运行
+# 用法: 将两个文件拖到脚本上运行(可选第三个参数指定 json 差异文件路径, 默认为 第一个文件.diff.json)
 
 # 差异前后各多显示多少字节
 LEFT_CONTEXT = 64
@@ -29,6 +32,10 @@ DOUBLE_TILDE = "\u0360"  # x͠ 上双波浪
 
 DIFF_TAG = LOW_LINE
 
+# 分块比较的块大小: 整块相同直接跳过, 只对不同的块定位差异字节
+BLOCK_SIZE = 1024 * 1024
+NON_ZERO_BYTE = re.compile(rb"[^\x00]")
+
 
 def format_ascii_line(data: bytes, diff_indices: set) -> Tuple[str, str]:
     chars = []
@@ -60,75 +67,113 @@ def format_bytes_line(data: bytes, diff_indices: set) -> str:
     return res
 
 
-def compare_binary_files_optimized(file1: str, file2: str):
+def iter_diff_offsets(data1, data2, size: int, block_size: int = BLOCK_SIZE) -> Iterator[int]:
+    """按块比较两段数据, 升序产出所有不同字节的偏移"""
+    for block_start in range(0, size, block_size):
+        block_end = min(block_start + block_size, size)
+        block1 = data1[block_start:block_end]
+        block2 = data2[block_start:block_end]
+        if block1 == block2:
+            continue
+        # 整块异或后, 非零字节即为差异位置
+        xor = (int.from_bytes(block1, "little") ^ int.from_bytes(block2, "little")).to_bytes(
+            block_end - block_start, "little")
+        for match in NON_ZERO_BYTE.finditer(xor):
+            yield block_start + match.start()
+
+
+def merge_diff_regions(diff_offsets: List[int], size: int) -> List[Tuple[int, int, List[int]]]:
+    """
+    按差异前后的上下文窗口合并区间:
+    区间从首个差异前 LEFT_CONTEXT 到其后 RIGHT_CONTEXT, 若右侧 LEFT_CONTEXT 内仍有差异则继续向右扩展 LEFT_CONTEXT
+    :return: [(区间起点, 区间终点, 区间内差异偏移列表), ...]
+    """
+    regions = []
+    idx = 0
+    count = len(diff_offsets)
+    while idx < count:
+        first = diff_offsets[idx]
+        range_start = max(first - LEFT_CONTEXT, 0)
+        real_right = min(first + RIGHT_CONTEXT, size)
+        # 检测右边扩展部分是否还有差异
+        while real_right < size:
+            tmp_right = min(real_right + LEFT_CONTEXT, size)
+            next_idx = bisect.bisect_left(diff_offsets, real_right, idx)
+            if next_idx < count and diff_offsets[next_idx] < tmp_right:
+                real_right = tmp_right
+            else:
+                break
+        end_idx = bisect.bisect_left(diff_offsets, real_right, idx)
+        regions.append((range_start, real_right, diff_offsets[idx:end_idx]))
+        idx = end_idx
+    return regions
+
+
+def compare_binary_files_optimized(file1: str, file2: str, json_path: str = None):
     if os.path.getsize(file1) != os.path.getsize(file2):
         return f"文件大小不同：{os.path.getsize(file1)} vs {os.path.getsize(file2)} 字节，无法对比。"
 
     with open(file1, "rb") as f1, open(file2, "rb") as f2:
         size = os.path.getsize(file1)
+        if size == 0:
+            return None
         mm1 = mmap.mmap(f1.fileno(), 0, access=mmap.ACCESS_READ)
         mm2 = mmap.mmap(f2.fileno(), 0, access=mmap.ACCESS_READ)
 
-        i = 0
-        while i < size:
-            if mm1[i] != mm2[i]:
-                range_start = max(i - LEFT_CONTEXT, 0)
-                real_right = min(i + RIGHT_CONTEXT, size)
-                tmp_right = min(real_right + LEFT_CONTEXT, size)
-
-                # 初次检测范围内的差异
-                diff_set = set()
-                for j in range(range_start, real_right):
-                    if mm1[j] != mm2[j]:
-                        diff_set.add(j - range_start)
-
-                # 检测右边扩展部分是否还有差异
-                while tmp_right > real_right:
-                    new_diff_found = False
-                    for j in range(real_right, tmp_right):
-                        if j >= size:
-                            break
-                        if mm1[j] != mm2[j]:
-                            diff_set.add(j - range_start)
-                            new_diff_found = True
-                    if new_diff_found:
-                        real_right = tmp_right
-                        tmp_right = min(real_right + LEFT_CONTEXT, size)
-                    else:
-                        break
-
-                data1 = mm1[range_start:real_right]
-                data2 = mm2[range_start:real_right]
-
-                print(f"## 区间={range_start:08X}~{real_right:08X}  长度={real_right - range_start}")
-
-                hex_line1 = format_bytes_line(data1, diff_set)
-                ascii_line1a, ascii_line1b = format_ascii_line(data1, diff_set)
-                print(f"### {file1}:\n{hex_line1}\n{ascii_line1a}\n{ascii_line1b}")
-
-                hex_line2 = format_bytes_line(data2, diff_set)
-                ascii_line2a, ascii_line2b = format_ascii_line(data2, diff_set)
-                print(f"### {file2}:\n{hex_line2}\n{ascii_line2a}\n{ascii_line2b}")
-
-                print("\n")
-
-                i = real_right  # 从新范围的右边界继续扫描
-            else:
-                i += 1
+        regions = merge_diff_regions(list(iter_diff_offsets(mm1, mm2, size)), size)
+        json_regions = []
+        for range_start, real_right, diff_offsets in regions:
+            diff_set = {offset - range_start for offset in diff_offsets}
+            data1 = mm1[range_start:real_right]
+            data2 = mm2[range_start:real_right]
+
+            print(f"## 区间={range_start:08X}~{real_right:08X}  长度={real_right - range_start}")
+
+            hex_line1 = format_bytes_line(data1, diff_set)
+            ascii_line1a, ascii_line1b = format_ascii_line(data1, diff_set)
+            print(f"### {file1}:\n{hex_line1}\n{ascii_line1a}\n{ascii_line1b}")
+
+            hex_line2 = format_bytes_line(data2, diff_set)
+            ascii_line2a, ascii_line2b = format_ascii_line(data2, diff_set)
+            print(f"### {file2}:\n{hex_line2}\n{ascii_line2a}\n{ascii_line2b}")
+
+            print("\n")
+
+            json_regions.append({
+                "start": range_start,
+                "end": real_right,
+                "diff_offsets": diff_offsets,
+                "original": data1.hex(" "),
+                "modified": data2.hex(" "),
+            })
 
         mm1.close()
         mm2.close()
-        return None
+
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "file1": file1,
+                "file2": file2,
+                "size": size,
+                "diff_bytes": sum(len(r["diff_offsets"]) for r in json_regions),
+                "regions": json_regions,
+            }, f, ensure_ascii=False, indent=2)
+        print(f"差异已写入：{json_path}")
+    return None
 
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
+    if len(sys.argv) not in (3, 4):
         print("请将两个文件一起拖到脚本上运行")
         input("按任意键退出...")
         sys.exit(1)
 
     file1, file2 = sys.argv[1], sys.argv[2]
+    json_file = sys.argv[3] if len(sys.argv) == 4 else f"{file1}.diff.json"
     print(f"正在对比：\n{file1}\n{file2}\n")
-    result = compare_binary_files_optimized(file1, file2)
+    result = compare_binary_files_optimized(file1, file2, json_file)
+    if result:
+        print(result)
     input("\n对比完成，按任意键退出...")
     input("....")
@@ -1,8 +1,10 @@
 import base64
+import bisect
 import colorsys
+import functools
 import re
 from pathlib import Path
-from typing import Any, Tuple, Union, Optional
+from typing import Any, Tuple, Union, Optional, Dict, Hashable, Iterable, List
 
 from Crypto.Cipher import AES
 from Crypto.Protocol.KDF import PBKDF2
@@ -323,6 +325,72 @@ class VersionUtils:
         candidates = [ver for ver in version_list if Version(ver) <= current]
         return max(candidates, key=Version, default=None)
 
+    @staticmethod
+    @functools.lru_cache(maxsize=2048)
+    def version_key(version: str) -> Optional[Tuple[int, ...]]:
+        """
+        把版本号解析为去掉末尾 0 的整数元组, 用于排序和二分查找, 比较结果与 packaging.Version 对发布版本号一致;
+        无法解析时返回 None
+        """
+        try:
+            parts = tuple(int(p) for p in version.split('.'))
+        except (ValueError, AttributeError):
+            try:
+                parts = Version(version).release
+            except Exception:
+                return None
+        end = len(parts)
+        while end > 0 and parts[end - 1] == 0:
+            end -= 1
+        return parts[:end]
+
+
+class VersionIndex:
+    """
+    多组版本号的合并有序索引:
+    所有版本号解析为整数元组后排序, 预先算好每个区间内各组 <= 该区间的最大版本(兼容版本),
+    查询时只需一次二分查找即可得到所有组的兼容版本; 单组时与 pkg_find_compatible_version 结果一致
+    """
+
+    def __init__(self, groups: Dict[Hashable, Iterable[str]]):
+        # 每组: 版本元组 -> 原始版本号, 元组相同的版本号保留先出现的那个
+        group_keys: Dict[Hashable, List[Tuple[tuple, str]]] = {}
+        for group, versions in groups.items():
+            keyed = {}
+            for ver in versions:
+                key = VersionUtils.version_key(ver)
+                if key is not None and key not in keyed:
+                    keyed[key] = ver
+            group_keys[group] = sorted(keyed.items())
+        self.bounds: List[tuple] = sorted({key for keyed in group_keys.values() for key, _ in keyed})
+        self.answers: List[Dict[Hashable, str]] = []
+        cursors = {group: 0 for group in group_keys}
+        current: Dict[Hashable, str] = {}
+        for bound in self.bounds:
+            for group, keyed in group_keys.items():
+                i = cursors[group]
+                while i < len(keyed) and keyed[i][0] <= bound:
+                    current[group] = keyed[i][1]
+                    i += 1
+                cursors[group] = i
+            self.answers.append(dict(current))
+
+    @classmethod
+    def of_versions(cls, versions: Iterable[str]) -> "VersionIndex":
+        """单组版本号的索引, 查询时 group 传 None"""
+        return cls({None: versions})
+
+    def find_all(self, current_version: str) -> Dict[Hashable, str]:
+        """返回 {组: 兼容版本}, 没有兼容版本的组不出现在结果中"""
+        key = VersionUtils.version_key(current_version)
+        if key is None:
+            return {}
+        i = bisect.bisect_right(self.bounds, key) - 1
+        return self.answers[i] if i >= 0 else {}
+
+    def find(self, current_version: str, group: Hashable = None) -> Optional[str]:
+        return self.find_all(current_version).get(group)
+
 
 class PathUtils:
     @staticmethod
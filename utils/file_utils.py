@@ -1,6 +1,9 @@
+import atexit
 import configparser
+import copy
 import ctypes
 import datetime as dt
+import functools
 import glob
 import hashlib
 import json
@@ -8,18 +11,20 @@ import mmap
 import os
 import re
 import shutil
+import threading
+import time
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Optional, Union, Tuple, Dict, List
+from typing import Any, Callable, Optional, Union, Tuple, Dict, List
 
 import win32api
 import win32com.client
 import winshell
 import yaml
-from readerwriterlock import rwlock
 
+from utils import patch_utils
 from utils.logger_utils import mylogger as logger, Printer
-
-rw_lock = rwlock.RWLockFairD()
+from utils.patch_utils import rw_lock
 
 
 class DictUtils:
@@ -283,16 +288,436 @@ class JsonUtils:
 
     @staticmethod
     def save_json(json_file, data):
+        """先完整写入同目录下的临时文件并落盘, 再原子替换目标文件, 中途崩溃也不会留下写了一半的文件"""
+        tmp_file = f"{json_file}.tmp"
         try:
+            json_string = json.dumps(data, ensure_ascii=False, indent=4)
             with rw_lock.gen_wlock():
-                with open(json_file, 'w', encoding='utf-8', errors="ignore") as f:
-                    json_string = json.dumps(data, ensure_ascii=False, indent=4)
+                with open(tmp_file, 'w', encoding='utf-8', errors="ignore") as f:
                     f.write(json_string)
+                    f.flush()
+                    os.fsync(f.fileno())
+                JsonUtils._replace_with_retry(tmp_file, json_file)
             return True
         except Exception as e:
             logger.error(e)
+            try:
+                if os.path.exists(tmp_file):
+                    os.remove(tmp_file)
+            except OSError:
+                pass
             return False
 
+    @staticmethod
+    def _replace_with_retry(src, dst, retries=5, interval=0.05):
+        """Windows 下目标文件被其他进程短暂占用时 os.replace 会失败, 稍作重试"""
+        for i in range(retries):
+            try:
+                os.replace(src, dst)
+                return
+            except PermissionError:
+                if i == retries - 1:
+                    raise
+                time.sleep(interval)
+
+
+class CachedJsonDoc:
+    """
+    进程内共享的 JSON 文档缓存:
+    - 每个文件只在首次访问或被外部修改(mtime变化)时解析一次, 读取直接走内存
+    - 通过 set_values/clear_values 修改时, 操作先追加到日志文件(<文件名>.journal), 再标记为脏
+    - 脏文档由计时器在 flush_delay 秒内无新修改后整体原子写盘并清空日志(最长不超过 max_delay 秒),
+      日志条数超过 max_journal_entries 时立即压缩
+    - 加载时若发现残留日志(上次未正常写盘就退出), 会在快照之上重放日志
+    - 程序退出时自动将所有脏文档写盘
+    """
+    _docs: Dict[str, "CachedJsonDoc"] = {}
+    _docs_lock = threading.Lock()
+
+    OP_SET = "set"
+    OP_CLEAR = "clear"
+
+    def __init__(self, json_file, flush_delay=0.5, max_delay=3.0, max_journal_entries=200):
+        self.json_file = json_file
+        self.journal_file = f"{json_file}.journal"
+        self.flush_delay = flush_delay
+        self.max_delay = max_delay
+        self.max_journal_entries = max_journal_entries
+        self._lock = threading.RLock()
+        self._data: Optional[dict] = None
+        self._mtime: Optional[float] = None
+        self._dirty_since: Optional[float] = None
+        self._timer: Optional[threading.Timer] = None
+        self._journal_entries = 0
+
+    @classmethod
+    def of(cls, json_file) -> "CachedJsonDoc":
+        """获取该路径对应的共享文档对象"""
+        key = os.path.normcase(os.path.abspath(json_file))
+        with cls._docs_lock:
+            if key not in cls._docs:
+                cls._docs[key] = cls(json_file)
+            return cls._docs[key]
+
+    @classmethod
+    def flush_all(cls):
+        """将所有脏文档立即写盘"""
+        with cls._docs_lock:
+            docs = list(cls._docs.values())
+        for doc in docs:
+            doc.flush()
+
+    @staticmethod
+    def _get_mtime(json_file) -> Optional[float]:
+        try:
+            return os.stat(json_file).st_mtime_ns
+        except OSError:
+            return None
+
+    def _load_snapshot(self) -> dict:
+        """读取快照文件; 文件损坏时保留一份副本再返回空字典, 避免下次写盘把它覆盖掉"""
+        if not os.path.exists(self.json_file):
+            return {}
+        try:
+            with rw_lock.gen_rlock():
+                with open(self.json_file, 'r', encoding='utf-8', errors="ignore") as f:
+                    data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except Exception as e:
+            corrupt_file = f"{self.json_file}.corrupt"
+            logger.error(f"{self.json_file} 解析失败: {e}, 已另存为 {corrupt_file}")
+            try:
+                shutil.copy2(self.json_file, corrupt_file)
+            except Exception as copy_e:
+                logger.error(copy_e)
+            return {}
+
+    def _replay_journal(self, data: dict) -> int:
+        """在快照之上按顺序重放日志, 末尾写了一半的行会被忽略; 操作均为赋值/清空, 重复重放结果不变"""
+        if not os.path.exists(self.journal_file):
+            return 0
+        count = 0
+        with open(self.journal_file, 'r', encoding='utf-8', errors="ignore") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    logger.warning(f"{self.journal_file} 存在不完整的记录, 已跳过")
+                    continue
+                self._apply(data, entry)
+                count += 1
+        return count
+
+    def _apply(self, data: dict, entry: dict) -> bool:
+        op, addr, kwargs = entry.get("op"), entry.get("addr", []), entry.get("kwargs", {})
+        if op == self.OP_SET:
+            return DictUtils.set_nested_values(data, entry.get("value"), *addr, **kwargs)
+        if op == self.OP_CLEAR:
+            return DictUtils.clear_nested_values(data, *addr, **kwargs)
+        return False
+
+    def _ensure_loaded(self) -> dict:
+        """必要时(首次/文件被外部修改)重新加载, 有未写盘的修改时以内存为准"""
+        mtime = self._get_mtime(self.json_file)
+        if self._data is None or (self._dirty_since is None and mtime != self._mtime):
+            self._data = self._load_snapshot()
+            self._mtime = mtime
+            self._journal_entries = self._replay_journal(self._data)
+            if self._journal_entries > 0:
+                print(f"{self.json_file}: 已重放 {self._journal_entries} 条未写盘的修改")
+                self._mark_dirty()
+        return self._data
+
+    def read(self, *front_addr, **kwargs) -> Union[Any, Tuple[Any, ...]]:
+        """按 DictUtils.get_nested_values 的规则读取, 返回的是副本, 修改它不会影响缓存"""
+        with self._lock:
+            data = self._ensure_loaded()
+            return copy.deepcopy(DictUtils.get_nested_values(data, None, *front_addr, **kwargs))
+
+    def set_values(self, value: Any, *front_addr, **kwargs) -> bool:
+        """按 DictUtils.set_nested_values 的规则修改并记入日志"""
+        return self._record({"op": self.OP_SET, "addr": list(front_addr), "value": value, "kwargs": kwargs})
+
+    def clear_values(self, *front_addr, **kwargs) -> bool:
+        """按 DictUtils.clear_nested_values 的规则清空并记入日志"""
+        return self._record({"op": self.OP_CLEAR, "addr": list(front_addr), "kwargs": kwargs})
+
+    def _record(self, entry: dict) -> bool:
+        return self._record_many([entry])
+
+    def _record_many(self, entries: List[dict]) -> bool:
+        """一次加锁内按顺序应用多条修改, 一次性追加日志并只安排一次写盘"""
+        if len(entries) == 0:
+            return True
+        # 与调用方传入的对象解耦, 避免其后续修改悄悄改动缓存
+        entries = copy.deepcopy(entries)
+        with self._lock:
+            data = self._ensure_loaded()
+            success = all([self._apply(data, entry) for entry in entries])
+            self._append_journal(entries)
+            self._mark_dirty()
+            return success
+
+    def _append_journal(self, entries: List[dict]):
+        """追加日志; 只刷到系统缓冲区, 进程被杀也不会丢失, 压缩写盘时再 fsync"""
+        try:
+            lines = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries)
+            with open(self.journal_file, 'a', encoding='utf-8') as f:
+                f.write(lines)
+            self._journal_entries += len(entries)
+        except Exception as e:
+            logger.error(e)
+
+    @contextmanager
+    def batch(self):
+        """
+        批量修改: with 块内通过 tx.set_nested_values / tx.clear_nested_values 收集的修改,
+        在正常退出时一次性提交; 块内抛出异常则全部丢弃. 块内读取到的仍是提交前的数据
+        """
+        tx = JsonDocBatch()
+        yield tx
+        self._record_many(tx.entries)
+
+    @contextmanager
+    def modify(self):
+        """在锁内取出文档进行任意原地修改; 这类修改无法记入日志, 退出时直接写盘"""
+        with self._lock:
+            data = self._ensure_loaded()
+            try:
+                yield data
+            finally:
+                self._dirty_since = self._dirty_since or time.time()
+                self.flush()
+
+    def _mark_dirty(self):
+        now = time.time()
+        if self._dirty_since is None:
+            self._dirty_since = now
+        if self._timer is not None:
+            self._timer.cancel()
+        # 防抖: 连续修改时不断推迟, 但不超过 max_delay; 日志过长时立即压缩
+        delay = max(0.0, min(self.flush_delay, self._dirty_since + self.max_delay - now))
+        if self._journal_entries >= self.max_journal_entries:
+            delay = 0.0
+        self._timer = threading.Timer(delay, self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def flush(self) -> bool:
+        """若有未写盘的修改则立即原子写盘, 成功后清空日志"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._dirty_since is None:
+                return True
+            success = JsonUtils.save_json(self.json_file, self._data)
+            if success:
+                self._dirty_since = None
+                self._mtime = self._get_mtime(self.json_file)
+                self._truncate_journal()
+            return success
+
+    def _truncate_journal(self):
+        try:
+            if os.path.exists(self.journal_file):
+                os.remove(self.journal_file)
+        except Exception as e:
+            logger.error(e)
+        self._journal_entries = 0
+
+    def invalidate(self):
+        """丢弃内存中的数据(包括未写盘的修改及日志), 下次访问时从文件重新加载"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._data = None
+            self._mtime = None
+            self._dirty_since = None
+            self._truncate_journal()
+
+
+class JsonDocBatch:
+    """CachedJsonDoc.batch() 中收集的修改, 参数规则同 DictUtils 的同名方法(不传 data)"""
+
+    def __init__(self):
+        self.entries: List[dict] = []
+
+    def set_nested_values(self, value: Any, *front_addr: Optional[str], **kwargs) -> "JsonDocBatch":
+        self.entries.append(
+            {"op": CachedJsonDoc.OP_SET, "addr": list(front_addr), "value": value, "kwargs": kwargs})
+        return self
+
+    def clear_nested_values(self, *front_addr, **kwargs) -> "JsonDocBatch":
+        self.entries.append({"op": CachedJsonDoc.OP_CLEAR, "addr": list(front_addr), "kwargs": kwargs})
+        return self
+
+
+atexit.register(CachedJsonDoc.flush_all)
+
+
+class FrozenDict(dict):
+    """只读字典: 禁止原地修改; 深/浅拷贝与序列化得到的是普通 dict, 可以放心修改"""
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("只读配置不可修改, 请先 copy.deepcopy 得到普通副本")
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return thaw_json(self)
+
+    def __reduce__(self):
+        return dict, (thaw_json(self),)
+
+
+class FrozenList(list):
+    """只读列表, 规则同 FrozenDict"""
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("只读配置不可修改, 请先 copy.deepcopy 得到普通副本")
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _readonly
+    append = extend = insert = pop = remove = clear = sort = reverse = _readonly
+
+    def __copy__(self):
+        return list(self)
+
+    def __deepcopy__(self, memo):
+        return thaw_json(self)
+
+    def __reduce__(self):
+        return list, (thaw_json(self),)
+
+
+def freeze_json(data: Any) -> Any:
+    """把 json 解析结果递归转换为只读结构"""
+    if isinstance(data, dict):
+        return FrozenDict((k, freeze_json(v)) for k, v in data.items())
+    if isinstance(data, list):
+        return FrozenList(freeze_json(v) for v in data)
+    return data
+
+
+def thaw_json(data: Any) -> Any:
+    """把只读结构递归还原为普通的 dict/list"""
+    if isinstance(data, dict):
+        return {k: thaw_json(v) for k, v in data.items()}
+    if isinstance(data, list):
+        return [thaw_json(v) for v in data]
+    return data
+
+
+class FrozenJsonSnapshot:
+    """
+    只读 JSON 文件的进程内快照:
+    - 文件只解析一次, 转换为只读的嵌套字典/列表, 之后按地址查询只需逐层取键, 不再读盘
+    - 每次读取只比较文件的 (mtime, size), 变化时才重新读取; 内容摘要未变则不重新解析
+    - 下载到新内容时通过 replace_text 比较摘要, 只有内容变化才写盘并整体替换快照
+    - 快照是一个不可变对象, 替换只是一次引用赋值, 读取方拿到的始终是完整的某个版本
+    """
+    _snapshots: Dict[str, "FrozenJsonSnapshot"] = {}
+    _snapshots_lock = threading.Lock()
+
+    def __init__(self, json_file):
+        self.json_file = json_file
+        self._lock = threading.RLock()
+        # (文件状态, 内容摘要, 只读数据), 整体替换
+        self._state: Tuple[Optional[tuple], Optional[str], Any] = (None, None, None)
+        # (派生时的只读数据, {键: 派生结果})
+        self._derived: Tuple[Any, dict] = (None, {})
+
+    @classmethod
+    def of(cls, json_file) -> "FrozenJsonSnapshot":
+        """获取该路径对应的共享快照对象"""
+        key = os.path.normcase(os.path.abspath(json_file))
+        with cls._snapshots_lock:
+            if key not in cls._snapshots:
+                cls._snapshots[key] = cls(json_file)
+            return cls._snapshots[key]
+
+    @staticmethod
+    def _get_stat(json_file) -> Optional[tuple]:
+        try:
+            st = os.stat(json_file)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    @staticmethod
+    def _digest(raw: bytes) -> str:
+        return hashlib.sha1(raw).hexdigest()
+
+    @property
+    def digest(self) -> Optional[str]:
+        return self._state[1]
+
+    def get(self) -> Any:
+        """返回当前快照(只读); 文件不存在或解析失败时返回 None"""
+        stat, _, data = self._state
+        if stat is not None and stat == self._get_stat(self.json_file):
+            return data
+        with self._lock:
+            stat = self._get_stat(self.json_file)
+            old_stat, old_digest, data = self._state
+            if stat is not None and stat == old_stat:
+                return data
+            if stat is None:
+                self._state = (None, None, None)
+                return None
+            try:
+                with rw_lock.gen_rlock():
+                    with open(self.json_file, 'rb') as f:
+                        raw = f.read()
+                digest = self._digest(raw)
+                if digest != old_digest:
+                    data = freeze_json(json.loads(raw.decode('utf-8', errors="ignore")))
+                self._state = (stat, digest, data)
+                return data
+            except Exception as e:
+                logger.error(f"{self.json_file} 解析失败: {e}")
+                self._state = (None, None, None)
+                return None
+
+    def derive(self, key, builder: Callable[[Any], Any]) -> Any:
+        """基于当前快照派生的数据(如索引), 每个快照只构建一次, 快照替换后自动失效; builder 接收只读数据(可能为 None)"""
+        data = self.get()
+        with self._lock:
+            derived_for, derived = self._derived
+            if derived_for is not data:
+                derived = {}
+                self._derived = (data, derived)
+            if key not in derived:
+                derived[key] = builder(data)
+            return derived[key]
+
+    def replace_text(self, text: str) -> Tuple[bool, Any]:
+        """
+        用新下载的内容更新文件与快照, 内容未变化时不写盘也不重新解析
+        :return: (内容是否有变化, 当前快照)
+        """
+        raw = text.encode('utf-8')
+        digest = self._digest(raw)
+        with self._lock:
+            if digest == self._state[1] and self._state[0] == self._get_stat(self.json_file):
+                return False, self._state[2]
+            # 先解析, 保证写入的是合法 json, 失败时抛出, 不影响现有文件与快照
+            data = freeze_json(json.loads(text))
+            tmp_file = f"{self.json_file}.tmp"
+            with rw_lock.gen_wlock():
+                with open(tmp_file, 'wb') as f:
+                    f.write(raw)
+                    f.flush()
+                    os.fsync(f.fileno())
+                JsonUtils._replace_with_retry(tmp_file, self.json_file)
+            self._state = (self._get_stat(self.json_file), digest, data)
+            return True, data
+
 
 class IniUtils:
     @staticmethod
@@ -446,126 +871,14 @@ class DllUtils:
         # 返回布尔列表
         return [pattern in dll_content for pattern in patterns]
 
-    @classmethod
-    def batch_atomic_replace_multi_files(cls, file_patterns_map: Dict[str, List[Tuple[List[str], List[str]]]]) -> bool:
-        """
-        对多个文件执行原子替换操作，若任一文件替换失败，则回滚所有已处理文件的改动。
-        :param file_patterns_map: {dll_path: [hex_patterns_tuples]}
-        :return: transaction_success: 所有文件都成功则为 True，否则为 False（已回滚）
-        """
-        mmap_map = {}  # {dll_path: mmap_file}
-        backup_map = {}  # {dll_path: 原始字节数据}
-        transaction_success = True
-
-        try:
-            with rw_lock.gen_wlock():
-                for dll_path, hex_patterns_tuples in file_patterns_map.items():
-                    with open(dll_path, 'r+b') as f:
-                        mmap_file = mmap.mmap(f.fileno(), 0)
-                        mmap_map[dll_path] = mmap_file
-                        backup_map[dll_path] = mmap_file[:]
-
-                        for hex_patterns_tuple in hex_patterns_tuples:
-                            success, _ = cls._atomic_replace_hex_patterns(mmap_file, hex_patterns_tuple)
-                            if not success:
-                                print(f"替换失败: {dll_path}的{hex_patterns_tuple}")
-                                transaction_success = False
-                                break
-
-                    if not transaction_success:
-                        break  # 提前跳出，避免处理后续文件
-
-            if not transaction_success:
-                # 回滚所有已处理文件
-                for dll_path, mmap_file in mmap_map.items():
-                    mmap_file[:] = backup_map[dll_path]
-                    mmap_file.flush()
-
-        except Exception as e:
-            print(f"发生异常: {str(e)}")
-            transaction_success = False
-
-        finally:
-            for mmap_file in mmap_map.values():
-                mmap_file.close()
-
-        return transaction_success
+    @staticmethod
+    def batch_atomic_replace_multi_files(file_patterns_map: Dict[str, List[Tuple[List[str], List[str]]]]) -> bool:
+        """对多个文件执行原子替换, 任一文件失败则回滚所有已处理文件, 见 patch_utils"""
+        return patch_utils.batch_atomic_replace_multi_files(file_patterns_map)
 
     @staticmethod
     def _atomic_replace_hex_patterns(mmap_file, hex_patterns_tuple: tuple):
-        """
-        单次处理dll的多处替换（高效版本，使用已打开的mmap文件）
-        :param mmap_file: 已打开的mmap文件对象
-        :param hex_patterns_tuple: 元组列表：每个元组包含旧模式列表和新模式列表
-        :return: (success, message) 元组
-        """
-        backup_data = None
-        success = True
-        old_patterns, new_patterns = hex_patterns_tuple
-
-        # 确保两个列表长度相同
-        if len(old_patterns) != len(new_patterns):
-            return False, "错误：旧模式和新模式的数量不匹配。"
-
-        # 备份当前位置
-        original_pos = mmap_file.tell()
-
-        try:
-            # 先备份原始数据（只备份当前原子操作相关的部分）
-            backup_data = bytearray()
-            for old_pattern in old_patterns:
-                old = bytes.fromhex(old_pattern)
-                pos = mmap_file.find(old)
-                if pos != -1:
-                    backup_data.extend(mmap_file[pos:pos + len(old)])
-                else:
-                    return False, f"错误：未找到模式 {old_pattern}"
-
-            # 重置位置准备写入
-            mmap_file.seek(original_pos)
-
-            # 遍历所有模式对
-            for old_pattern, new_pattern in zip(old_patterns, new_patterns):
-                old, new = bytes.fromhex(old_pattern), bytes.fromhex(new_pattern)
-                pos = mmap_file.find(old)
-
-                if pos != -1:
-                    mmap_file[pos: pos + len(old)] = new
-                    print(f"找到并替换：{old_pattern} -> {new_pattern}")
-                else:
-                    print(f"错误：未找到模式 {old_pattern}")
-                    success = False
-                    break  # 遇到第一个失败立即跳出循环
-
-            # 如果成功则提交更改
-            if success:
-                mmap_file.flush()
-                return True, "替换成功"
-            else:
-                # 回滚当前原子操作的所有更改
-                mmap_file.seek(original_pos)
-                for old_pattern in old_patterns:
-                    old = bytes.fromhex(old_pattern)
-                    pos = mmap_file.find(old)
-                    if pos != -1:
-                        mmap_file[pos:pos + len(old)] = backup_data[:len(old)]
-                        backup_data = backup_data[len(old):]
-                mmap_file.flush()
-                return False, "部分模式替换失败，已回滚。"
-
-        except Exception as e:
-            print(f"发生错误: {str(e)}")
-            # 尝试回滚
-            if 'backup_data' in locals() and backup_data:
-                mmap_file.seek(original_pos)
-                for old_pattern in old_patterns:
-                    old = bytes.fromhex(old_pattern)
-                    pos = mmap_file.find(old)
-                    if pos != -1:
-                        mmap_file[pos:pos + len(old)] = backup_data[:len(old)]
-                        backup_data = backup_data[len(old):]
-                mmap_file.flush()
-            return False, f"发生错误: {str(e)}"
+        return patch_utils.atomic_replace_hex_patterns(mmap_file, hex_patterns_tuple)
 
 
 # Windows API 常量
@@ -747,42 +1060,41 @@ def get_file_version(file_path):
         return None
 
 
-def extract_version(folder):
-    matches = re.compile(r'(\d+(?:\.\d+){0,4})').findall(folder)  # 找到所有匹配的版本号
-    if matches:
-        # 取最右边的版本号
-        version_str = matches[-1]
-        version_parts = list(map(int, version_str.split(".")))
+_VERSION_PATTERN = re.compile(r'(\d+(?:\.\d+){0,4})')
 
+
+@functools.lru_cache(maxsize=1024)
+def _version_sort_key(folder) -> Tuple[int, ...]:
+    """取最右边的版本号, 补足或截断为 4 位整数元组; 结果按字符串缓存"""
+    matches = _VERSION_PATTERN.findall(folder)  # 找到所有匹配的版本号
+    if matches:
+        version_parts = list(map(int, matches[-1].split(".")))
         # 如果版本号不足 4 位，补足 0；如果超过 4 位，只取前 4 位
         while len(version_parts) < 4:
             version_parts.append(0)
-        key = version_parts[:4]  # 使用 4 个数字的版本号作为key
-        # print(key)
-        return key
-    return [0, 0, 0, 0]  # 如果没有匹配到版本号，默认返回0.0.0.0
+        return tuple(version_parts[:4])
+    return 0, 0, 0, 0  # 如果没有匹配到版本号，默认返回0.0.0.0
+
+
+def extract_version(folder):
+    return list(_version_sort_key(folder))
 
 
 def get_newest_full_version_dir(versions):
     # 找到最大版本号的文件夹
-    max_version_dir = max(versions, key=extract_version).replace('\\', '/')
+    max_version_dir = max(versions, key=_version_sort_key).replace('\\', '/')
     print(max_version_dir)
     return max_version_dir
 
 
 def get_newest_full_version(versions):
     # 找到最大版本号
-    # print(versions)
-    max_full_version = max(versions, key=extract_version)
-    # print(max_full_version)
-    return max_full_version
+    return max(versions, key=_version_sort_key)
 
 
 def get_sorted_full_versions(versions):
-    # 按版本号排序
-    sorted_versions = sorted(versions, key=extract_version, reverse=True)
-    # 返回按版本号排序的文件夹列表
-    return sorted_versions
+    # 按版本号排序, 返回按版本号降序的列表
+    return sorted(versions, key=_version_sort_key, reverse=True)
 
 
 def get_shortcut_target(shortcut_path):
@@ -1,11 +1,17 @@
 # handle_utils.py
 import ctypes
 import fnmatch
+import queue
 import re
+import struct
 import subprocess
+import threading
 import time
+from collections import deque
+from concurrent.futures import Future, TimeoutError as FuturesTimeoutError
 from ctypes import *
 from ctypes.wintypes import *
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
 
 from win32api import *
 from win32process import *
@@ -13,7 +19,7 @@ from win32process import *
 from public.config import Config
 from utils import process_utils
 from utils.encoding_utils import StringUtils
-from utils.logger_utils import Printer, Logger
+from utils.logger_utils import Printer, Logger, traced
 from utils.pywinhandle.src import pywinhandle
 
 kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
@@ -270,155 +276,447 @@ def close_sw_mutex_by_handle(handle_exe, exe, handle_regex_dicts):
     return all(successes), handles_closed_lists
 
 
-def _pywinhandle_query_system_handle_information():
-    current_length = 0x1000000
-    while True:
-        # 添加了限制会容易找不到
-        # if current_length > 0x4000000:
-        #     return
-        # start_time = time.time()
-        class SYSTEM_HANDLE_INFORMATION_EX(Structure):
-            _fields_ = [
-                ('HandleCount', ULONG_PTR),
-                ('Reserved', ULONG_PTR),
-                ('Handles', SYSTEM_HANDLE * current_length)
-            ]
-
-        buf = SYSTEM_HANDLE_INFORMATION_EX()
-        return_length = c_ulong(current_length)
-        status = ntdll.NtQuerySystemInformation(SystemExtendedHandleInformation, byref(buf), return_length,
-                                                byref(return_length))
-        # print(f"{current_length}:{time.time() - start_time}")
-        if status == STATUS_SUCCESS:
-            return buf
-        elif status == STATUS_INFO_LENGTH_MISMATCH:
-            current_length *= 4
-            continue
+# 系统句柄表 SYSTEM_HANDLE_INFORMATION_EX: 头部为 HandleCount, Reserved 两个 ULONG_PTR,
+# 之后是连续的 SYSTEM_HANDLE_TABLE_ENTRY_INFO_EX, 按 Windows 的布局(ULONG 恒为 4 字节)直接在缓冲区上解析
+_PTR_FMT = "Q" if ctypes.sizeof(c_void_p) == 8 else "I"
+HANDLE_TABLE_HEADER = struct.Struct(f"<{_PTR_FMT}{_PTR_FMT}")
+# Object, UniqueProcessId, HandleValue, GrantedAccess, CreatorBackTraceIndex, ObjectTypeIndex, HandleAttributes, Reserved
+HANDLE_TABLE_ENTRY = struct.Struct(f"<{_PTR_FMT * 3}IHHII")
+_ENTRY_PID_OFFSET = struct.calcsize(f"<{_PTR_FMT}")
+_PTR_STRUCT = struct.Struct(f"<{_PTR_FMT}")
+
+
+class HandleEntry(NamedTuple):
+    process_id: int
+    handle: int
+    granted_access: int
+    object_type_index: int
+
+
+def _normalize_pids(process_ids) -> Optional[Set[int]]:
+    """pid 列表转为整数集合, 非列表(不限制)返回 None"""
+    if not isinstance(process_ids, (list, tuple, set, frozenset)):
+        return None
+    return {int(x) if isinstance(x, str) and x.isdigit() else x for x in process_ids}
+
+
+def _entry_at(buf, offset) -> HandleEntry:
+    _obj, pid, handle, access, _bt, type_index, _attr, _res = HANDLE_TABLE_ENTRY.unpack_from(buf, offset)
+    return HandleEntry(pid, handle, access, type_index)
+
+
+def _pid_column_bytes(buf, end) -> bytes:
+    """只取出所有表项的 UniqueProcessId 列(约为整表的 1/5), 其余字段不复制"""
+    stride = HANDLE_TABLE_ENTRY.size // _PTR_STRUCT.size
+    with memoryview(buf) as mv, mv[HANDLE_TABLE_HEADER.size:end] as table, table.cast(_PTR_FMT) as ptrs:
+        return ptrs[_ENTRY_PID_OFFSET // _PTR_STRUCT.size::stride].tobytes()
+
+
+def _find_indexes_of_pid(column: bytes, pid) -> Iterator[int]:
+    """在 pid 列中搜索 pid 的字节串, 只保留按字段对齐的命中"""
+    needle = _PTR_STRUCT.pack(pid)
+    width = _PTR_STRUCT.size
+    pos = column.find(needle)
+    while pos != -1:
+        rem = pos % width
+        if rem == 0:
+            yield pos // width
+            pos = column.find(needle, pos + width)
         else:
-            return None
+            pos = column.find(needle, pos + width - rem)
 
 
-def _traverse_system_handles_by_index(system_info, i, process_ids):
-    handle_info = system_info.Handles[i]
-    handle = handle_info.HandleValue
-    process_id = handle_info.UniqueProcessId
-    process_ids = [int(x) if isinstance(x, str) and x.isdigit() else x for x in process_ids]
-    if isinstance(process_ids, list) and process_id not in process_ids:
+def iter_handle_table_entries(buf, process_ids=None) -> Iterator[HandleEntry]:
+    """
+    解析系统句柄表缓冲区(bytes/bytearray/mmap), 不为每个表项创建对象.
+    指定 process_ids 时先取出 pid 列, 以字节串搜索代替逐项比较, 只解析命中的表项并按表中顺序返回
+    """
+    header, size = HANDLE_TABLE_HEADER.size, HANDLE_TABLE_ENTRY.size
+    count, _ = HANDLE_TABLE_HEADER.unpack_from(buf, 0)
+    count = min(count, (len(buf) - header) // size)
+    end = header + count * size
+    pids = _normalize_pids(process_ids)
+    if pids is None:
+        for offset in range(header, end, size):
+            yield _entry_at(buf, offset)
+        return
+    pids = [pid for pid in pids if isinstance(pid, int) and 0 <= pid < 1 << (8 * _PTR_STRUCT.size)]
+    if not pids or count == 0:
+        return
+    column = _pid_column_bytes(buf, end)
+    for index in sorted(i for pid in pids for i in _find_indexes_of_pid(column, pid)):
+        yield _entry_at(buf, header + index * size)
+
+
+def _nt_query_system_handle_information(buf: bytearray) -> Tuple[int, int]:
+    """把系统句柄表读入 buf, 返回 (状态码, 所需字节数)"""
+    c_buf = (c_char * len(buf)).from_buffer(buf)
+    return_length = c_ulong(0)
+    status = ntdll.NtQuerySystemInformation(
+        SystemExtendedHandleInformation, c_buf, len(buf), byref(return_length))
+    del c_buf
+    return status, return_length.value
+
+
+class SystemHandleTableReader:
+    """
+    系统句柄表读取器: 复用同一块缓冲区, 并记住上次所需的大小,
+    通常一次系统调用即可读到整张表, 不再从超大缓冲区起步、也不再按 4 倍反复扩容
+    """
+    INITIAL_SIZE = HANDLE_TABLE_HEADER.size + HANDLE_TABLE_ENTRY.size * 0x20000
+    MAX_RETRY = 8
+
+    def __init__(self, query: Callable[[bytearray], Tuple[int, int]] = None):
+        self._query = query if query is not None else _nt_query_system_handle_information
+        self._size = self.INITIAL_SIZE
+        self._buf: Optional[bytearray] = None
+        self._lock = threading.Lock()
+
+    @property
+    def buffer_size(self) -> int:
+        return self._size
+
+    def _read(self) -> Optional[bytearray]:
+        for _ in range(self.MAX_RETRY):
+            if self._buf is None or len(self._buf) < self._size:
+                self._buf = bytearray(self._size)
+            status, needed = self._query(self._buf)
+            if status == STATUS_SUCCESS:
+                return self._buf
+            if status != STATUS_INFO_LENGTH_MISMATCH:
+                Logger().error(f"查询系统句柄表失败: {status:#x}")
+                return None
+            # 两次调用之间句柄数还会增长, 按所需大小多留 1/8 余量; 未返回所需大小时翻倍
+            self._size = max(needed + needed // 8, self._size * 2) if needed else self._size * 2
+        Logger().error(f"查询系统句柄表失败: 重试 {self.MAX_RETRY} 次后缓冲区仍不足")
         return None
-    try:
-        source_process = OpenProcess(PROCESS_ALL_ACCESS | PROCESS_DUP_HANDLE | PROCESS_SUSPEND_RESUME, False,
-                                     process_id)
-    except:
+
+    def find(self, process_ids=None) -> List[HandleEntry]:
+        """读取系统句柄表, 返回属于 process_ids 的表项(不传表示全部)"""
+        with self._lock:
+            buf = self._read()
+            if buf is None:
+                return []
+            return list(iter_handle_table_entries(buf, process_ids))
+
+
+_handle_table_reader = SystemHandleTableReader()
+
+
+# 关闭互斥体(及其他具名同步对象)和配置文件锁时只需解析这些类型句柄的名称, 由这些调用方显式传入; 默认(None)不限类型
+HANDLE_TYPES_OF_INTEREST = ("Mutant", "Event", "Semaphore", "Section", "File")
+# 单个句柄名称查询的最长等待时间(秒); 同步管道等句柄的名称查询可能永不返回
+NAME_QUERY_TIMEOUT = 0.5
+
+
+class _DaemonWorkers:
+    """
+    由守护线程组成的有界工作池: 卡死在系统调用里的线程不会阻止程序退出,
+    发现有任务超时后可补充线程, 但总数不超过 max_workers * 4
+    """
+
+    def __init__(self, max_workers, name):
+        self.max_workers = max_workers
+        self.name = name
+        self._queue = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self._extra = 0
+        self._lock = threading.Lock()
+
+    def _ensure_threads(self):
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < min(self.max_workers + self._extra, self.max_workers * 4):
+                t = threading.Thread(target=self._work, name=f"{self.name}_{len(self._threads)}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def _work(self):
+        while True:
+            future, fn, args = self._queue.get()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def submit(self, fn, *args) -> Future:
+        future = Future()
+        self._queue.put((future, fn, args))
+        self._ensure_threads()
+        return future
+
+    def add_replacement(self):
+        """有线程可能已卡死, 补充一个线程"""
+        with self._lock:
+            self._extra += 1
+        self._ensure_threads()
+
+
+class HandleScanner:
+    """
+    分阶段查找句柄, 越靠前的阶段越便宜:
+    1. 在句柄表上按 pid 过滤
+    2. 按对象类型序号过滤(序号 -> 类型名 只需为每个序号查询一次), 只保留互斥体/文件
+    3. 每个 pid 只打开一次进程, 复制句柄后交给有界线程池查询名称, 每个句柄最多等待 timeout 秒
+    结果以生成器按表项顺序逐个产出, 调用方可以边查找边处理(如关闭句柄).
+    系统调用集中在几个静态方法中, 可在子类中替换以便测试
+    """
+
+    def __init__(self, reader: SystemHandleTableReader, max_workers=4, timeout=NAME_QUERY_TIMEOUT):
+        self.reader = reader
+        self.timeout = timeout
+        self._workers = _DaemonWorkers(max_workers, "handle_name")
+        # 对象类型序号在系统启动后不变
+        self._type_names: Dict[int, str] = {}
+
+    @staticmethod
+    def open_process(pid):
+        return OpenProcess(PROCESS_DUP_HANDLE, False, pid) or None
+
+    @staticmethod
+    def close_process(process):
+        CloseHandle(process)
+
+    @staticmethod
+    def duplicate(process, handle):
+        return pywinhandle.duplicate_object(process, handle)
+
+    @staticmethod
+    def close_duplicate(duplicated_handle):
+        pywinhandle.close(duplicated_handle)
+
+    @staticmethod
+    def query_type(duplicated_handle) -> Optional[str]:
+        basic_info = pywinhandle.query_object_basic_info(duplicated_handle)
+        if basic_info and basic_info.TypeInfoSize >= 0:
+            type_info = pywinhandle.query_object_type_info(duplicated_handle, basic_info.TypeInfoSize)
+            if type_info:
+                return type_info.TypeName.Buffer[0]
         return None
-    handle_name = None
-    handle_type = None
-    duplicated_handle = pywinhandle.duplicate_object(source_process, handle)
-    # Printer().debug(f"Duplicated handle: {duplicated_handle}")
-    # try:
-    #     Printer().debug("----------------------------------------------------------")
-    #     Printer().debug(f"Duplicated handle: {duplicated_handle}")
-    #     basic_info = query_object_basic_info(duplicated_handle)
-    #     Printer().debug(f"Basic info: {basic_info}")
-    #     name_info_size = basic_info.NameInfoSize
-    #     Printer().debug(f"Name info size: {name_info_size}")
-    #     type_info_size = basic_info.TypeInfoSize
-    #     Printer().debug(f"Type info size: {type_info_size}")
-    #     name_info = query_object_name_info(duplicated_handle, basic_info.NameInfoSize)
-    #     handle_name = name_info.Name.Buffer[0]
-    #     type_info = query_object_type_info(duplicated_handle, basic_info.TypeInfoSize)
-    #     handle_type = type_info.TypeName.Buffer[0]
-    #     # Printer().debug(f"Handle name: {handle_name}, Handle type: {handle_type}")
-    # except:
-    #     pass
-    # Printer().debug(f"Basic info: {basic_info}")
-    if duplicated_handle:
+
+    @staticmethod
+    def query_name(duplicated_handle) -> Optional[str]:
         basic_info = pywinhandle.query_object_basic_info(duplicated_handle)
-        if basic_info:
-            if basic_info.NameInfoSize >= 0:
-                name_info = pywinhandle.query_object_name_info(duplicated_handle, basic_info.NameInfoSize)
-                if name_info:
-                    handle_name = name_info.Name.Buffer[0]
-            if basic_info.TypeInfoSize >= 0:
-                type_info = pywinhandle.query_object_type_info(duplicated_handle, basic_info.TypeInfoSize)
-                if type_info:
-                    handle_type = type_info.TypeName.Buffer[0]
-        pywinhandle.close(duplicated_handle)
-    return process_id, handle, handle_name, handle_type
+        if basic_info and basic_info.NameInfoSize >= 0:
+            name_info = pywinhandle.query_object_name_info(duplicated_handle, basic_info.NameInfoSize)
+            if name_info:
+                return name_info.Name.Buffer[0]
+        return None
 
+    def _query_name_and_close(self, duplicated_handle) -> Optional[str]:
+        try:
+            return self.query_name(duplicated_handle)
+        finally:
+            self.close_duplicate(duplicated_handle)
+
+    def _learn_type_names(self, entries: List[HandleEntry], process_of):
+        """为尚未知道类型名的每个类型序号, 取其中一个句柄查询类型名"""
+        tried: Dict[int, int] = {}
+        for entry in entries:
+            index = entry.object_type_index
+            if index in self._type_names or tried.get(index, 0) >= 3:
+                continue
+            tried[index] = tried.get(index, 0) + 1
+            process = process_of(entry.process_id)
+            duplicated_handle = self.duplicate(process, entry.handle) if process else None
+            if not duplicated_handle:
+                continue
+            try:
+                type_name = self.query_type(duplicated_handle)
+            finally:
+                self.close_duplicate(duplicated_handle)
+            if type_name is not None:
+                self._type_names[index] = type_name
+
+    def _wait_name(self, future: Future, entry: HandleEntry) -> Optional[str]:
+        try:
+            return future.result(timeout=self.timeout)
+        except FuturesTimeoutError:
+            Logger().warning(f"查询句柄名称超时, 已跳过: pid={entry.process_id}, handle={entry.handle}")
+            self._workers.add_replacement()
+        except Exception as e:
+            Logger().error(e)
+        return None
 
-def pywinhandle_find_handles_by_pids_and_handle_names(process_ids=None, handle_names=None):
-    result = []
-    system_info = _pywinhandle_query_system_handle_information()
-    if system_info.HandleCount is None:
-        return result
-    for i in range(system_info.HandleCount):
-        res = _traverse_system_handles_by_index(system_info, i, process_ids)
-        if isinstance(res, tuple) and len(res) == 4:
-            process_id, handle, handle_name, handle_type = res
-        else:
-            continue
+    def iter_handles(self, process_ids=None, handle_types=None,
+                     timings: Dict[str, float] = None) -> Iterator[tuple]:
+        """
+        逐个产出 (pid, 句柄值, 句柄名, 类型名)
+        :param process_ids: pid 列表, 不传表示不限制
+        :param handle_types: 需要的对象类型名, None 表示不限制
+        :param timings: 传入字典时, 记录各阶段耗时(秒, 不含调用方处理结果的时间): table, type_filter, names
+        """
+        timings = timings if timings is not None else {}
+        start = time.perf_counter()
+        entries = self.reader.find(process_ids)
+        timings["table"] = time.perf_counter() - start
+        timings["type_filter"] = timings["names"] = 0.0
+        processes = {}
+
+        def process_of(pid):
+            if pid not in processes:
+                try:
+                    processes[pid] = self.open_process(pid)
+                except Exception as e:
+                    Logger().error(e)
+                    processes[pid] = None
+            return processes[pid]
+
+        try:
+            start = time.perf_counter()
+            if handle_types is not None:
+                wanted = set(handle_types)
+                self._learn_type_names(entries, process_of)
+                # 查不出类型的序号保留下来, 交给名称查询阶段
+                entries = [e for e in entries if e.object_type_index not in self._type_names
+                           or self._type_names[e.object_type_index] in wanted]
+            timings["type_filter"] = time.perf_counter() - start
+            start = time.perf_counter()
+            pending = deque()
+            for entry in entries:
+                process = process_of(entry.process_id)
+                duplicated_handle = self.duplicate(process, entry.handle) if process else None
+                if not duplicated_handle:
+                    continue
+                pending.append((entry, self._workers.submit(self._query_name_and_close, duplicated_handle)))
+                # 已完成的先产出, 不等全部提交
+                while pending and pending[0][1].done():
+                    done_entry, future = pending.popleft()
+                    result = self._result_of(done_entry, future)
+                    timings["names"] += time.perf_counter() - start
+                    yield result
+                    start = time.perf_counter()
+            while pending:
+                done_entry, future = pending.popleft()
+                result = self._result_of(done_entry, future)
+                timings["names"] += time.perf_counter() - start
+                yield result
+                start = time.perf_counter()
+            timings["names"] += time.perf_counter() - start
+        finally:
+            for process in processes.values():
+                if process:
+                    self.close_process(process)
+
+    def _result_of(self, entry: HandleEntry, future: Future) -> tuple:
+        name = self._wait_name(future, entry)
+        return entry.process_id, entry.handle, name, self._type_names.get(entry.object_type_index)
+
+
+_handle_scanner = HandleScanner(_handle_table_reader)
+
+
+def _match_handle_names(handle_name, handle_names) -> bool:
+    return any(target == handle_name or target in handle_name for target in handle_names)
+
+
+def _match_handle_name_wildcards(handle_name, handle_name_wildcards) -> bool:
+    return any(fnmatch.fnmatch(handle_name, wildcard) or fnmatch.fnmatch(handle_name, f"*{wildcard}*")
+               for wildcard in handle_name_wildcards)
+
+
+def iter_handles_by_pids_and_handle_names(process_ids=None, handle_names=None,
+                                          handle_types=None) -> Iterator[dict]:
+    """逐个产出名称包含 handle_names 之一的句柄, 传入空值表示不限制"""
+    for process_id, handle, handle_name, handle_type in _handle_scanner.iter_handles(process_ids, handle_types):
         if handle_names:
-            if not handle_name:
+            if not handle_name or not _match_handle_names(handle_name, handle_names):
                 continue
-            # Printer().debug(handle_name)
-            # print(handle_name)
-            matched = False
-            for target in handle_names:
-                if target == handle_name or target in handle_name:
-                    matched = True
-                    break
-            if not matched:
+        yield dict(process_id=process_id, handle=handle, name=handle_name, type=handle_type)
+
+
+def iter_handles_by_pids_and_handle_name_wildcards(process_ids=None, handle_name_wildcards=None,
+                                                   handle_types=None) -> Iterator[dict]:
+    """逐个产出名称符合通配之一的句柄, 传入空值表示不限制"""
+    for process_id, handle, handle_name, handle_type in _handle_scanner.iter_handles(process_ids, handle_types):
+        if isinstance(handle_name_wildcards, list):
+            if not handle_name or not _match_handle_name_wildcards(handle_name, handle_name_wildcards):
                 continue
-        result.append(dict(process_id=process_id, handle=handle, name=handle_name, type=handle_type))
-        # Logger().info(str(result))
-    return result
+        yield dict(process_id=process_id, handle=handle, name=handle_name, type=handle_type)
+
+
+def sweep_handles(pid_wildcards: Dict[int, Iterable[str]], close=True,
+                  handle_types=None) -> Tuple[bool, List[dict], Dict[str, float]]:
+    """
+    只读一次句柄表, 为每个进程按其各自的通配列表匹配句柄, 可选择同时按进程关闭匹配到的句柄
+    :param pid_wildcards: {pid: 句柄名通配列表}
+    :param close: 是否关闭匹配到的句柄
+    :return: (是否全部关闭成功, 匹配到的句柄列表, 各阶段耗时)
+    """
+    with Printer().span_trace.span("sweep_handles", pids=len(pid_wildcards), close=close) as span:
+        success, matched, timings = _sweep_handles(pid_wildcards, close, handle_types)
+        span.set(matched=len(matched), **{k: f"{v:.4f}" for k, v in timings.items()})
+    return success, matched, timings
+
+
+def _sweep_handles(pid_wildcards, close, handle_types) -> Tuple[bool, List[dict], Dict[str, float]]:
+    timings: Dict[str, float] = {}
+    start = time.perf_counter()
+    pid_wildcards = {int(pid) if isinstance(pid, str) and pid.isdigit() else pid: list(w)
+                     for pid, w in pid_wildcards.items() if w}
+    matched: List[dict] = []
+
+    def iter_matched():
+        for process_id, handle, handle_name, handle_type in _handle_scanner.iter_handles(
+                list(pid_wildcards), handle_types, timings):
+            wildcards = pid_wildcards.get(process_id)
+            if handle_name and wildcards and _match_handle_name_wildcards(handle_name, wildcards):
+                handle_dict = dict(process_id=process_id, handle=handle, name=handle_name, type=handle_type)
+                matched.append(handle_dict)
+                yield handle_dict
+
+    success = True
+    if pid_wildcards:
+        if close:
+            # 句柄表按进程排列, 同一进程的句柄连续产出, 关闭时每个进程只打开一次
+            success = pywinhandle_close_handles(iter_matched())
+        else:
+            for _ in iter_matched():
+                pass
+    total = time.perf_counter() - start
+    if close:
+        timings["close"] = max(total - sum(timings.values()), 0.0)
+    timings["total"] = total
+    return success, matched, timings
 
 
+@traced("find_handles_by_names", "process_ids")
+def pywinhandle_find_handles_by_pids_and_handle_names(process_ids=None, handle_names=None):
+    return list(iter_handles_by_pids_and_handle_names(process_ids, handle_names))
+
+
+@traced("find_handles_by_wildcards", "process_ids")
 def pywinhandle_find_handles_by_pids_and_handle_name_wildcards(process_ids=None, handle_name_wildcards=None):
     """根据传入的pid列表和句柄通配列表查找符合条件的句柄,传入空值表示不限制."""
     Printer().debug(f"参数: {process_ids}, {handle_name_wildcards}")
-    result = []
-    system_info = _pywinhandle_query_system_handle_information()
-    if system_info.HandleCount is None:
-        return result
-    for i in range(system_info.HandleCount):
-        res = _traverse_system_handles_by_index(system_info, i, process_ids)
-        if isinstance(res, tuple) and len(res) == 4:
-            process_id, handle, handle_name, handle_type = res
-        else:
-            continue
-        if isinstance(handle_name_wildcards, list):
-            if not handle_name:
-                continue
-            # print(handle_name)
-            matched = False
-            for wildcard in handle_name_wildcards:
-                if fnmatch.fnmatch(handle_name, wildcard):
-                    matched = True
-                    break
-                if fnmatch.fnmatch(handle_name, f"*{wildcard}*"):
-                    matched = True
-                    break
-            if not matched:
-                continue
-        result.append(dict(process_id=process_id, handle=handle, name=handle_name, type=handle_type))
-    return result
+    return list(iter_handles_by_pids_and_handle_name_wildcards(process_ids, handle_name_wildcards))
 
 
 def pywinhandle_close_handles(handle_dicts):
+    """关闭句柄; handle_dicts 可以是查找句柄的生成器, 查到一个关一个. 每个进程只打开一次"""
+    success = True
+    processes = {}
     try:
-        processes = {}
         for h in handle_dicts:
             process_id = h['process_id']
             handle = h['handle']
-            process = processes.get(process_id)
-            if not process:
-                process = OpenProcess(PROCESS_DUP_HANDLE, False, process_id)
-                processes[process_id] = process
-            DuplicateHandle(process, handle, 0, 0, 0, DUPLICATE_CLOSE_SOURCE)
-        for p in processes.values():
-            CloseHandle(p)
-        return True
+            try:
+                process = processes.get(process_id)
+                if not process:
+                    process = OpenProcess(PROCESS_DUP_HANDLE, False, process_id)
+                    processes[process_id] = process
+                DuplicateHandle(process, handle, 0, 0, 0, DUPLICATE_CLOSE_SOURCE)
+                Printer().print_vn(f"[INFO]已关闭句柄: {h}")
+            except Exception as e:
+                Logger().error(e)
+                success = False
     except Exception as e:
         Logger().error(e)
-        return False
+        success = False
+    finally:
+        for p in processes.values():
+            if p:
+                CloseHandle(p)
+    return success
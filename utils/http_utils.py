@@ -0,0 +1,131 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeoutError
+from typing import Any, Callable, Dict, List, Optional
+
+import requests
+
+from utils.logger_utils import mylogger as logger
+
+
+def text_digest(text: str) -> str:
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class FetchResult:
+    """一次镜像竞速的结果; not_modified 为 True 时表示服务器返回 304, 内容与 payload_digest 对应的版本一致"""
+
+    def __init__(self, url: str, payload_digest: str, data: Any = None, not_modified: bool = False):
+        self.url = url
+        self.payload_digest = payload_digest
+        self.data = data
+        self.not_modified = not_modified
+
+    def __repr__(self):
+        return f"FetchResult(url={self.url}, digest={self.payload_digest}, not_modified={self.not_modified})"
+
+
+class MirrorFetcher:
+    """
+    多镜像并发竞速下载:
+    - 同时请求所有镜像, 采用最先返回且能通过 parse 校验的响应, 失败/超时/内容无效的镜像会被忽略
+    - 记录每个镜像的 ETag/Last-Modified 及对应的内容摘要, 下次带上条件请求头, 服务器返回 304 时不再下载
+    - parse 的结果按内容摘要缓存, 内容不变时不会重复解析(如解密)
+    """
+
+    def __init__(self, urls: List[str], parse: Callable[[str], Any] = None, timeout: float = 2.0,
+                 validators: Dict[str, dict] = None, parse_cache_size: int = 4):
+        self.urls = list(dict.fromkeys(urls))
+        self.parse = parse if parse is not None else (lambda text: text)
+        self.timeout = timeout
+        # {url: {"etag": ..., "last_modified": ..., "digest": ...}}
+        self.validators: Dict[str, dict] = dict(validators or {})
+        self.parse_cache_size = parse_cache_size
+        self._parse_cache: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def seed_parse_cache(self, payload_digest: str, data: Any):
+        """预置某个内容摘要对应的解析结果(如本地已保存的解密结果)"""
+        with self._lock:
+            self._parse_cache[payload_digest] = data
+            self._parse_cache.move_to_end(payload_digest)
+            while len(self._parse_cache) > self.parse_cache_size:
+                self._parse_cache.popitem(last=False)
+
+    def _parse_with_cache(self, payload_digest: str, text: str) -> Any:
+        with self._lock:
+            if payload_digest in self._parse_cache:
+                self._parse_cache.move_to_end(payload_digest)
+                return self._parse_cache[payload_digest]
+        data = self.parse(text)
+        self.seed_parse_cache(payload_digest, data)
+        return data
+
+    def _conditional_headers(self, url, expected_digest) -> dict:
+        """只有该镜像上次返回的内容就是本地当前版本时, 才发送条件请求头"""
+        validator = self.validators.get(url)
+        if expected_digest is None or not validator or validator.get("digest") != expected_digest:
+            return {}
+        headers = {}
+        if validator.get("etag"):
+            headers["If-None-Match"] = validator["etag"]
+        if validator.get("last_modified"):
+            headers["If-Modified-Since"] = validator["last_modified"]
+        return headers
+
+    def _fetch_one(self, url, expected_digest) -> Optional[FetchResult]:
+        headers = self._conditional_headers(url, expected_digest)
+        try:
+            response = requests.get(url, headers=headers, timeout=self.timeout)
+        except requests.exceptions.Timeout:
+            logger.warning(f"请求 {url} 超时")
+            return None
+        except Exception as e:
+            logger.warning(f"请求 {url} 失败: {e}")
+            return None
+        if response.status_code == 304 and headers:
+            with self._lock:
+                cached = self._parse_cache.get(expected_digest)
+            return FetchResult(url, expected_digest, cached, not_modified=True)
+        if response.status_code != 200:
+            logger.warning(f"从 {url} 获取失败: {response.status_code}")
+            return None
+        text = response.text
+        payload_digest = text_digest(text)
+        try:
+            data = self._parse_with_cache(payload_digest, text)
+        except Exception as e:
+            logger.warning(f"{url} 返回的内容无效: {e}")
+            return None
+        with self._lock:
+            self.validators[url] = {
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "digest": payload_digest,
+            }
+        return FetchResult(url, payload_digest, data)
+
+    def fetch(self, expected_digest: str = None, urls: List[str] = None) -> Optional[FetchResult]:
+        """
+        并发请求所有镜像, 返回第一个有效结果; 全部失败返回 None
+        :param expected_digest: 本地当前版本的内容摘要, 传入后对返回过该版本的镜像发送条件请求
+        :param urls: 本次使用的镜像列表, 不传则使用初始化时的列表
+        """
+        urls = list(dict.fromkeys(urls)) if urls is not None else self.urls
+        if len(urls) == 0:
+            return None
+        pool = ThreadPoolExecutor(max_workers=len(urls), thread_name_prefix="mirror_fetch")
+        futures = [pool.submit(self._fetch_one, url, expected_digest) for url in urls]
+        try:
+            # 各请求自带超时, 这里再多留一点余量给解析
+            for future in as_completed(futures, timeout=self.timeout * 2 + 1):
+                result = future.result()
+                if result is not None:
+                    return result
+        except FuturesTimeoutError:
+            logger.warning(f"所有镜像均未在时限内返回有效内容")
+        finally:
+            # 不等待落后的请求, 它们会在自身超时后结束
+            pool.shutdown(wait=False, cancel_futures=True)
+        return None
@@ -1,7 +1,7 @@
 import fnmatch
 import sys
 import tkinter as tk
-from typing import Tuple, List, Optional
+from typing import Tuple, List, Optional, Dict, Iterable, NamedTuple
 
 import pygetwindow as gw
 import uiautomation
@@ -13,7 +13,9 @@ import win32process
 from uiautomation import Control
 
 from public.enums import Position
-from utils.logger_utils import mylogger as logger, Printer
+from utils import wait_utils
+from utils.logger_utils import mylogger as logger
+from utils.wnd_rule_utils import compile_wnd_rule, compile_wildcards
 
 # set coinit_flags (there will be a warning message printed in console by pywinauto, you may ignore that)
 sys.coinit_flags = 2  # COINIT_APARTMENTTHREADED
@@ -167,161 +169,10 @@ class HwndGetter:
         # debug_hwnds_to_md(hwnds)
         if class_wildcards is None:
             return hwnds
-        res = []
-        for hwnd in hwnds:
-            try:
-                with auto.UIAutomationInitializerInThread():
-                    ctrl = uiautomation.ControlFromHandle(hwnd)
-                    if any(fnmatch.fnmatch(ctrl.ClassName, wildcard) for wildcard in class_wildcards):
-                        res.append(hwnd)
-            except Exception as e:
-                print(f"Failed on hwnd {hwnd}: {e}")
-                continue
-        return res
+        return compile_wnd_rule({"ClassNameWildcards": list(class_wildcards)}).filter(hwnds)
 
     """用条件字典来获取"""
 
-    @classmethod
-    def _final_select_hwnds(cls, hwnds, hwnd_to_ctrl, final_select_methods):
-        """
-        按照方法集合模式，从候选 hwnd 中逐步筛选，直到选出唯一一个。
-        final_select_methods: List[Dict] — 每个字典是一个“方法”，按顺序尝试
-        """
-
-        def get_metric_value(hwnd, metric):
-            rect = hwnd_to_ctrl[hwnd].BoundingRectangle
-            if metric.startswith("Size"):
-                return (rect.right - rect.left) * (rect.bottom - rect.top)
-            elif metric.startswith("Width"):
-                return rect.right - rect.left
-            elif metric.startswith("Height"):
-                return rect.bottom - rect.top
-            else:
-                raise ValueError(f"Unknown metric: {metric}")
-
-        def filter_by_condition(candidates, key, value):
-            """单条件过滤"""
-            negate = False
-            if key.startswith("!"):
-                negate = True
-                key = key[1:]
-
-            if key.endswith(("Extreme", "End")):
-                metric = key.replace("Extreme", "").replace("End", "")
-                reverse = (value == "max")
-                vals = [(hwnd, get_metric_value(hwnd, metric)) for hwnd in candidates]
-                Printer().print_vn(f"[hwnd, {metric}]: {vals}")
-                extreme_val = max(v for _, v in vals) if reverse else min(v for _, v in vals)
-                filtered = [hwnd for hwnd, val in vals if val == extreme_val]
-            elif key.endswith("Equals"):
-                metric = key.replace("Equals", "")
-                filtered = [hwnd for hwnd in candidates if get_metric_value(hwnd, metric) == value]
-            elif key.endswith("Greater"):
-                metric = key.replace("Greater", "")
-                filtered = [hwnd for hwnd in candidates if get_metric_value(hwnd, metric) > value]
-            elif key.endswith("Less"):
-                metric = key.replace("Less", "")
-                filtered = [hwnd for hwnd in candidates if get_metric_value(hwnd, metric) < value]
-            else:
-                raise ValueError(f"Unknown condition key: {key}")
-
-            if negate:
-                hwnd_set = set(candidates)
-                return list(hwnd_set - set(filtered))
-            return filtered
-
-        def apply_method(candidates, method_dict):
-            """应用一个方法（可能是 OR 块，也可能是多个条件）"""
-            if not candidates:
-                return []
-            if len(candidates) == 1:
-                return candidates
-
-            result = candidates[:]
-            # 普通条件（AND 关系）: 每次筛选的输入都是上一个条件的输出
-            for k, v in method_dict.items():
-                if k.startswith("OR"):
-                    or_conditions = method_dict[k]
-                    result_set = set()
-                    for cond in or_conditions:
-                        # OR块的处理: 对每个条件的输入都是相同的 result
-                        sub_candidates = result
-                        for sk, sv in cond.items():
-                            sub_candidates = filter_by_condition(sub_candidates, sk, sv)
-                        result_set.update(sub_candidates)
-                    result = list(result_set)
-                result = filter_by_condition(result, k, v)
-            return result
-
-        # 对所有方法, 只要有一个方法筛选出唯一结果, 则直接返回. 每个方法的输入都是相同的, 即hwnds[:]
-        candidate_hwnds = hwnds[:]
-        for method in final_select_methods:
-            elected_hwnds = apply_method(candidate_hwnds, method)
-            # Printer().debug(f"尾筛: [{method}]{elected_hwnds}")
-            if len(elected_hwnds) == 1:
-                return elected_hwnds
-
-        return candidate_hwnds
-
-    @classmethod
-    def _hwnd_matches_rules(cls, hwnd, hwnd_to_ctrl, rules):
-        """递归判断某个 hwnd 是否符合规则"""
-        # 取 ctrl（缓存复用）
-        if hwnd not in hwnd_to_ctrl:
-            try:
-                hwnd_to_ctrl[hwnd] = uiautomation.ControlFromHandle(hwnd)
-            except Exception as e:
-                print(f"获取 ctrl 失败 {hwnd}: {e}")
-                return False
-        ctrl: Control = hwnd_to_ctrl[hwnd]
-        if not isinstance(ctrl, Control):
-            return False
-
-        for key, value in rules.items():
-            # 检查是否取反
-            negate = False
-            if key.startswith("!"):
-                negate = True
-                key = key[1:]  # 去掉 "!"
-            if key.startswith("OR"):
-                matched = any(cls.uiautomation_filter_hwnds_by_matching_dict([hwnd], sub_rule) for sub_rule in value)
-            elif key == "ClassNameWildcards":
-                matched = any(fnmatch.fnmatch(ctrl.ClassName, pattern) for pattern in value)
-            elif key == "FinalSelect":
-                # 留到外层处理
-                continue
-            elif key in ("FirstChild", "LastChild"):
-                # 子规则递归
-                sub_ctrl = None
-                if key == "FirstChild":
-                    sub_ctrl = ctrl.GetFirstChildControl()
-                elif key == "LastChild":
-                    sub_ctrl = ctrl.GetLastChildControl()
-                Printer().debug(f"子控件详情:{str(sub_ctrl)}")
-                matched = False
-                if isinstance(sub_ctrl, Control):
-                    sub_hwnd = getattr(sub_ctrl, "Handle", None)
-                    if sub_hwnd:
-                        sub_matched = cls.uiautomation_filter_hwnds_by_matching_dict([sub_hwnd], value)
-                        matched = len(sub_matched) == 1
-            else:
-                if not hasattr(ctrl, key):
-                    matched = False
-                else:
-                    attr_val = getattr(ctrl, key)
-                    if callable(attr_val):
-                        attr_val = attr_val()
-                    matched = (attr_val == value)
-
-            # 如果需要取反
-            if negate:
-                matched = not matched
-
-            if not matched:
-                return False
-
-        return True
-
     @classmethod
     def uiautomation_filter_hwnds_by_matching_dict(cls, all_hwnds, rules_dict: dict) -> list:
         """
@@ -335,17 +186,8 @@ class HwndGetter:
         :param all_hwnds: 待筛选 hwnd 列表
         :return: 符合条件的 hwnd 列表
         """
-        hwnd_to_ctrl = {}
-        with auto.UIAutomationInitializerInThread():
-            matched_hwnds = [hwnd for hwnd in all_hwnds if cls._hwnd_matches_rules(hwnd, hwnd_to_ctrl, rules_dict)]
-        # Printer().debug(f"初筛: {matched_hwnds}")
-
-        # 初筛窗口不唯一, 则进入尾筛 FinalSelect
-        if "FinalSelect" in rules_dict and len(matched_hwnds) > 1:
-            final_select_methods = rules_dict["FinalSelect"]  # 这里直接取列表
-            matched_hwnds = cls._final_select_hwnds(matched_hwnds, hwnd_to_ctrl, final_select_methods)
-
-        return matched_hwnds
+        # 规则只编译一次, 控件属性在短时间内跨调用复用
+        return compile_wnd_rule(rules_dict).filter(all_hwnds)
 
     @staticmethod
     def _print_hwnds_to_md(hwnds):
@@ -405,12 +247,87 @@ class HwndGetter:
         return None, None
 
 
+class WindowInfo(NamedTuple):
+    hwnd: int
+    pid: int
+    class_name: str
+    visible: bool
+
+
+class WindowSnapshot:
+    """
+    顶层窗口快照: 只枚举一次, 按 pid、类名、可见性建立索引, 供一次操作中的多次查询共用.
+    快照不会自动更新, 轮询等待窗口出现/关闭时应每次重新获取
+    """
+
+    def __init__(self, infos: Iterable[WindowInfo]):
+        self.windows: Dict[int, WindowInfo] = {}
+        self._by_pid: Dict[int, List[int]] = {}
+        self._by_class: Dict[str, List[int]] = {}
+        for info in infos:
+            self.windows[info.hwnd] = info
+            self._by_pid.setdefault(info.pid, []).append(info.hwnd)
+            self._by_class.setdefault(info.class_name, []).append(info.hwnd)
+
+    @classmethod
+    def take(cls) -> "WindowSnapshot":
+        infos = []
+        process_id = wintypes.DWORD()
+        class_name = ctypes.create_unicode_buffer(256)
+
+        def enum_windows_callback(hwnd, _lParam):
+            GetWindowThreadProcessId(hwnd, ctypes.byref(process_id))
+            GetClassName(hwnd, class_name, 256)
+            infos.append(WindowInfo(hwnd, process_id.value, class_name.value, bool(IsWindowVisible(hwnd))))
+            return True
+
+        EnumWindows(EnumWindowsProc(enum_windows_callback), 0)
+        return cls(infos)
+
+    def __contains__(self, hwnd):
+        return hwnd in self.windows
+
+    def __len__(self):
+        return len(self.windows)
+
+    def get(self, hwnd) -> Optional[WindowInfo]:
+        return self.windows.get(hwnd)
+
+    def hwnds_of_pid(self, pid, class_wildcards=None, visible_only=False) -> List[int]:
+        """进程的顶层窗口, 可按类名通配和可见性筛选"""
+        hwnds = self._by_pid.get(pid, [])
+        if visible_only:
+            hwnds = [h for h in hwnds if self.windows[h].visible]
+        if class_wildcards:
+            match = compile_wildcards(w for w in class_wildcards if w is not None)
+            hwnds = [h for h in hwnds if match(self.windows[h].class_name)]
+        return list(hwnds)
+
+    def hwnds_of_class(self, class_wildcard, visible_only=False) -> List[int]:
+        """类名符合通配的所有顶层窗口; 不含通配符时直接查索引"""
+        if any(c in class_wildcard for c in "*?["):
+            hwnds = [h for name, hs in self._by_class.items() if fnmatch.fnmatch(name, class_wildcard) for h in hs]
+        else:
+            hwnds = list(self._by_class.get(class_wildcard, []))
+        if visible_only:
+            hwnds = [h for h in hwnds if self.windows[h].visible]
+        return hwnds
+
+    def group_by_pids(self, pids, visible_only=False) -> Dict[int, List[int]]:
+        return {pid: self.hwnds_of_pid(pid, visible_only=visible_only) for pid in set(pids)}
+
+
 class Win32HwndGetter:
     """win32 API 在获取速度上有优势, 但对于部分窗口并不能精确获取类名"""
 
     @staticmethod
-    def win32_get_hwnds_by_pid_and_class_wildcards(pid, class_wildcards=None):
-        """winAPI实现的 获取指定进程 pid 的类名符合通配模式的所有顶层窗口控件"""
+    def win32_get_hwnds_by_pid_and_class_wildcards(pid, class_wildcards=None, snapshot: WindowSnapshot = None):
+        """
+        winAPI实现的 获取指定进程 pid 的类名符合通配模式的所有顶层窗口控件
+        :param snapshot: 传入窗口快照时直接从快照中查询, 不再枚举
+        """
+        if snapshot is not None:
+            return snapshot.hwnds_of_pid(pid, class_wildcards)
         hwnds_set = set()
 
         def enum_windows_callback(hwnd, _lParam):
@@ -434,6 +351,12 @@ class Win32HwndGetter:
         EnumWindows(EnumWindowsProc(enum_windows_callback), 0)
         return list(hwnds_set)
 
+    @staticmethod
+    def win32_group_hwnds_by_pids(pids, visible_only=True, snapshot: WindowSnapshot = None) -> Dict[int, List[int]]:
+        """只枚举一次顶层窗口, 返回 {pid: 窗口句柄列表}, 只包含 pids 中的进程"""
+        snapshot = snapshot if snapshot is not None else WindowSnapshot.take()
+        return snapshot.group_by_pids(pids, visible_only)
+
     @classmethod
     def win32_wait_hwnd_by_class(cls, class_name, timeout=20, title=None):
         """等待指定类名的窗口打开，并返回窗口句柄"""
@@ -840,24 +763,12 @@ def bring_hwnd_next_to_left_of_hwnd2(hwnd1, hwnd2):
 
 def wait_hwnd_close(hwnd, timeout=20):
     """等待指定窗口句柄的窗口关闭"""
-    start_time = time.time()
-    while time.time() - start_time < timeout:
-        if win32gui.IsWindow(hwnd) == 0:  # 检查窗口是否存在
-            return True
-        time.sleep(1)
-    return False
+    return wait_utils.timed_waiter.wait(wait_utils.window_closed(hwnd), timeout)
 
 
 def wait_hwnds_close(hwnds, timeout=20) -> bool:
     """等待所有指定句柄的窗口关闭"""
-    ddl_time = time.time() + timeout
-    while True:
-        # 判断所有 hwnd 是否都不存在了
-        all_closed = all(not win32gui.IsWindow(hwnd) for hwnd in hwnds)
-        if all_closed:
-            return True
-        if time.time() > ddl_time:
-            return False
+    return wait_utils.timed_waiter.wait(wait_utils.windows_closed(hwnds), timeout)
 
 
 def try_close_hwnds_in_set_and_return_remained(hwnds_set: set, timeout=5):
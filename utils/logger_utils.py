@@ -4,11 +4,14 @@ import builtins
 import functools
 import inspect
 import io
+import json
 import logging
 import os
 import sys
+import threading
 import time
 import traceback
+from collections import deque
 from dataclasses import dataclass
 from typing import Optional, Callable, Any, List, Tuple
 
@@ -211,35 +214,47 @@ class DebugUtils:
         return text
 
     @staticmethod
-    def get_call_stack(sequence="/", max_depth=100):
+    def get_call_stack(sequence="/", max_depth=100, skip=0):
         """
         获取调用栈，并返回当前方法及往前回溯指定层数的方法名称，按顺序用连接符连接。
         :param sequence: 连接符
         :param max_depth: 回溯的层数
+        :param skip: 额外跳过的调用方层数
         :return: 调用栈字符串，从前往后按连接符连接的方法名。
         """
-        # 获取当前的调用栈
-        stack = inspect.stack()
-
-        # 从调用方开始，跳过 get_call_stack 本身，回溯至多 max_depth 层
-        call_chain = [frame_info.function for frame_info in stack[1:max_depth + 1]]
+        # 直接沿帧链回溯: inspect.stack() 会为每一帧读取源码上下文, 每行输出都调用时开销很大
+        frame = sys._getframe(1 + skip)
+        call_chain = []
+        while frame is not None and len(call_chain) < max_depth:
+            call_chain.append(frame.f_code.co_name)
+            frame = frame.f_back
 
         # 从前往后连接方法名
         return sequence.join(reversed(call_chain))
 
     @staticmethod
-    def get_call_stack_indent(sequence="··· ", max_depth=100):
+    def get_stack_depth(skip=0) -> int:
+        """当前调用栈深度(包含调用方自身), skip 为额外跳过的调用方层数"""
+        frame = sys._getframe(1 + skip)
+        depth = 0
+        while frame is not None:
+            depth += 1
+            frame = frame.f_back
+        return depth
+
+    @staticmethod
+    def get_call_stack_indent(sequence="··· ", max_depth=100, stack_depth=None):
         """
         根据调用栈的深度返回缩进字符串，使用自定义的序列循环输出。
         :param sequence: 自定义序列，缩进按照该序列输出并循环。
         :param max_depth: 最大回溯层数，默认值为 100 层。
+        :param stack_depth: 已知的调用栈深度, 不传则从调用方开始计算
         :return: 生成的缩进字符串，基于调用栈深度并减去 2 层。
         """
-        # 获取当前的调用栈
-        stack = inspect.stack()
-
-        # 计算缩进层数，最少为 1 层，最多不超过实际栈深度减去2
-        depth = min(max_depth, len(stack) - 1)  # 实际深度减去2层
+        if stack_depth is None:
+            stack_depth = DebugUtils.get_stack_depth(skip=1)
+        # 计算缩进层数，最多不超过实际栈深度
+        depth = min(max_depth, stack_depth)
 
         if depth <= 0:
             return ""  # 如果层数不足，返回空字符串
@@ -291,15 +306,18 @@ class RedirectText(io.TextIOBase):
             self.original_stdout.write(full_text)
             self.original_stdout.flush()
         lines = full_text.splitlines()  # 分割成行
+        stack_prefix = call_stack = None
         for line in lines:
             if self.debug:
                 # 去掉最后一行（可能为空或包含特殊符号）
                 # 保存每行内容到 logs，注意需要排除结尾符号
                 if len(line) > 0:
-                    # 从你的工具中获取前缀、堆栈等结构化部分
-                    stack_prefix = DebugUtils.get_call_stack_indent()  # 缩进前缀
-                    call_stack = DebugUtils.get_call_stack()  # 堆栈
-                    output_prefix = DebugUtils.get_call_stack_indent()  # 输出前缀
+                    # 从你的工具中获取前缀、堆栈等结构化部分; 同一批输出只回溯一次调用栈
+                    if stack_prefix is None:
+                        stack_depth = DebugUtils.get_stack_depth()
+                        stack_prefix = DebugUtils.get_call_stack_indent(stack_depth=stack_depth)  # 缩进前缀
+                        call_stack = DebugUtils.get_call_stack()  # 堆栈
+                    output_prefix = stack_prefix  # 输出前缀
                     output_content = line  # 实际输出内容
 
                     # 保存为字典
@@ -335,6 +353,275 @@ class RedirectText(io.TextIOBase):
         return self.logs  # 返回结构化日志
 
 
+class ScanTracer:
+    """
+    特征码扫描追踪: 替代扫描热循环中逐条 print
+    - 每条规则的调用次数、匹配数、累计耗时始终统计, 每条规则只是一次字典更新
+    - 匹配明细仅在 DETAIL 级别下记录, 且只保存原始对象, 查看时才格式化
+    """
+    OFF = 0
+    SUMMARY = 1
+    DETAIL = 2
+    MAX_DETAILS = 5000
+
+    def __init__(self):
+        self.level = self.SUMMARY
+        self._lock = threading.Lock()
+        self._stats = {}  # {规则标签: [调用次数, 匹配数, 累计耗时]}
+        self._details = deque(maxlen=self.MAX_DETAILS)  # (规则标签, 匹配结果)
+
+    def set_level(self, level):
+        self.level = level
+        return self
+
+    @property
+    def detail_enabled(self) -> bool:
+        return self.level >= self.DETAIL
+
+    def record(self, label, matches, seconds, details=None):
+        """
+        记录一条规则/特征码的一次扫描
+        :param label: 规则标签(通常为原始特征码)
+        :param matches: 匹配数
+        :param seconds: 耗时
+        :param details: 匹配结果列表, 仅在 DETAIL 级别下保存引用
+        """
+        if self.level <= self.OFF:
+            return
+        with self._lock:
+            stat = self._stats.get(label)
+            if stat is None:
+                self._stats[label] = [1, matches, seconds]
+            else:
+                stat[0] += 1
+                stat[1] += matches
+                stat[2] += seconds
+            if details and self.level >= self.DETAIL:
+                self._details.append((label, details))
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._details.clear()
+
+    @staticmethod
+    def _short(label, width=60):
+        label = str(label)
+        return label if len(label) <= width else label[:width - 3] + "..."
+
+    def summary_lines(self) -> List[str]:
+        """按累计耗时降序输出每条规则的统计"""
+        with self._lock:
+            stats = sorted(self._stats.items(), key=lambda item: item[1][2], reverse=True)
+        lines = [f"{'耗时(s)':>9} {'次数':>5} {'匹配':>6}  规则"]
+        for label, (calls, matches, seconds) in stats:
+            mark = "" if matches else "  [未匹配]"
+            lines.append(f"{seconds:>9.4f} {calls:>5} {matches:>6}  {self._short(label)}{mark}")
+        return lines
+
+    def detail_lines(self) -> List[str]:
+        """格式化已记录的匹配明细"""
+        with self._lock:
+            details = list(self._details)
+        lines = []
+        for label, results in details:
+            lines.append(f"[{self._short(label)}]")
+            for res in results:
+                if isinstance(res, dict):
+                    lines.append("  " + ", ".join(f"{k}={v:#x}" if isinstance(v, int) and not isinstance(v, bool)
+                                                  else f"{k}={v}" for k, v in res.items()))
+                else:
+                    lines.append(f"  {res}")
+        return lines
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "attrs", "span_id", "parent_id", "path", "tid", "start", "end")
+
+    def __init__(self, tracer, name, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        """补充属性(如执行中才得知的 pid)"""
+        self.attrs.update(attrs)
+        return self
+
+    def __enter__(self):
+        self.tracer._push(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end = time.perf_counter()
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.tracer._pop(self)
+        return False
+
+
+class _NoSpan:
+    """追踪关闭时使用, 不做任何事"""
+    __slots__ = ()
+
+    def set(self, **attrs):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+class SpanTracer:
+    """
+    区间追踪: 记录带嵌套关系和属性(平台、账号、pid 等)的耗时区间, 可导出为
+    Chrome trace_event JSON(chrome://tracing 或 Perfetto 打开) 和 折叠栈(flamegraph.pl / speedscope 打开).
+    默认关闭, 关闭时 span() 只返回一个空对象
+    """
+    MAX_SPANS = 20000
+    NO_SPAN = _NoSpan()
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._spans = deque(maxlen=self.MAX_SPANS)
+        self._thread_names = {}
+        self._next_id = 1
+
+    def set_enabled(self, enabled: bool):
+        self.enabled = enabled
+        return self
+
+    def span(self, name, **attrs):
+        """用法: with tracer.span("open_sw", sw=sw) as sp: ... sp.set(pid=pid)"""
+        if not self.enabled:
+            return self.NO_SPAN
+        return _Span(self, name, attrs)
+
+    def current(self):
+        """当前线程最内层的区间, 没有时返回空对象"""
+        stack = getattr(self._local, "stack", None)
+        return stack[-1] if stack else self.NO_SPAN
+
+    def _push(self, span: _Span):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        parent = stack[-1] if stack else None
+        with self._lock:
+            span.span_id = self._next_id
+            self._next_id += 1
+        span.parent_id = parent.span_id if parent is not None else None
+        span.path = (parent.path if parent is not None else ()) + (span.name,)
+        span.tid = threading.get_ident()
+        stack.append(span)
+
+    def _pop(self, span: _Span):
+        stack = self._local.stack
+        if stack and stack[-1] is span:
+            stack.pop()
+        with self._lock:
+            self._spans.append(span)
+            if span.tid not in self._thread_names:
+                self._thread_names[span.tid] = threading.current_thread().name
+
+    def reset(self):
+        with self._lock:
+            self._spans.clear()
+            self._thread_names.clear()
+
+    def spans(self) -> list:
+        with self._lock:
+            return list(self._spans)
+
+    def chrome_trace(self) -> dict:
+        """Chrome trace_event 格式(完整事件 ph=X, 时间单位微秒)"""
+        spans = self.spans()
+        with self._lock:
+            thread_names = dict(self._thread_names)
+        origin = min((sp.start for sp in spans), default=0.0)
+        pid = os.getpid()
+        events = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+                  for tid, name in thread_names.items()]
+        for sp in sorted(spans, key=lambda x: x.start):
+            events.append({
+                "name": sp.name, "cat": sp.path[0], "ph": "X", "pid": pid, "tid": sp.tid,
+                "ts": round((sp.start - origin) * 1e6, 1), "dur": round((sp.end - sp.start) * 1e6, 1),
+                "args": {k: str(v) for k, v in sp.attrs.items()},
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def folded_lines(self) -> List[str]:
+        """折叠栈: 每行为 "外层;内层 自身耗时(微秒)", 同一调用路径合并"""
+        spans = self.spans()
+        children_time = {}
+        for sp in spans:
+            if sp.parent_id is not None:
+                children_time[sp.parent_id] = children_time.get(sp.parent_id, 0.0) + sp.end - sp.start
+        folded = {}
+        for sp in spans:
+            self_time = max(sp.end - sp.start - children_time.get(sp.span_id, 0.0), 0.0)
+            key = ";".join(sp.path)
+            folded[key] = folded.get(key, 0.0) + self_time
+        return [f"{path} {int(round(seconds * 1e6))}" for path, seconds in sorted(folded.items())]
+
+    def summary_lines(self) -> List[str]:
+        """按调用路径统计次数与总耗时, 按总耗时降序"""
+        stats = {}
+        for sp in self.spans():
+            stat = stats.setdefault(" > ".join(sp.path), [0, 0.0])
+            stat[0] += 1
+            stat[1] += sp.end - sp.start
+        lines = [f"{'耗时(s)':>9} {'次数':>5}  路径"]
+        for path, (calls, seconds) in sorted(stats.items(), key=lambda item: item[1][1], reverse=True):
+            lines.append(f"{seconds:>9.4f} {calls:>5}  {path}")
+        return lines
+
+    def export(self, dir_path, prefix="mwm_trace") -> Tuple[str, str]:
+        """导出 Chrome trace JSON 和折叠栈文件, 返回两个文件路径"""
+        trace_path = os.path.join(dir_path, f"{prefix}.json")
+        folded_path = os.path.join(dir_path, f"{prefix}.folded")
+        with open(trace_path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f, ensure_ascii=False)
+        with open(folded_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(self.folded_lines()) + "\n")
+        return trace_path, folded_path
+
+
+def traced(name=None, *attr_names):
+    """
+    装饰器: 追踪开启时为函数调用记录一个区间, attr_names 中的参数作为区间属性
+    用法: @traced("open_sw", "sw", "exe"); 与 classmethod/staticmethod 同用时放在其下方
+    """
+
+    def decorator(func):
+        span_name = name or func.__qualname__
+        signature = inspect.signature(func) if attr_names else None
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            tracer = Printer().span_trace
+            if not tracer.enabled:
+                return func(*args, **kwargs)
+            attrs = {}
+            if signature is not None:
+                try:
+                    bound = signature.bind_partial(*args, **kwargs).arguments
+                    attrs = {k: bound[k] for k in attr_names if k in bound}
+                except TypeError:
+                    pass
+            with tracer.span(span_name, **attrs):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
 class Printer:
     _instance = None
     _initialized = False
@@ -360,6 +647,8 @@ class Printer:
             self.vital_msg = None  # 用于保存 Vital 级别的输出
             self.last_msg = None  # 用于存储最后一条消息
             self.normal_msg = None
+            self.scan_trace = ScanTracer()  # 特征码扫描追踪
+            self.span_trace = SpanTracer()  # 登录等流程的区间追踪
             Printer._initialized = True
 
     def print_vn(self, obj=None):
@@ -400,6 +689,13 @@ class Printer:
         kwargs.setdefault("flush", True)
         builtins.print(f"{self.BOLD}{self.BLUE}[{caller_func}] {text}{self.RESET}", **kwargs)
 
+    def print_scan_trace(self, detail=False):
+        """打印扫描追踪的统计(以及明细)"""
+        lines = self.scan_trace.summary_lines()
+        if detail:
+            lines += self.scan_trace.detail_lines()
+        print("\n".join(lines))
+
     def cmd_in(self, *args, **kwargs):
         print(f"{self.GREEN}{self.BOLD}>", *args, f"{self.RESET}", **kwargs)
 
@@ -54,7 +54,12 @@ class Logic2DictParser:
             for f in factors:
                 if not isinstance(f, dict):
                     raise ValueError("Factor must be dict")
-                combined.update(f)
+                for k, v in f.items():
+                    # 多个 OR 块相与时键会重名, 追加序号区分(匹配时按 OR 前缀识别)
+                    key, n = k, 1
+                    while key in combined and k.lstrip("!").startswith("OR"):
+                        key, n = f"{k}{n}", n + 1
+                    combined[key] = v
             return combined
 
     def parse_factor(self) -> dict:
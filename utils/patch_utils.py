@@ -0,0 +1,416 @@
+"""
+补丁规则解析与原子替换:
+- 只依赖标准库与 pattern_utils, 不导入 Windows 模块, 基准测试可在任意平台直接调用
+- 带缓存的扫描与扫描追踪由调用方注入(程序中由 SwInfoUtils 注入), 不注入时直接扫描、不记录
+"""
+import logging
+import mmap
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from readerwriterlock import rwlock
+
+from utils import pattern_utils
+
+logger = logging.getLogger('mylogger')
+
+# 补丁文件的读写锁: 扫描取读锁, 写入补丁取写锁
+rw_lock = rwlock.RWLockFairD()
+
+
+def bytes_to_hex_str(byte_data) -> str:
+    """将 bytes 转换为 'xx xx xx' 形式的十六进制字符串"""
+    return ' '.join([f"{byte:02x}" for byte in byte_data])
+
+
+def int_to_little_endian_hex(value: int, length: int = 4) -> str:
+    """整数转小端序 16 进制字符串 (带空格分隔字节)"""
+    return " ".join(f"{b:02X}" for b in value.to_bytes(length, "little", signed=True))
+
+
+class PatchRuleResolver:
+    """
+    按 simple / custom / jmp_offset 规则在文件映射中解析出补丁字典
+    :param scan_features: 带缓存的扫描 (data, CompiledFeature 列表, 内容指纹) -> {正则字节串: [(地址, 原始字节), ...]}
+    :param record_scan: 扫描追踪 (特征码, 匹配数, 耗时, 匹配结果) -> None
+    """
+
+    def __init__(self, scan_features: Callable = None, record_scan: Callable = None):
+        self.scan_features = scan_features
+        self.record_scan = record_scan
+
+    def _scan(self, data, features: list, fingerprint: str = None, cached=True) -> Dict[bytes, list]:
+        if cached and self.scan_features is not None:
+            return self.scan_features(data, features, fingerprint)
+        with rw_lock.gen_rlock():
+            return pattern_utils.MultiPatternScanner(features).scan(data)
+
+    def resolve_simple_rule(self, mm, patching_rule_dict):
+        """
+        simple类型的特征字典节点: 基本节点, 其余节点
+        """
+        # 调用扫描函数, 扫描函数会返回字典列表, 字典含有offset, original, modified节点
+        original_feature = patching_rule_dict["original"]
+        modified_feature = patching_rule_dict["modified"]
+        left_cut = patching_rule_dict.get("left_cut", 0)
+        right_cut = patching_rule_dict.get("right_cut", 0)
+        simple_res_dicts = self.search_pattern_dicts_by_original_and_modified(
+            mm, original_feature, modified_feature, left_cut, right_cut)
+        # 补充额外节点
+        for key in patching_rule_dict:
+            if key in ["type", "original", "modified", "left_cut", "right_cut"]:
+                continue
+            for simple_res_dict in simple_res_dicts:
+                simple_res_dict[key] = patching_rule_dict[key]
+        return simple_res_dicts
+
+    def resolve_custom_rule(self, mm, patching_rule_dict):
+        """
+        custom类型的特征字典节点: 基本节点, 其余节点
+        """
+        # 调用扫描函数, 扫描函数会返回字典列表, 字典含有offset, original, modified节点
+        original_feature = patching_rule_dict["original"]
+        modified_feature = patching_rule_dict["modified"]
+        left_cut = patching_rule_dict.get("left_cut", 0)
+        right_cut = patching_rule_dict.get("right_cut", 0)
+        simple_res_dicts = self.search_pattern_dicts_by_original_and_modified(
+            mm, original_feature, modified_feature, left_cut, right_cut)
+        # 补充额外节点
+        for key in patching_rule_dict:
+            if key in ["type", "original", "modified", "left_cut", "right_cut"]:
+                continue
+            for simple_res_dict in simple_res_dicts:
+                simple_res_dict[key] = patching_rule_dict[key]
+        for simple_res_dict in simple_res_dicts:
+            simple_res_dict["customizable"] = True
+        return simple_res_dicts
+
+    def resolve_jmp_offset_rule(self, mm, patching_rule_dict: dict) -> List[dict]:
+        """
+        jmp_offset类型的特征字典节点:
+            基本节点, 待计算的地址!! !! !! !!所指向区域的特征, 其余节点
+        """
+        res_dicts = []
+
+        # 预处理 target_features -> target_addrs
+        target_features = patching_rule_dict.get("targets", [])
+        target_res_dicts = self.search_first_pattern_and_get_address_of_marked(mm, target_features)
+        target_addrs = [d["marked_addr"] for d in target_res_dicts]
+        if len(target_addrs) != len(target_features):
+            logger.warning("target_features 数量与 target_addrs 数量不一致")
+            return []
+
+        # 调用扫描函数, 返回待填充的字典列表, 字典含有offset, original, modified节点
+        original_feature = patching_rule_dict.get("original")
+        modified_feature = patching_rule_dict.get("modified")
+        left_cut = patching_rule_dict.get("left_cut", 0)
+        right_cut = patching_rule_dict.get("right_cut", 0)
+        unfilled_res_dicts = self.search_pattern_dicts_by_original_and_modified(
+            mm, original_feature, modified_feature, left_cut, right_cut)
+
+        # 遍历所有扫描到的 res_dict 并填充修改串中的 !!, 若有无法填充的!!段则宣告失败
+        for unfilled_res_dict in unfilled_res_dicts:
+            target_addr_idx = 0  # 目标地址索引
+            start_addr = unfilled_res_dict["offset"]
+            original_str = unfilled_res_dict["original"]
+            expanded_modified = unfilled_res_dict["modified"]
+            # 滑动窗口扫描
+            tokens = expanded_modified.split()
+            i = 0
+            while i < len(tokens):
+                if tokens[i] != "!!":
+                    i += 1
+                else:
+                    j = i
+                    while j < len(tokens) and tokens[j] == "!!":
+                        j += 1
+                    # 此时 i~j-1 是连续 !!
+                    relative_pos = i
+                    length = j - i
+                    if length != 4:
+                        logger.warning("!!连续长度必须为4")
+                        return []  # 长度小于4则失败
+
+                    if target_addr_idx >= len(target_addrs):
+                        logger.warning("所有可用的target_addr用完仍有!!待填充, 视为失败")
+                        return []  # target 不够
+                    target_addr = target_addrs[target_addr_idx]
+                    target_addr_idx += 1
+
+                    if target_addr is None:
+                        logger.warning(f"某个目标特征未扫描到匹配串, 无目标地址")
+                        return []  # 有某个目标地址未获得, 填充失败
+                    next_instr_addr = start_addr + relative_pos + length
+                    offset = target_addr - next_instr_addr
+                    # 计算成小端序 4 字节 hex
+                    offset_hex = int_to_little_endian_hex(offset, 4)
+
+                    # 直接替换连续 !!
+                    replace_parts = offset_hex.split()
+                    if len(replace_parts) != 4:
+                        logger.warning(f"小端序地址字节 {replace_parts} 长度不为4!")
+                        return []  # 替换字节长度 {len(replace_parts)} 与连续 !! 长度 {length} 不匹配")
+                    tokens[i:j] = replace_parts
+
+                    i = j
+
+            filled_modified = " ".join(tokens)
+            res_dicts.append(
+                {
+                    "offset": start_addr,
+                    "original": original_str,
+                    "modified": filled_modified
+                }
+            )
+
+        # 补充额外节点
+        for key in patching_rule_dict:
+            if key in ["type", "original", "modified", "left_cut", "right_cut", "targets"]:
+                continue
+            for res_dict in res_dicts:
+                res_dict[key] = patching_rule_dict[key]
+
+        return res_dicts
+
+    def resolve_rule_dict_and_return_res_dicts(self, mm, feature_rule_dict: dict,
+                                               fingerprint: str = None) -> List[dict]:
+        """
+        各类型基本节点: 原始特征码original, 修改特征码modified, 截断字节长度???_cut(可选, 没有则认为截断长度为0)
+        输出符合特征的字典列表, 字典节点: 截断后的地址偏移offset, 截断后的原始串original, 截断后的修改串modified, 特征字典中的其余节点
+        :param mm: 文件映射, 或已包装预扫描结果的 ScannedData(逐条解析多条规则时应预先包装一次)
+        :param fingerprint: 文件映射的内容指纹; 传入时走带缓存的扫描, 不传则直接扫描, 不对整个文件计算摘要
+        """
+        if not isinstance(mm, pattern_utils.ScannedData):
+            # 规则用到的特征码(原始串及 jmp_offset 的目标)一起扫描一遍
+            features = []
+            try:
+                features.append(pattern_utils.get_compiled_patch_pattern(
+                    feature_rule_dict["original"], feature_rule_dict["modified"],
+                    feature_rule_dict.get("left_cut", 0), feature_rule_dict.get("right_cut", 0)))
+                for target in feature_rule_dict.get("targets", []):
+                    clean_feature, _ = pattern_utils.split_marked_feature(target)
+                    features.append(pattern_utils.get_compiled_feature(clean_feature))
+            except Exception as e:
+                print(f"[ERR] {e}")
+                return []
+            features = [f for f in features if f is not None]
+            matches = self._scan(mm, features, fingerprint, cached=fingerprint is not None)
+            mm = pattern_utils.ScannedData(mm, matches)
+
+        res_dicts = []
+        if feature_rule_dict.get("type") == "simple":
+            simple_res_dicts = self.resolve_simple_rule(mm, feature_rule_dict)
+            if isinstance(simple_res_dicts, list):
+                res_dicts.extend(simple_res_dicts)
+
+        elif feature_rule_dict.get("type") == "custom":
+            custom_res_dicts = self.resolve_custom_rule(mm, feature_rule_dict)
+            if isinstance(custom_res_dicts, list):
+                res_dicts.extend(custom_res_dicts)
+
+        elif feature_rule_dict.get("type") == "jmp_offset":
+            jmp_offset_res_dicts = self.resolve_jmp_offset_rule(mm, feature_rule_dict)
+            if isinstance(jmp_offset_res_dicts, list):
+                res_dicts.extend(jmp_offset_res_dicts)
+
+        else:
+            print("未知类型")
+
+        return res_dicts
+
+    def search_pattern_dicts_by_original_and_modified(
+            self, mm, original_hex: str, modified_hex: str,
+            left_cut: int = 0, right_cut: int = 0) -> Optional[List[dict]]:
+        """
+        根据特征码得到所有符合的补丁字典
+        :param mm: 数据
+        :param original_hex: 原始特征码字符串
+        :param modified_hex: 修改后的特征码字符串（可包含...）
+        :param left_cut: 左截断字节数
+        :param right_cut: 右截断字节数
+        :return: List[Dict{offset, original, modified}]
+        """
+        start_time = time.perf_counter()
+        try:
+            pattern = pattern_utils.get_compiled_patch_pattern(original_hex, modified_hex, left_cut, right_cut)
+        except Exception as e:
+            print(f"[ERR] {e}")
+            return None
+        if pattern is None:
+            return None
+
+        with rw_lock.gen_rlock():
+            res_dicts = pattern.search_res_dicts(mm)
+        if self.record_scan is not None:
+            self.record_scan(original_hex, len(res_dicts), time.perf_counter() - start_time, res_dicts)
+        if len(res_dicts) == 0:
+            return None
+        return res_dicts
+
+    def search_first_pattern_and_get_address_of_marked(self, mm, target_features: list) -> List[dict]:
+        """
+        对目标特征码列表中的每个特征码: 扫描返回出第一个结果及其第一个!标记处所在偏移. 其余结果会忽略, 结果中的标记!会被清洗
+        若无!则默认取第一个字节位置. 保证返回结果长度与输入一致.
+        :param mm: 文件映射
+        :param target_features: 带!的特征码列表 (特征码如: "48 8B !05 ?? ?? ?? ?? 48 8B")
+        :return:
+            []List:
+                {}Optional[Dict]:
+                    'original': 原始特征码匹配串, 'marked_addr': 地址(基地址 + !偏移) ...
+        """
+        res_dicts = []
+        marked_features = []
+        for feature in target_features:
+            # 找第一个 ! 出现的位置(默认 0 → 即使没有!也会取第一个), 并清洗掉 ! 符号
+            clean_feature, bang_index = pattern_utils.split_marked_feature(feature)
+            try:
+                compiled = pattern_utils.get_compiled_feature(clean_feature)
+            except Exception as e:
+                print(f"[ERR] {e}")
+                compiled = None
+            marked_features.append((compiled, bang_index))
+        # 未经预扫描的数据: 所有目标特征码一起走一次带缓存的扫描
+        if not isinstance(mm, pattern_utils.ScannedData):
+            mm = pattern_utils.ScannedData(
+                mm, self._scan(mm, [compiled for compiled, _ in marked_features if compiled is not None]))
+        for compiled, bang_index in marked_features:
+            # 扫描
+            match = None
+            if compiled is not None:
+                with rw_lock.gen_rlock():
+                    match = compiled.search_first(mm)
+            if match:
+                start_addr, original = match
+                original_hex = bytes_to_hex_str(original)
+                res_dicts.append({
+                    "original": original_hex,
+                    "marked_addr": start_addr + bang_index
+                })
+            else:
+                # 保持长度一致 → 没匹配到时补个 None
+                res_dicts.append({
+                    "original": None,
+                    "marked_addr": None
+                })
+        return res_dicts
+
+
+def batch_atomic_replace_multi_files(file_patterns_map: Dict[str, List[Tuple[List[str], List[str]]]]) -> bool:
+    """
+    对多个文件执行原子替换操作，若任一文件替换失败，则回滚所有已处理文件的改动。
+    :param file_patterns_map: {dll_path: [hex_patterns_tuples]}
+    :return: transaction_success: 所有文件都成功则为 True，否则为 False（已回滚）
+    """
+    mmap_map = {}  # {dll_path: mmap_file}
+    backup_map = {}  # {dll_path: 原始字节数据}
+    transaction_success = True
+
+    try:
+        with rw_lock.gen_wlock():
+            for dll_path, hex_patterns_tuples in file_patterns_map.items():
+                with open(dll_path, 'r+b') as f:
+                    mmap_file = mmap.mmap(f.fileno(), 0)
+                    mmap_map[dll_path] = mmap_file
+                    backup_map[dll_path] = mmap_file[:]
+
+                    for hex_patterns_tuple in hex_patterns_tuples:
+                        success, _ = atomic_replace_hex_patterns(mmap_file, hex_patterns_tuple)
+                        if not success:
+                            print(f"替换失败: {dll_path}的{hex_patterns_tuple}")
+                            transaction_success = False
+                            break
+
+                if not transaction_success:
+                    break  # 提前跳出，避免处理后续文件
+
+        if not transaction_success:
+            # 回滚所有已处理文件
+            for dll_path, mmap_file in mmap_map.items():
+                mmap_file[:] = backup_map[dll_path]
+                mmap_file.flush()
+
+    except Exception as e:
+        print(f"发生异常: {str(e)}")
+        transaction_success = False
+
+    finally:
+        for mmap_file in mmap_map.values():
+            mmap_file.close()
+
+    return transaction_success
+
+
+def atomic_replace_hex_patterns(mmap_file, hex_patterns_tuple: tuple):
+    """
+    单次处理dll的多处替换（高效版本，使用已打开的mmap文件）
+    :param mmap_file: 已打开的mmap文件对象
+    :param hex_patterns_tuple: 元组列表：每个元组包含旧模式列表和新模式列表
+    :return: (success, message) 元组
+    """
+    backup_data = None
+    success = True
+    old_patterns, new_patterns = hex_patterns_tuple
+
+    # 确保两个列表长度相同
+    if len(old_patterns) != len(new_patterns):
+        return False, "错误：旧模式和新模式的数量不匹配。"
+
+    # 备份当前位置
+    original_pos = mmap_file.tell()
+
+    try:
+        # 先备份原始数据（只备份当前原子操作相关的部分）
+        backup_data = bytearray()
+        for old_pattern in old_patterns:
+            old = bytes.fromhex(old_pattern)
+            pos = mmap_file.find(old)
+            if pos != -1:
+                backup_data.extend(mmap_file[pos:pos + len(old)])
+            else:
+                return False, f"错误：未找到模式 {old_pattern}"
+
+        # 重置位置准备写入
+        mmap_file.seek(original_pos)
+
+        # 遍历所有模式对
+        for old_pattern, new_pattern in zip(old_patterns, new_patterns):
+            old, new = bytes.fromhex(old_pattern), bytes.fromhex(new_pattern)
+            pos = mmap_file.find(old)
+
+            if pos != -1:
+                mmap_file[pos: pos + len(old)] = new
+                print(f"找到并替换：{old_pattern} -> {new_pattern}")
+            else:
+                print(f"错误：未找到模式 {old_pattern}")
+                success = False
+                break  # 遇到第一个失败立即跳出循环
+
+        # 如果成功则提交更改
+        if success:
+            mmap_file.flush()
+            return True, "替换成功"
+        else:
+            # 回滚当前原子操作的所有更改
+            mmap_file.seek(original_pos)
+            for old_pattern in old_patterns:
+                old = bytes.fromhex(old_pattern)
+                pos = mmap_file.find(old)
+                if pos != -1:
+                    mmap_file[pos:pos + len(old)] = backup_data[:len(old)]
+                    backup_data = backup_data[len(old):]
+            mmap_file.flush()
+            return False, "部分模式替换失败，已回滚。"
+
+    except Exception as e:
+        print(f"发生错误: {str(e)}")
+        # 尝试回滚
+        if 'backup_data' in locals() and backup_data:
+            mmap_file.seek(original_pos)
+            for old_pattern in old_patterns:
+                old = bytes.fromhex(old_pattern)
+                pos = mmap_file.find(old)
+                if pos != -1:
+                    mmap_file[pos:pos + len(old)] = backup_data[:len(old)]
+                    backup_data = backup_data[len(old):]
+            mmap_file.flush()
+        return False, f"发生错误: {str(e)}"
@@ -0,0 +1,454 @@
+# pattern_utils.py
+# 二进制特征码(带 ?? / !! / ... 通配符)的编译与匹配, 不依赖项目其他模块, 可在子进程中直接使用
+import hashlib
+import mmap
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Optional, Tuple, List, Iterator, Dict, Iterable
+
+from utils.better_wx.inner_utils import patt2hex, custom_wildcard_tokenize
+
+
+def align_modified_to_original(
+        original_hex, modified_hex, left_cut=0, right_cut=0) -> Optional[Tuple[list, list]]:
+    """
+    分词原始串和修改串, 并将修改串按 ... 的位置补齐到与原始串等长
+    :return: (原始串分词列表, 修改串分词列表), 格式错误返回 None
+    """
+    # === 分词原始串并检验 ===
+    listed_original_hex = custom_wildcard_tokenize(original_hex)
+    if (not isinstance(listed_original_hex, list) or len(listed_original_hex) == 0
+            or len(listed_original_hex) <= left_cut + right_cut or ... in listed_original_hex):
+        print(f"[ERR] 原始特征码格式错误!")
+        return None
+
+    # === 分词修改串并检验 ===
+    listed_modified_hex = custom_wildcard_tokenize(modified_hex)
+    if not isinstance(listed_modified_hex, list) or len(listed_modified_hex) == 0:
+        print(f"[ERR] 修改特征码格式错误!")
+        return None
+    # === 修改串处理 ===
+    truncated_len = len(listed_original_hex) - left_cut - right_cut
+    if listed_modified_hex[0] is ...:
+        # 向前补齐到截断后的长度
+        if len(listed_modified_hex) - 1 > truncated_len:
+            print(f"[ERR] Modified pattern too long: <{patt2hex(listed_modified_hex)}>")
+            return None
+        listed_modified_hex = (
+                ["??"] * (truncated_len - (len(listed_modified_hex) - 1))
+                + listed_modified_hex[1:]
+        )
+    elif ... not in listed_modified_hex:
+        # 向后补齐到截断后的长度
+        if len(listed_modified_hex) > truncated_len:
+            print(f"[ERR] Modified pattern too long: <{patt2hex(listed_modified_hex)}>")
+            return None
+        listed_modified_hex += ["??"] * (truncated_len - len(listed_modified_hex))
+    else:
+        # ... 出现在中间位置 → 错误
+        print(f"[ERR] Wildcard <{patt2hex(listed_modified_hex)}> has invalid token ...")
+        return None
+    # === 最后统一补齐左右 cut ===
+    listed_modified_hex = ["??"] * left_cut + listed_modified_hex + ["??"] * right_cut
+    # === 校验最终长度 ===
+    if len(listed_modified_hex) != len(listed_original_hex):
+        print(f"[ERR] Pattern and listed_modified_hex length mismatch")
+        return None
+
+    return listed_original_hex, listed_modified_hex
+
+
+def tokens_to_regex_bytes(listed_hex: list) -> bytes:
+    """将分词后的特征码转为正则: ?? 为任意单字节, 其余按字面匹配"""
+    regex_bytes = b""
+    for p in listed_hex:
+        if p == "??":
+            regex_bytes += b"(.)"
+        else:
+            regex_bytes += re.escape(bytes.fromhex(p))
+    return regex_bytes
+
+
+def longest_literal_anchor(listed_hex: list) -> Tuple[int, bytes]:
+    """取分词特征码中最长的连续字面字节段作为锚点, 返回 (在特征码中的偏移, 锚点字节); 全为 ?? 时锚点为空"""
+    best_off, best_len = 0, 0
+    run_off, run_len = 0, 0
+    for pos, p in enumerate(listed_hex):
+        if p == "??":
+            run_len = 0
+            continue
+        if run_len == 0:
+            run_off = pos
+        run_len += 1
+        if run_len > best_len:
+            best_off, best_len = run_off, run_len
+    anchor = bytes.fromhex("".join(listed_hex[best_off:best_off + best_len]))
+    return best_off, anchor
+
+
+class CompiledFeature:
+    """
+    分词后的特征码(仅 ?? 通配)编译结果:
+    - regex: 整串正则, 用于校验
+    - anchor / anchor_offset: 最长字面段及其偏移, 多模式扫描时先定位锚点再回退校验
+    """
+
+    def __init__(self, listed_hex: list):
+        self.length = len(listed_hex)
+        self.regex_bytes = tokens_to_regex_bytes(listed_hex)
+        self.regex = re.compile(self.regex_bytes, re.DOTALL)
+        self.anchor_offset, self.anchor = longest_literal_anchor(listed_hex)
+
+    def finditer(self, data, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[int, bytes]]:
+        """遍历所有匹配, 产出 (起始地址, 原始字节); data 为 ScannedData 时直接取预扫描结果"""
+        if isinstance(data, ScannedData):
+            matches = data.matches.get(self.regex_bytes)
+            if matches is not None:
+                for addr, original in matches:
+                    if addr >= start and (end is None or addr + self.length <= end):
+                        yield addr, original
+                return
+            data = data.data
+        end = len(data) if end is None else end
+        for match in self.regex.finditer(data, start, end):
+            yield match.start(), match.group()
+
+    def search_first(self, data) -> Optional[Tuple[int, bytes]]:
+        """返回第一个匹配 (起始地址, 原始字节), 无匹配返回 None"""
+        for addr, original in self.finditer(data):
+            return addr, original
+        return None
+
+
+class CompiledPatchPattern(CompiledFeature):
+    """
+    一组 (original, modified, left_cut, right_cut) 编译后的结果:
+    - regex: 原始串的正则
+    - 修改串预先拆成固定字节模板 + 需要从匹配串原样拷贝的区间, 每次匹配只需切片拷贝, 无需再跑一遍正则替换
+    - bang_positions: 截断后修改串中 !! 所在的字节位置
+    请通过 get_compiled_patch_pattern 获取, 相同参数全局只编译一次
+    """
+
+    def __init__(self, listed_original_hex: list, listed_modified_hex: list, left_cut: int, right_cut: int):
+        super().__init__(listed_original_hex)
+        self.left_cut = left_cut
+        self.right_cut = right_cut
+        self.listed_original_hex = listed_original_hex
+        self.listed_modified_hex = listed_modified_hex
+
+        template = bytearray()
+        copy_runs = []
+        bang_positions = []
+        for pos, r in enumerate(listed_modified_hex):
+            if r == "??":
+                # 修改串为 ?? 时保留原值: 合并为连续区间
+                template.append(0)
+                if copy_runs and copy_runs[-1][1] == pos:
+                    copy_runs[-1][1] = pos + 1
+                else:
+                    copy_runs.append([pos, pos + 1])
+            elif r == "!!":
+                template.append(ord("!"))
+                bang_positions.append(pos)
+            else:
+                template.extend(bytes.fromhex(r))
+        self._template = bytes(template)
+        self._copy_runs = tuple((s, e) for s, e in copy_runs)
+        self._cut_end = self.length - right_cut
+        self.bang_positions = tuple(
+            pos - left_cut for pos in bang_positions if left_cut <= pos < self._cut_end)
+
+    def modify(self, original: bytes) -> bytes:
+        """由匹配到的原始字节得到修改后的字节(未截断, !! 处为 b'!')"""
+        buf = bytearray(self._template)
+        for s, e in self._copy_runs:
+            buf[s:e] = original[s:e]
+        return bytes(buf)
+
+    def to_res_dict(self, addr: int, original: bytes) -> dict:
+        """将一次匹配转为截断后的补丁字典 {offset, original, modified}"""
+        modified = self.modify(original)
+        original_hex_str = original[self.left_cut:self._cut_end].hex(" ")
+        modified_hex_str = modified[self.left_cut:self._cut_end].hex(" ")
+        if self.bang_positions:
+            tokens = modified_hex_str.split(" ")
+            for pos in self.bang_positions:
+                tokens[pos] = "!!"
+            modified_hex_str = " ".join(tokens)
+        return {
+            "offset": addr + self.left_cut,
+            "original": original_hex_str,
+            "modified": modified_hex_str
+        }
+
+    def search_res_dicts(self, data) -> List[dict]:
+        return [self.to_res_dict(addr, original) for addr, original in self.finditer(data)]
+
+
+@lru_cache(maxsize=1024)
+def get_compiled_patch_pattern(
+        original_hex: str, modified_hex: str, left_cut: int = 0, right_cut: int = 0) -> Optional[CompiledPatchPattern]:
+    """获取编译好的补丁模式, 特征码非法时返回 None; 结果按参数缓存, 跨通道/模式/多次识别复用"""
+    aligned = align_modified_to_original(original_hex, modified_hex, left_cut, right_cut)
+    if aligned is None:
+        return None
+    listed_original_hex, listed_modified_hex = aligned
+    print(f"> 特征码翻译: {patt2hex(listed_original_hex, 0)} => {patt2hex(listed_modified_hex, 0)}")
+    return CompiledPatchPattern(listed_original_hex, listed_modified_hex, left_cut, right_cut)
+
+
+@lru_cache(maxsize=1024)
+def get_compiled_feature(feature: str) -> Optional[CompiledFeature]:
+    """获取目标特征码(不含 !! 与 ...)的编译结果, 结果按特征码缓存"""
+    listed_target_hex = custom_wildcard_tokenize(feature)
+    if not isinstance(listed_target_hex, list) or len(listed_target_hex) == 0:
+        return None
+    # 检查非法 ... 使用
+    if ... in listed_target_hex:
+        print(f"[ERR] Wildcard <{patt2hex(listed_target_hex)}> has invalid token ...")
+        return None
+    return CompiledFeature(listed_target_hex)
+
+
+def get_compiled_feature_regex(feature: str) -> Optional[re.Pattern]:
+    """获取目标特征码(不含 !! 与 ...)编译后的正则"""
+    compiled = get_compiled_feature(feature)
+    return compiled.regex if compiled is not None else None
+
+
+def split_marked_feature(feature: str) -> Tuple[str, int]:
+    """
+    清洗带 ! 标记的目标特征码(如 "48 8B !05 ?? ??")
+    :return: (去掉 ! 后的特征码, 第一个 ! 所在字节位置; 没有 ! 时为 0)
+    """
+    tokens = feature.split()
+    bang_index = 0
+    for i, tok in enumerate(tokens):
+        if tok.startswith("!"):
+            bang_index = i
+            break
+    return " ".join(tok.lstrip("!") for tok in tokens), bang_index
+
+
+class ScannedData:
+    """
+    带预扫描结果的数据包装: 可替代 mm 传入 CompiledFeature.finditer 等方法,
+    命中预扫描的特征直接返回结果, 未预扫描的特征回退到对 data 的正则扫描
+    """
+
+    def __init__(self, data, matches: Dict[bytes, List[Tuple[int, bytes]]]):
+        self.data = data
+        self.matches = matches
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, item):
+        return self.data[item]
+
+
+class MultiPatternScanner:
+    """
+    多特征码单遍扫描:
+    - 相同正则的特征只保留一份(跨规则/通道/模式去重)
+    - 以各特征最长字面段为锚点, 相同锚点的特征共用一次查找; 按窗口顺序推进, 每个窗口内查找全部锚点,
+      整个文件只顺序走一遍, 窗口数据在缓存中被所有锚点复用
+    - 锚点命中后回退到特征起点, 用整串正则校验
+    - 结果与逐个 regex.finditer 一致(从左到右, 互不重叠)
+    """
+    WINDOW_SIZE = 4 * 1024 * 1024
+
+    def __init__(self, features: Iterable[CompiledFeature] = ()):
+        self._features: Dict[bytes, CompiledFeature] = {}
+        for feature in features:
+            self.add(feature)
+
+    def add(self, feature: CompiledFeature):
+        if feature is not None:
+            self._features.setdefault(feature.regex_bytes, feature)
+
+    def __len__(self):
+        return len(self._features)
+
+    @property
+    def features(self) -> List[CompiledFeature]:
+        return list(self._features.values())
+
+    def scan(self, data) -> Dict[bytes, List[Tuple[int, bytes]]]:
+        """扫描 data, 返回 {正则字节串: [(起始地址, 原始字节), ...]}"""
+        candidates = self.find_candidates(data)
+        return {key: drop_overlapping_matches(matches) for key, matches in candidates.items()}
+
+    def find_candidates(self, data, start: int = 0, end: Optional[int] = None) -> Dict[bytes, List[Tuple[int, bytes]]]:
+        """
+        找出起始地址落在 [start, end) 内、通过整串校验的所有匹配(可能互相重叠), 按地址升序;
+        校验时允许读到 end 之后, 因此分块扫描的各块结果直接拼接即与整体扫描一致
+        """
+        size = len(data)
+        end = size if end is None else min(end, size)
+        results: Dict[bytes, List[Tuple[int, bytes]]] = {key: [] for key in self._features}
+        by_anchor: Dict[bytes, List[CompiledFeature]] = {}
+        for feature in self._features.values():
+            if feature.anchor:
+                by_anchor.setdefault(feature.anchor, []).append(feature)
+            else:
+                # 没有字面段的特征无法定位锚点, 直接正则扫描
+                limit = min(end + feature.length - 1, size)
+                results[feature.regex_bytes] = [
+                    (addr, original) for addr, original in feature.finditer(data, start, limit) if addr < end]
+
+        # 各锚点组中, 锚点地址的有效范围
+        anchor_ranges = {
+            anchor: (start + min(f.anchor_offset for f in features), end + max(f.anchor_offset for f in features))
+            for anchor, features in by_anchor.items()
+        }
+        find = data.find
+        for win_start in range(start, end + max((r[1] - end for r in anchor_ranges.values()), default=0),
+                               self.WINDOW_SIZE):
+            win_end = win_start + self.WINDOW_SIZE
+            for anchor, features in by_anchor.items():
+                low, high = anchor_ranges[anchor]
+                low, high = max(win_start, low), min(win_end, high)
+                if low >= high:
+                    continue
+                # 锚点起点落在窗口内即可, 允许锚点尾部跨出窗口
+                limit = min(high + len(anchor) - 1, size)
+                pos = find(anchor, low, limit)
+                while pos != -1:
+                    for feature in features:
+                        feature_start = pos - feature.anchor_offset
+                        if feature_start < start or feature_start >= end or feature_start + feature.length > size:
+                            continue
+                        match = feature.regex.match(data, feature_start)
+                        if match:
+                            results[feature.regex_bytes].append((feature_start, match.group()))
+                    pos = find(anchor, pos + 1, limit)
+        return results
+
+
+def drop_overlapping_matches(matches: List[Tuple[int, bytes]]) -> List[Tuple[int, bytes]]:
+    """从按地址升序的候选匹配中, 按 finditer 的规则(从左到右, 互不重叠)保留结果"""
+    kept = []
+    last_end = 0
+    for addr, original in matches:
+        if addr >= last_end:
+            kept.append((addr, original))
+            last_end = addr + len(original)
+    return kept
+
+
+def _scan_file_range(path: str, features: List[CompiledFeature], start: int, end: int):
+    """子进程任务: 自行只读映射文件, 返回起始地址在 [start, end) 内的候选匹配"""
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return MultiPatternScanner(features).find_candidates(mm, start, end)
+
+
+def _split_feature_groups(features: List[CompiledFeature], group_count: int) -> List[List[CompiledFeature]]:
+    """按锚点分组后轮流分配, 共用锚点的特征留在同一组, 避免重复查找"""
+    by_anchor: Dict[bytes, List[CompiledFeature]] = {}
+    for feature in features:
+        by_anchor.setdefault(feature.anchor, []).append(feature)
+    groups = [[] for _ in range(max(1, min(group_count, len(by_anchor))))]
+    for i, anchor_features in enumerate(sorted(by_anchor.values(), key=len, reverse=True)):
+        groups[i % len(groups)].extend(anchor_features)
+    return groups
+
+
+def scan_files_parallel(
+        file_features: Dict[str, List[CompiledFeature]], max_workers: Optional[int] = None,
+        chunk_size: Optional[int] = None) -> Dict[str, Dict[bytes, List[Tuple[int, bytes]]]]:
+    """
+    用进程池并行扫描多个文件, 每个子进程自行只读映射文件
+    - 不分块时, 每个文件按特征码分为若干组, 以 (文件, 特征组) 为任务
+    - 分块模式(chunk_size)下, 大文件按起始地址切成若干块, 以 (文件, 块) 为任务; 块内校验可越过块尾读取,
+      相当于相邻块重叠一个特征长度, 跨块的匹配不会丢失
+    结果按任务提交顺序合并并统一去除重叠, 与单进程逐个 finditer 的结果一致
+    :return: {文件路径: {正则字节串: [(起始地址, 原始字节), ...]}}
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    jobs = []
+    for path, features in file_features.items():
+        size = os.path.getsize(path)
+        if size == 0 or len(features) == 0:
+            continue
+        anchored = [f for f in features if f.anchor]
+        plain = [f for f in features if not f.anchor]
+        if anchored:
+            if chunk_size and size > chunk_size:
+                for start in range(0, size, chunk_size):
+                    jobs.append((path, anchored, start, min(start + chunk_size, size)))
+            else:
+                for group in _split_feature_groups(anchored, max_workers):
+                    jobs.append((path, group, 0, size))
+        if plain:
+            # 无锚点的特征只能整体 finditer, 不参与分块
+            jobs.append((path, plain, 0, size))
+
+    merged: Dict[str, Dict[bytes, List[Tuple[int, bytes]]]] = {
+        path: {f.regex_bytes: [] for f in features} for path, features in file_features.items()}
+    if len(jobs) == 0:
+        return merged
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(jobs))) as executor:
+        futures = [executor.submit(_scan_file_range, *job) for job in jobs]
+        # 按提交顺序收集, 同一特征的各块结果天然按地址升序拼接
+        for (path, _, _, _), future in zip(jobs, futures):
+            for key, candidates in future.result().items():
+                merged[path][key].extend(candidates)
+    for path in merged:
+        for key in merged[path]:
+            merged[path][key] = drop_overlapping_matches(merged[path][key])
+    return merged
+
+
+def feature_key(feature: CompiledFeature) -> str:
+    """特征码在扫描缓存中的键: 正则字节串的摘要, 规则集变化时只有新增的特征需要重扫"""
+    return hashlib.sha1(feature.regex_bytes).hexdigest()[:20]
+
+
+FINGERPRINT_CHUNK_BYTES = 16 * 1024 * 1024
+
+
+def content_fingerprint(data) -> str:
+    """
+    数据内容指纹: 大小 + 全量摘要. 只在需要扫描时才计算, 摘要开销远小于一次扫描,
+    且补丁前后、不同版本的文件都不会撞上同一指纹
+    """
+    digest = hashlib.sha1()
+    view = memoryview(data)
+    try:
+        # 分块喂入, 避免 mmap 一次性整体拷贝
+        for start in range(0, len(view), FINGERPRINT_CHUNK_BYTES):
+            digest.update(view[start:start + FINGERPRINT_CHUNK_BYTES])
+    finally:
+        view.release()
+    return f"{len(data):x}-{digest.hexdigest()}"
+
+
+@lru_cache(maxsize=64)
+def _file_fingerprint(path: str, size: int, mtime_ns: int) -> str:
+    # 按块读取, 不把整个文件读入内存; 结果与 content_fingerprint 一致
+    digest = hashlib.sha1()
+    length = 0
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(FINGERPRINT_CHUNK_BYTES), b""):
+            digest.update(block)
+            length += len(block)
+    return f"{length:x}-{digest.hexdigest()}"
+
+
+def file_fingerprint(path: str) -> str:
+    """文件内容指纹, 按 (路径, 大小, 修改时间) 记忆, 文件未变时不再重复计算摘要"""
+    stat = os.stat(path)
+    return _file_fingerprint(os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+
+def encode_matches(matches: List[Tuple[int, bytes]]) -> list:
+    """匹配结果转为可存入 json 的紧凑格式 [[地址, 十六进制串], ...]"""
+    return [[addr, original.hex()] for addr, original in matches]
+
+
+def decode_matches(encoded: list) -> List[Tuple[int, bytes]]:
+    return [(addr, bytes.fromhex(original_hex)) for addr, original_hex in encoded]
@@ -0,0 +1,145 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from utils.logger_utils import mylogger as logger, Printer
+
+
+class OrderedGate:
+    """按序放行: 序号为 n 的任务要等序号 n-1 的任务 release 后才能通过, 用于必须依次进行的阶段"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._next = 0
+
+    def wait_turn(self, index, timeout=None) -> bool:
+        with self._cond:
+            return self._cond.wait_for(lambda: self._next >= index, timeout)
+
+    def release(self, index):
+        """可重复调用; 放行 index 之后的下一个任务"""
+        with self._cond:
+            if index + 1 > self._next:
+                self._next = index + 1
+                self._cond.notify_all()
+
+
+class PipelineTask:
+    """流水线中的一个任务: 记录各阶段耗时, 提供按序阶段和提前放行"""
+
+    def __init__(self, lane, index, item, gate: OrderedGate, lane_state=None):
+        self.lane = lane
+        self.index = index
+        self.item = item
+        self.lane_state = lane_state
+        self.timings: Dict[str, float] = {}
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.finished_at: Optional[float] = None
+        # 追踪开启时为任务所在的区间, 可用 span.set() 补充属性
+        self.span = Printer().span_trace.NO_SPAN
+        self._gate = gate
+
+    @contextmanager
+    def stage(self, name):
+        """计时一个阶段, 同名阶段累加; 追踪开启时同时记录为区间"""
+        start = time.perf_counter()
+        try:
+            with Printer().span_trace.span(name, lane=self.lane, index=self.index):
+                yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+    @contextmanager
+    def ordered(self, queue_stage="queue"):
+        """进入按序阶段: 等前一个任务放行(等待时间计入 queue_stage); 退出时不放行, 由任务自行决定何时 release"""
+        with self.stage(queue_stage):
+            self._gate.wait_turn(self.index)
+        yield
+
+    def release(self):
+        """放行下一个任务进入按序阶段; 任务结束时会自动放行"""
+        self._gate.release(self.index)
+
+
+class LanePipeline:
+    """
+    分通道流水线: 每个通道(如平台)的任务按提交顺序编号, 通道内最多 concurrency 个任务同时进行,
+    按序阶段由 OrderedGate 保证先后; 不同通道互不等待, 同时进行.
+    这样后一个任务的按序阶段可以与前一个任务的其余阶段重叠, 总耗时接近最慢阶段而不是所有阶段之和
+    """
+
+    def __init__(self,
+                 worker: Callable[[PipelineTask], Any],
+                 concurrency: Union[int, Callable[[Any], int]] = 1,
+                 on_lane_start: Callable[[Any], Any] = None,
+                 on_lane_done: Callable[[Any, List[PipelineTask]], None] = None):
+        """
+        :param worker: 处理一个任务, 返回值存入 task.result
+        :param concurrency: 每个通道的并发数, 或 通道 -> 并发数
+        :param on_lane_start: 通道开始前调用, 返回值作为该通道所有任务的 lane_state
+        :param on_lane_done: 通道所有任务结束后调用
+        """
+        self.worker = worker
+        self.concurrency = concurrency
+        self.on_lane_start = on_lane_start
+        self.on_lane_done = on_lane_done
+
+    def _concurrency_of(self, lane) -> int:
+        value = self.concurrency(lane) if callable(self.concurrency) else self.concurrency
+        try:
+            return max(1, int(value))
+        except (TypeError, ValueError):
+            return 1
+
+    def _run_task(self, task: PipelineTask):
+        with Printer().span_trace.span("pipeline_task", lane=task.lane, index=task.index) as span:
+            task.span = span
+            try:
+                task.result = self.worker(task)
+            except Exception as e:
+                logger.error(e)
+                task.error = e
+            finally:
+                task.release()
+                task.finished_at = time.perf_counter()
+
+    def _run_lane(self, lane, items, results: Dict[Any, List[PipelineTask]]):
+        with Printer().span_trace.span("pipeline_lane", lane=lane, tasks=len(items)):
+            self._run_lane_traced(lane, items, results)
+
+    def _run_lane_traced(self, lane, items, results: Dict[Any, List[PipelineTask]]):
+        lane_state = None
+        if self.on_lane_start is not None:
+            try:
+                lane_state = self.on_lane_start(lane)
+            except Exception as e:
+                logger.error(e)
+                results[lane] = []
+                return
+        gate = OrderedGate()
+        tasks = [PipelineTask(lane, i, item, gate, lane_state) for i, item in enumerate(items)]
+        results[lane] = tasks
+        # 任务按编号顺序提交, 线程池先进先出, 等待前驱放行的任务其前驱必已开始, 不会死锁
+        with ThreadPoolExecutor(max_workers=self._concurrency_of(lane), thread_name_prefix=f"lane_{lane}") as pool:
+            for task in tasks:
+                pool.submit(self._run_task, task)
+        if self.on_lane_done is not None:
+            try:
+                self.on_lane_done(lane, tasks)
+            except Exception as e:
+                logger.error(e)
+
+    def run(self, lanes: Dict[Any, List]) -> Dict[Any, List[PipelineTask]]:
+        """执行所有通道, 全部结束后返回 {通道: 任务列表}"""
+        results: Dict[Any, List[PipelineTask]] = {}
+        threads = []
+        for lane, items in lanes.items():
+            t = threading.Thread(target=self._run_lane, args=(lane, list(items), results), name=f"lane_{lane}")
+            t.start()
+            threads.append(t)
+        for t in threads:
+            t.join()
+        return {lane: results.get(lane, []) for lane in lanes}
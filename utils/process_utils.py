@@ -4,11 +4,13 @@ import fnmatch
 import os
 import subprocess
 import sys
+import threading
 import time
 import xml.etree.ElementTree as ET
+from contextlib import contextmanager
 from ctypes import wintypes
 from ctypes.wintypes import DWORD, HANDLE, LPCWSTR, BOOL
-from typing import List, Optional, Tuple
+from typing import List, Optional, Tuple, NamedTuple, Iterable, Dict
 
 import psutil
 
@@ -379,44 +381,130 @@ def create_process_for_win7(executable, args=None, creation_flags=0):
 PROCESS_ALL_ACCESS = 0x1F0FFF
 
 
-def remove_child_pids(pids):
+class ProcessInfo(NamedTuple):
+    pid: int
+    ppid: Optional[int]
+    name: str
+    exe: str
+    create_time: Optional[float]
+
+
+class ProcessSnapshot:
+    """
+    进程表快照: 一次遍历取得所有进程的 pid/ppid/进程名/路径/创建时间, 并建立父子索引.
+    在 shared() 范围内, 当前线程所有基于快照的查询共用同一个快照, 一次刷新只遍历一次进程表
+    """
+    _local = threading.local()
+
+    def __init__(self, infos: Iterable[ProcessInfo]):
+        self.taken_at = time.time()
+        self.procs: Dict[int, ProcessInfo] = {info.pid: info for info in infos}
+        self.children: Dict[int, List[int]] = {}
+        for info in self.procs.values():
+            parent = self.procs.get(info.ppid)
+            if parent is None or parent.pid == info.pid:
+                continue
+            # 与 psutil 一致: 子进程不能早于父进程创建, 排除 pid 被复用的情况
+            if parent.create_time is not None and info.create_time is not None \
+                    and info.create_time < parent.create_time:
+                continue
+            self.children.setdefault(parent.pid, []).append(info.pid)
+
+    @classmethod
+    def take(cls) -> "ProcessSnapshot":
+        """遍历一次进程表生成快照; 无权限读取的字段为 None/空串"""
+        infos = []
+        for proc in psutil.process_iter(['pid', 'ppid', 'name', 'exe', 'create_time']):
+            info = proc.info
+            infos.append(ProcessInfo(
+                info['pid'], info['ppid'], info['name'] or "", info['exe'] or "", info['create_time']))
+        return cls(infos)
+
+    @classmethod
+    def scoped(cls) -> Optional["ProcessSnapshot"]:
+        """当前线程 shared() 范围内的快照, 不在范围内返回 None"""
+        return getattr(cls._local, "snapshot", None)
+
+    @classmethod
+    def current(cls) -> "ProcessSnapshot":
+        """在 shared() 范围内返回共用的快照, 否则现取一个"""
+        snapshot = cls.scoped()
+        return snapshot if snapshot is not None else cls.take()
+
+    @classmethod
+    @contextmanager
+    def shared(cls, snapshot: "ProcessSnapshot" = None):
+        """在此范围内(当前线程)共用同一个快照, 可嵌套, 内层沿用外层的快照; 可传入已有快照代替现取"""
+        scoped = cls.scoped()
+        if scoped is not None:
+            yield scoped
+            return
+        cls._local.snapshot = snapshot if snapshot is not None else cls.take()
+        try:
+            yield cls._local.snapshot
+        finally:
+            cls._local.snapshot = None
+
+    def __contains__(self, pid):
+        return pid in self.procs
+
+    def get(self, pid) -> Optional[ProcessInfo]:
+        return self.procs.get(pid)
+
+    def descendants(self, pid) -> List[int]:
+        """所有子孙进程 pid"""
+        res = []
+        stack = list(self.children.get(pid, []))
+        while stack:
+            child = stack.pop()
+            res.append(child)
+            stack.extend(self.children.get(child, []))
+        return res
+
+    def group_pids_by_wildcards(self, wildcards: list) -> Dict[str, List[int]]:
+        """进程名匹配通配符的 pid, 按进程名分组"""
+        result = {}
+        for info in self.procs.values():
+            if info.name and any(fnmatch.fnmatch(info.name, wildcard) for wildcard in wildcards):
+                result.setdefault(info.name, []).append(info.pid)
+        return result
+
+
+def remove_child_pids(pids, snapshot: Optional[ProcessSnapshot] = None):
     """从 pids 列表中删除所有子进程 PID"""
+    snapshot = snapshot or ProcessSnapshot.current()
     pid_set = set(pids)
-
     for pid in pids:
-        try:
-            process = psutil.Process(pid)
-            for child in process.children(recursive=True):
-                pid_set.discard(child.pid)
-        except (psutil.NoSuchProcess, psutil.AccessDenied):
-            pass  # 忽略无权限或进程不存在的情况
-
+        for child in snapshot.descendants(pid):
+            pid_set.discard(child)
     # 保留原顺序
     return [pid for pid in pids if pid in pid_set]
 
 
-def remove_pids_not_in_path(pids: List[int], path_keyword: str) -> List[int]:
-    """从 pids 列表中排除那些不在指定路径关键字中的进程"""
-    # 获取所有进程信息（包含可执行路径）
+def remove_pids_not_in_path(pids: List[int], path_keyword: str,
+                            snapshot: Optional[ProcessSnapshot] = None) -> List[int]:
+    """从 pids 列表中排除那些不在指定路径关键字中的进程; 无权限或已退出的进程路径为空, 会被排除"""
+    snapshot = snapshot or ProcessSnapshot.current()
     path_keyword = path_keyword.replace("/", "\\").lower()
     filtered = []
     for pid in pids:
-        try:
-            proc = psutil.Process(pid)
-            exe_path = proc.exe() or ""
-            # Printer().debug(exe_path)
-            if path_keyword in exe_path.lower():
-                filtered.append(pid)
-        except (psutil.NoSuchProcess, psutil.AccessDenied):
-            continue  # 无权限或已退出的进程跳过
-
+        info = snapshot.get(pid)
+        if info is not None and path_keyword in info.exe.lower():
+            filtered.append(pid)
     return filtered
 
 
-def get_exe_name_by_pid(pid, precise=False):
+def get_exe_name_by_pid(pid, precise=False, snapshot: Optional[ProcessSnapshot] = None):
+    """有快照(传入或处于 shared() 范围内)时直接查快照, 否则单独查询该进程"""
+    snapshot = snapshot or ProcessSnapshot.scoped()
     try:
-        process = psutil.Process(pid)
-        exe_path = process.exe()
+        if snapshot is not None:
+            info = snapshot.get(pid)
+            if info is None:
+                raise psutil.NoSuchProcess(pid)
+            exe_path = info.exe
+        else:
+            exe_path = psutil.Process(pid).exe()
         if precise is not True:
             exe_path = os.path.basename(exe_path)
         return exe_path
@@ -470,6 +558,18 @@ def iter_open_files(pid):
         print(f"An error occurred: {e}")
 
 
+def iter_mapped_and_open_file_paths(pid):
+    """
+    依次产出进程的内存映射文件路径和打开的文件路径; 惰性执行, 调用方提前结束迭代时不会再查询打开的文件.
+    psutil 的异常(进程不存在/无权限)直接抛给调用方
+    """
+    process = psutil.Process(pid)
+    for f in process.memory_maps():
+        yield f.path
+    for f in process.open_files():
+        yield f.path
+
+
 def taskkill_kill_process_tree(pid):
     cmd_args = ['taskkill', '/T', '/F', '/PID', f'{pid}']
     cmd = ' '.join(cmd_args)
@@ -608,7 +708,8 @@ def try_terminate_executable(executable_name):
     return None
 
 
-def psutil_get_pids_by_wildcards_and_grouping_to_dict(wildcards: list) -> dict:
+def psutil_get_pids_by_wildcards_and_grouping_to_dict(
+        wildcards: list, snapshot: Optional[ProcessSnapshot] = None) -> dict:
     """
     使用 psutil 模糊匹配进程名，支持 Unix 和 Windows
     wildcards 支持通配符，比如 "WeChat?.exe"
@@ -616,19 +717,8 @@ def psutil_get_pids_by_wildcards_and_grouping_to_dict(wildcards: list) -> dict:
     """
     if wildcards is None:
         return {}
-
-    result = {}
-    for proc in psutil.process_iter(['name']):
-        try:
-            name = proc.info['name']
-            if name:
-                for wildcard in wildcards:
-                    if fnmatch.fnmatch(name, wildcard):
-                        result.setdefault(name, []).append(proc.pid)
-                        break
-        except (psutil.NoSuchProcess, psutil.AccessDenied):
-            continue
-    return result
+    snapshot = snapshot or ProcessSnapshot.current()
+    return snapshot.group_pids_by_wildcards(wildcards)
 
 
 def get_process_ids_by_precise_name_impl_by_tasklist(process_name) -> list:
@@ -0,0 +1,327 @@
+import itertools
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Set
+
+# 不依赖 logger_utils/process_utils(会引入 Windows 专用模块), 以便模拟进程源在任意平台上测试与基准;
+# 与 mylogger 同名, 程序中日志仍输出到同一处
+logger = logging.getLogger('mylogger')
+
+
+class SessionEvent(NamedTuple):
+    kind: str
+    sw: str
+    acc: Optional[str]
+    pid: int
+    hwnd: Optional[int] = None
+
+
+class _TrackedProcess:
+    """按 (pid, 创建时间) 跟踪的进程; 识别失败时记下当时的窗口与下次重试时间, 作为未登录的否定缓存"""
+    __slots__ = ("create_time", "acc", "hwnds", "miss_hwnds", "retry_at")
+
+    def __init__(self, create_time):
+        self.create_time = create_time
+        self.acc: Optional[str] = None
+        self.hwnds: Set[int] = set()
+        self.miss_hwnds: Optional[Set[int]] = None
+        self.retry_at = 0.0
+
+    def copy(self) -> "_TrackedProcess":
+        p = _TrackedProcess(self.create_time)
+        p.acc, p.hwnds, p.miss_hwnds, p.retry_at = self.acc, set(self.hwnds), self.miss_hwnds, self.retry_at
+        return p
+
+
+class SessionWatcher:
+    """
+    账号会话监视器: 定时取进程快照, 与上一次对比, 增量维护 账号 <-> 进程 <-> 窗口 的对应关系,
+    并发布 登录/登出/新窗口 事件. 只对新出现或尚未识别出账号的进程做账号识别.
+    识别失败的进程只在其窗口变化(登录前后窗口会变)或超过 retry_interval 后才重新识别, 不在每次轮询时重扫.
+    进程来源、进程筛选、账号识别、窗口枚举均由外部传入, 便于用模拟进程源在任意平台上测试.
+    快照只需提供 get(pid), 返回带 create_time 属性的对象(或 None), 如 process_utils.ProcessSnapshot
+    """
+    LOGIN = "login"
+    LOGOUT = "logout"
+    NEW_WINDOW = "new_window"
+
+    def __init__(self,
+                 select_pids: Callable[[str, object], Iterable[int]],
+                 identify_acc: Callable[[str, List[int]], Dict[int, str]],
+                 list_windows: Callable[[str, List[int]], Dict[int, Iterable[int]]],
+                 take_snapshot: Callable[[], object],
+                 interval: float = 1.0,
+                 retry_interval: float = 5.0,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        :param select_pids: (平台, 快照) -> 该平台的主进程 pid
+        :param identify_acc: (平台, pid 列表) -> {pid: 账号}, 未识别出的 pid 不出现
+        :param list_windows: (平台, pid 列表) -> {pid: 窗口句柄列表}
+        :param take_snapshot: 获取进程快照, 如 process_utils.ProcessSnapshot.take
+        :param interval: 后台轮询间隔(秒)
+        :param retry_interval: 窗口未变化时, 识别失败的进程重新识别的间隔(秒)
+        """
+        self.select_pids = select_pids
+        self.identify_acc = identify_acc
+        self.list_windows = list_windows
+        self.take_snapshot = take_snapshot
+        self.interval = interval
+        self.retry_interval = retry_interval
+        self.clock = clock
+        # _lock 只保护状态的读写; 账号识别等耗时操作在 _poll_lock 内、_lock 外进行, 不阻塞读取
+        self._lock = threading.RLock()
+        self._poll_lock = threading.Lock()
+        self._sessions: Dict[str, Dict[int, _TrackedProcess]] = {}
+        # 至少完成过一次轮询的平台, 其状态才可以代替全量扫描
+        self._synced: Set[str] = set()
+        # 最近一次轮询所用的快照, 供回调复用
+        self.last_snapshot = None
+        self._subscribers: Dict[int, tuple] = {}
+        self._token_counter = itertools.count(1)
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._poll_requested = threading.Event()
+
+    def watch(self, sw):
+        with self._lock:
+            self._sessions.setdefault(sw, {})
+
+    def unwatch(self, sw):
+        with self._lock:
+            self._sessions.pop(sw, None)
+            self._synced.discard(sw)
+
+    def is_watching(self, sw) -> bool:
+        return sw in self._sessions
+
+    def is_synced(self, sw) -> bool:
+        """该平台是否已完成首次轮询(后台线程在运行时, 其状态即为最新)"""
+        return sw in self._synced and self.running
+
+    def subscribe(self, callback: Callable[[SessionEvent], None], sw=None, kinds: Iterable[str] = None) -> int:
+        """订阅事件, sw/kinds 为 None 表示不限; 回调在轮询线程中执行, 返回用于退订的标识"""
+        token = next(self._token_counter)
+        with self._lock:
+            self._subscribers[token] = (callback, sw, frozenset(kinds) if kinds is not None else None)
+        return token
+
+    def unsubscribe(self, token):
+        with self._lock:
+            self._subscribers.pop(token, None)
+
+    def pid_acc_dict(self, sw) -> Dict[int, str]:
+        """当前已识别的 {pid: 账号}"""
+        with self._lock:
+            return {pid: p.acc for pid, p in self._sessions.get(sw, {}).items() if p.acc is not None}
+
+    def acc_hwnds(self, sw, acc) -> List[int]:
+        with self._lock:
+            return [h for p in self._sessions.get(sw, {}).values() if p.acc == acc for h in p.hwnds]
+
+    def poll(self) -> List[SessionEvent]:
+        """对比一次进程快照, 更新状态, 发布并返回本次产生的事件"""
+        events = []
+        with self._poll_lock:
+            snapshot = self.last_snapshot = self.take_snapshot()
+            with self._lock:
+                sws = list(self._sessions)
+            for sw in sws:
+                with self._lock:
+                    tracked = {pid: p.copy() for pid, p in self._sessions.get(sw, {}).items()}
+                sw_events = self._diff_sw(sw, tracked, snapshot)
+                with self._lock:
+                    if sw not in self._sessions:
+                        continue
+                    self._sessions[sw] = tracked
+                    self._synced.add(sw)
+                events.extend(sw_events)
+        with self._lock:
+            subscribers = list(self._subscribers.values())
+        for event in events:
+            for callback, sw, kinds in subscribers:
+                if (sw is None or sw == event.sw) and (kinds is None or event.kind in kinds):
+                    try:
+                        callback(event)
+                    except Exception as e:
+                        logger.error(e)
+        return events
+
+    def _diff_sw(self, sw, tracked: Dict[int, _TrackedProcess], snapshot) -> List[SessionEvent]:
+        events = []
+        try:
+            pids = set(self.select_pids(sw, snapshot))
+        except Exception as e:
+            logger.error(e)
+            return events
+        # 已退出的进程(含 pid 被复用的情况)
+        for pid in list(tracked):
+            info = snapshot.get(pid)
+            if pid not in pids or info is None or info.create_time != tracked[pid].create_time:
+                gone = tracked.pop(pid)
+                if gone.acc is not None:
+                    events.append(SessionEvent(self.LOGOUT, sw, gone.acc, pid))
+        # 新进程
+        for pid in pids:
+            if pid not in tracked:
+                info = snapshot.get(pid)
+                tracked[pid] = _TrackedProcess(info.create_time if info is not None else None)
+        # 先取窗口: 窗口变化是未登录进程需要重新识别的信号
+        pid_hwnds = {}
+        if tracked:
+            try:
+                pid_hwnds = self.list_windows(sw, list(tracked))
+            except Exception as e:
+                logger.error(e)
+        new_hwnds = {}
+        for pid, p in tracked.items():
+            hwnds = set(pid_hwnds.get(pid, ()))
+            new_hwnds[pid] = sorted(hwnds - p.hwnds)
+            p.hwnds = hwnds
+        # 只识别还没有账号的进程; 识别失败过的, 窗口未变且未到重试时间则跳过
+        now = self.clock()
+        unidentified = [pid for pid, p in tracked.items()
+                        if p.acc is None and (p.miss_hwnds != p.hwnds or now >= p.retry_at)]
+        if unidentified:
+            try:
+                identified = self.identify_acc(sw, unidentified)
+            except Exception as e:
+                logger.error(e)
+                identified = {}
+            for pid in unidentified:
+                acc = identified.get(pid)
+                p = tracked[pid]
+                if acc is not None:
+                    p.acc = acc
+                    events.append(SessionEvent(self.LOGIN, sw, acc, pid))
+                else:
+                    p.miss_hwnds, p.retry_at = set(p.hwnds), now + self.retry_interval
+        # 新窗口(放在识别之后, 事件中带上刚识别出的账号)
+        for pid, hwnds in new_hwnds.items():
+            for hwnd in hwnds:
+                events.append(SessionEvent(self.NEW_WINDOW, sw, tracked[pid].acc, pid, hwnd))
+        return events
+
+    def request_poll(self):
+        """让后台线程尽快轮询一次(如刚启动了进程)"""
+        self._poll_requested.set()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="session_watcher", daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop_event.set()
+        self._poll_requested.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout)
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                logger.error(e)
+            self._poll_requested.wait(self.interval)
+            self._poll_requested.clear()
+
+
+class SimulatedProcess(NamedTuple):
+    """与 process_utils.ProcessInfo 同形"""
+    pid: int
+    ppid: Optional[int]
+    name: str
+    exe: str
+    create_time: Optional[float]
+
+
+class SimulatedSnapshot:
+    """与 process_utils.ProcessSnapshot 同形的最小快照"""
+
+    def __init__(self, infos: Iterable[SimulatedProcess]):
+        self.taken_at = time.time()
+        self.procs: Dict[int, SimulatedProcess] = {info.pid: info for info in infos}
+
+    def __contains__(self, pid):
+        return pid in self.procs
+
+    def get(self, pid) -> Optional[SimulatedProcess]:
+        return self.procs.get(pid)
+
+
+class SimulatedProcessSource:
+    """
+    模拟进程源, 供测试与基准使用: 可随意创建/结束进程, 指定账号和窗口,
+    并提供与 SessionWatcher 所需参数同形的 take_snapshot/select_pids/identify_acc/list_windows
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid_counter = itertools.count(1000, 4)
+        self._procs: Dict[int, SimulatedProcess] = {}
+        self._accs: Dict[int, str] = {}
+        self._hwnds: Dict[int, Set[int]] = {}
+        self._hwnd_counter = itertools.count(0x10000, 2)
+        self.identify_calls = 0
+
+    def spawn(self, name, exe=None, ppid=None, acc=None) -> int:
+        with self._lock:
+            pid = next(self._pid_counter)
+            self._procs[pid] = SimulatedProcess(pid, ppid, name, exe or f"C:\\{name}", time.time())
+            if acc is not None:
+                self._accs[pid] = acc
+            return pid
+
+    def kill(self, pid):
+        with self._lock:
+            self._procs.pop(pid, None)
+            self._accs.pop(pid, None)
+            self._hwnds.pop(pid, None)
+
+    def login(self, pid, acc):
+        with self._lock:
+            self._accs[pid] = acc
+
+    def open_window(self, pid) -> int:
+        with self._lock:
+            hwnd = next(self._hwnd_counter)
+            self._hwnds.setdefault(pid, set()).add(hwnd)
+            return hwnd
+
+    def close_window(self, pid, hwnd):
+        with self._lock:
+            self._hwnds.get(pid, set()).discard(hwnd)
+
+    def take_snapshot(self) -> SimulatedSnapshot:
+        with self._lock:
+            return SimulatedSnapshot(list(self._procs.values()))
+
+    @staticmethod
+    def select_pids(sw, snapshot: SimulatedSnapshot) -> List[int]:
+        """进程名以平台名开头且父进程不是同平台进程的, 视为该平台主进程"""
+        pids = [info.pid for info in snapshot.procs.values() if info.name.startswith(sw)]
+        return [pid for pid in pids if snapshot.get(snapshot.get(pid).ppid) is None
+                or not snapshot.get(snapshot.get(pid).ppid).name.startswith(sw)]
+
+    def identify_acc(self, sw, pids) -> Dict[int, str]:
+        with self._lock:
+            self.identify_calls += len(pids)
+            return {pid: self._accs[pid] for pid in pids if pid in self._accs}
+
+    def list_windows(self, sw, pids) -> Dict[int, List[int]]:
+        with self._lock:
+            return {pid: list(self._hwnds.get(pid, ())) for pid in pids}
+
+    def create_watcher(self, interval=1.0, **kwargs) -> SessionWatcher:
+        return SessionWatcher(self.select_pids, self.identify_acc, self.list_windows, self.take_snapshot, interval,
+                              **kwargs)
@@ -0,0 +1,313 @@
+"""
+耗时统计存储:
+- 每个 (平台, 模式, 主键, 子键) 按时间窗口保存固定对数分桶直方图, 可查询 p50/p95/p99
+- 新样本只追加一行到样本日志, 不重写整个文件; 样本数达到阈值时压缩: 合并进直方图快照, 丢弃超出保留期的窗口, 清空日志
+- 不再丢弃大样本, 异常值只影响最大值和高分位
+"""
+import json
+import math
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from utils.logger_utils import mylogger as logger
+
+
+class LogHistogram:
+    """
+    固定对数分桶直方图: 桶 i 覆盖 [BASE*GROWTH^i, BASE*GROWTH^(i+1)), 分位数的相对误差不超过 GROWTH-1;
+    只保存非空桶, 同时精确记录次数、总和、最小值和最大值
+    """
+    BASE = 0.001
+    GROWTH = 1.05
+    _LOG_GROWTH = math.log(GROWTH)
+
+    __slots__ = ("counts", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    @classmethod
+    def bucket_of(cls, value) -> int:
+        if value <= cls.BASE:
+            return 0
+        return int(math.log(value / cls.BASE) / cls._LOG_GROWTH)
+
+    def add(self, value, n=1):
+        value = max(float(value), 0.0)
+        b = self.bucket_of(value)
+        self.counts[b] = self.counts.get(b, 0) + n
+        self.count += n
+        self.total += value * n
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other: "LogHistogram"):
+        for b, n in other.counts.items():
+            self.counts[b] = self.counts.get(b, 0) + n
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def quantile(self, q) -> Optional[float]:
+        """分位数, q 取 0~1; 在桶内按几何插值, 结果限制在 [min, max] 内"""
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        seen = 0
+        for b in sorted(self.counts):
+            n = self.counts[b]
+            if seen + n >= rank:
+                frac = (rank - seen) / n if n else 0.0
+                value = self.BASE * self.GROWTH ** (b + frac) if b > 0 else self.BASE * frac
+                return min(max(value, self.min), self.max)
+            seen += n
+        return self.max
+
+    @property
+    def avg(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+    def to_dict(self) -> dict:
+        return {"c": {str(b): n for b, n in self.counts.items()}, "n": self.count, "s": self.total,
+                "min": self.min, "max": self.max}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "LogHistogram":
+        h = cls()
+        h.counts = {int(b): int(n) for b, n in d.get("c", {}).items()}
+        h.count = int(d.get("n", 0))
+        h.total = float(d.get("s", 0.0))
+        h.min = float(d.get("min", math.inf))
+        h.max = float(d.get("max", -math.inf))
+        return h
+
+
+class StatSummary(NamedTuple):
+    count: int
+    min: float
+    avg: float
+    max: float
+    p50: float
+    p95: float
+    p99: float
+
+
+SeriesKey = Tuple[str, str, str, str]
+
+
+class StatisticStore:
+    """
+    追加式耗时统计存储
+    :param samples_path: 样本日志(每行一个 JSON 样本)
+    :param snapshot_path: 直方图快照(JSON)
+    :param window: 时间窗口长度(秒), 默认按天分窗口
+    :param retention: 保留期(秒), 压缩时丢弃更早的窗口
+    :param compact_every: 日志累计多少条样本后压缩
+    :param legacy_path: 旧版 "最短,次数,平均,最长" 格式的统计文件, 快照不存在时导入一次
+    """
+
+    def __init__(self, samples_path, snapshot_path, window=86400, retention=180 * 86400, compact_every=500,
+                 legacy_path=None, clock: Callable[[], float] = time.time):
+        self.samples_path = samples_path
+        self.snapshot_path = snapshot_path
+        self.window = window
+        self.retention = retention
+        self.compact_every = compact_every
+        self.legacy_path = legacy_path
+        self.clock = clock
+        self._lock = threading.RLock()
+        self._series: Optional[Dict[SeriesKey, Dict[int, LogHistogram]]] = None
+        self._pending = 0
+
+    # 读写 -------------------------------------------------------------------
+
+    def _window_of(self, ts) -> int:
+        return int(ts // self.window * self.window)
+
+    def _add_to_memory(self, key: SeriesKey, ts, value, n=1):
+        windows = self._series.setdefault(key, {})
+        start = self._window_of(ts)
+        hist = windows.get(start)
+        if hist is None:
+            hist = windows[start] = LogHistogram()
+        hist.add(value, n)
+
+    def _ensure_loaded(self):
+        if self._series is not None:
+            return
+        self._series = {}
+        snapshot = None
+        if os.path.exists(self.snapshot_path):
+            try:
+                with open(self.snapshot_path, "r", encoding="utf-8") as f:
+                    snapshot = json.load(f)
+            except Exception as e:
+                logger.error(e)
+        if isinstance(snapshot, dict):
+            for sw, modes in snapshot.get("series", {}).items():
+                for mode, mains in modes.items():
+                    for main_key, subs in mains.items():
+                        for sub_key, windows in subs.items():
+                            self._series[(sw, mode, main_key, sub_key)] = {
+                                int(start): LogHistogram.from_dict(d) for start, d in windows.items()}
+        elif self.legacy_path and os.path.exists(self.legacy_path):
+            self._import_legacy()
+        self._pending = self._replay_samples()
+        if snapshot is None and self._series:
+            self._compact_locked()
+
+    def _replay_samples(self) -> int:
+        if not os.path.exists(self.samples_path):
+            return 0
+        count = 0
+        with open(self.samples_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    s = json.loads(line)
+                    self._add_to_memory((s["sw"], s["mode"], s["main"], s["sub"]), s["t"], s["v"])
+                    count += 1
+                except (ValueError, KeyError, TypeError):
+                    # 写到一半的行(如程序被强制关闭)直接跳过
+                    continue
+        return count
+
+    def _import_legacy(self):
+        """旧版只有最短/次数/平均/最长: 最短、最长各记一次, 其余次数记在平均值上, 保证次数、总和、极值不变"""
+        try:
+            with open(self.legacy_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.error(e)
+            return
+        now = self.clock()
+        for sw, modes in data.items() if isinstance(data, dict) else ():
+            for mode, mains in modes.items() if isinstance(modes, dict) else ():
+                for main_key, subs in mains.items() if isinstance(mains, dict) else ():
+                    for sub_key, text in subs.items() if isinstance(subs, dict) else ():
+                        try:
+                            min_v, count, avg_v, max_v = (float(x) for x in str(text).split(","))
+                        except ValueError:
+                            continue
+                        count = int(count)
+                        if count <= 0 or math.isinf(min_v):
+                            continue
+                        key = (sw, mode, str(main_key), str(sub_key))
+                        if count == 1:
+                            self._add_to_memory(key, now, avg_v)
+                            continue
+                        self._add_to_memory(key, now, min_v)
+                        self._add_to_memory(key, now, max_v)
+                        if count > 2:
+                            rest_avg = (avg_v * count - min_v - max_v) / (count - 2)
+                            self._add_to_memory(key, now, rest_avg, count - 2)
+
+    def add(self, sw, mode, main_key, sub_key, value, ts=None):
+        """记录一个样本; 只追加一行日志"""
+        ts = self.clock() if ts is None else ts
+        key = (str(sw), str(mode), str(main_key), str(sub_key))
+        with self._lock:
+            self._ensure_loaded()
+            self._add_to_memory(key, ts, value)
+            try:
+                os.makedirs(os.path.dirname(self.samples_path) or ".", exist_ok=True)
+                with open(self.samples_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"t": round(ts, 3), "sw": key[0], "mode": key[1], "main": key[2],
+                                        "sub": key[3], "v": round(float(value), 6)}, ensure_ascii=False) + "\n")
+                self._pending += 1
+            except Exception as e:
+                logger.error(e)
+            if self._pending >= self.compact_every:
+                self._compact_locked()
+
+    # 压缩 -------------------------------------------------------------------
+
+    def compact(self):
+        """丢弃超出保留期的窗口, 写入快照并清空样本日志"""
+        with self._lock:
+            self._ensure_loaded()
+            self._compact_locked()
+
+    def _compact_locked(self):
+        oldest = self._window_of(self.clock() - self.retention)
+        series = {}
+        for key, windows in list(self._series.items()):
+            kept = {start: h for start, h in windows.items() if start >= oldest}
+            if not kept:
+                del self._series[key]
+                continue
+            self._series[key] = kept
+            sw, mode, main_key, sub_key = key
+            series.setdefault(sw, {}).setdefault(mode, {}).setdefault(main_key, {})[sub_key] = {
+                str(start): h.to_dict() for start, h in kept.items()}
+        try:
+            os.makedirs(os.path.dirname(self.snapshot_path) or ".", exist_ok=True)
+            tmp_path = self.snapshot_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": 1, "window": self.window, "series": series}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.snapshot_path)
+            # 快照已包含日志中的样本, 清空日志
+            open(self.samples_path, "w", encoding="utf-8").close()
+            self._pending = 0
+        except Exception as e:
+            logger.error(e)
+
+    def clear(self, remove_files: Callable[[List[str]], bool] = None) -> bool:
+        """
+        删除统计文件并清空统计; 文件未能全部删除时保留内存中的数据(下次压缩会重新写出), 返回 False
+        :param remove_files: 删除文件的方法(如移至回收站), 返回是否成功; 不传则直接删除
+        """
+        with self._lock:
+            paths = [p for p in (self.samples_path, self.snapshot_path, self.legacy_path) if p and os.path.exists(p)]
+            if paths:
+                try:
+                    if remove_files is not None:
+                        removed = remove_files(paths)
+                    else:
+                        for path in paths:
+                            os.remove(path)
+                        removed = True
+                except Exception as e:
+                    logger.error(e)
+                    removed = False
+                if not removed or any(os.path.exists(p) for p in paths):
+                    return False
+            self._series = {}
+            self._pending = 0
+            return True
+
+    # 查询 -------------------------------------------------------------------
+
+    def query(self, sw, mode=None, since=None) -> Dict[Tuple[str, str, str], StatSummary]:
+        """
+        一次查询平台的统计
+        :param mode: 只查该模式, 不传则全部
+        :param since: 只统计该时间戳之后的窗口, 不传则为保留期内全部
+        :return: {(模式, 主键, 子键): StatSummary}
+        """
+        with self._lock:
+            self._ensure_loaded()
+            merged = {}
+            for (s, m, main_key, sub_key), windows in self._series.items():
+                if s != str(sw) or (mode is not None and m != mode):
+                    continue
+                hist = LogHistogram()
+                for start, h in windows.items():
+                    if since is None or start + self.window > since:
+                        hist.merge(h)
+                if hist.count:
+                    merged[(m, main_key, sub_key)] = hist
+        return {key: StatSummary(h.count, h.min, h.avg, h.max, h.quantile(0.5), h.quantile(0.95), h.quantile(0.99))
+                for key, h in merged.items()}
+
+    def series_keys(self) -> Iterable[SeriesKey]:
+        with self._lock:
+            self._ensure_loaded()
+            return list(self._series)
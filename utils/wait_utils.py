@@ -0,0 +1,185 @@
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Iterable, List, Optional
+
+import psutil
+import win32gui
+
+from utils.logger_utils import mylogger as logger
+
+
+# 条件来源: 返回 bool 的无参函数, 为 True 时等待结束. 检查函数均可替换, 便于用假数据测试
+def window_closed(hwnd, is_window: Callable[[int], bool] = None) -> Callable[[], bool]:
+    """窗口已关闭"""
+    is_window = is_window if is_window is not None else win32gui.IsWindow
+    return lambda: not is_window(hwnd)
+
+
+def windows_closed(hwnds: Iterable[int], is_window: Callable[[int], bool] = None) -> Callable[[], bool]:
+    """所有窗口都已关闭; 已关闭的窗口不再检查"""
+    is_window = is_window if is_window is not None else win32gui.IsWindow
+    remained = [h for h in hwnds if h]
+
+    def check():
+        remained[:] = [h for h in remained if is_window(h)]
+        return len(remained) == 0
+
+    return check
+
+
+def window_settled(hwnd, get_rect: Callable[[int], tuple] = None) -> Callable[[], bool]:
+    """窗口已显示, 且位置尺寸在相邻两次检查间不再变化"""
+    get_rect = get_rect if get_rect is not None else _visible_rect
+    last = [None]
+
+    def check():
+        rect = get_rect(hwnd)
+        if rect is None:
+            return False
+        settled = rect == last[0]
+        last[0] = rect
+        return settled
+
+    return check
+
+
+def _visible_rect(hwnd) -> Optional[tuple]:
+    if not win32gui.IsWindow(hwnd) or not win32gui.IsWindowVisible(hwnd):
+        return None
+    return win32gui.GetWindowRect(hwnd)
+
+
+def process_exited(pid, pid_exists: Callable[[int], bool] = None) -> Callable[[], bool]:
+    """进程已退出"""
+    pid_exists = pid_exists if pid_exists is not None else psutil.pid_exists
+    return lambda: not pid_exists(pid)
+
+
+class _Wait:
+    __slots__ = ("condition", "deadline", "interval", "future")
+
+    def __init__(self, condition, deadline, interval, future):
+        self.condition = condition
+        self.deadline = deadline
+        self.interval = interval
+        self.future = future
+
+
+class TimedWaiter:
+    """
+    定时等待服务: 所有"直到某条件成立或超时"的等待都由同一个后台线程检查,
+    每个等待的检查间隔从 min_interval 起按 backoff 倍增, 最长 max_interval, 线程在没有到期的检查时休眠.
+    wait_until 返回 Future: 条件成立时结果为 True, 超时为 False, 检查出错时为该异常
+    """
+
+    def __init__(self, min_interval=0.05, max_interval=1.0, backoff=1.5, clock: Callable[[], float] = time.monotonic,
+                 autostart=True):
+        """autostart 为 False 时不启动后台线程, 需由调用方调用 run_due(用于测试)"""
+        self.autostart = autostart
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.clock = clock
+        self._heap: List[tuple] = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def wait_until(self, condition: Callable[[], bool], timeout: float,
+                   callback: Callable[[bool], None] = None) -> Future:
+        """
+        登记一个等待
+        :param condition: 条件, 返回 True 表示等待结束
+        :param timeout: 超时时间(秒)
+        :param callback: 可选, 结束后以结果(True/False)调用, 在等待线程中执行, 不要在其中做耗时操作
+        """
+        future = Future()
+        future.set_running_or_notify_cancel()
+        if callback is not None:
+            future.add_done_callback(lambda f: callback(f.exception() is None and f.result() is True))
+        now = self.clock()
+        wait = _Wait(condition, now + timeout, self.min_interval, future)
+        with self._cond:
+            # 登记后立即检查一次
+            heapq.heappush(self._heap, (now, next(self._counter), wait))
+            self._ensure_thread()
+            self._cond.notify()
+        return future
+
+    def wait(self, condition: Callable[[], bool], timeout: float) -> bool:
+        """阻塞当前线程直到条件成立或超时, 检查仍由等待线程完成"""
+        future = self.wait_until(condition, timeout)
+        try:
+            return future.result(timeout + self.max_interval + 1)
+        except Exception as e:
+            logger.error(e)
+            return False
+
+    def wake(self):
+        """让所有等待立即检查一次(如收到了可能使条件成立的事件)"""
+        now = self.clock()
+        with self._cond:
+            self._heap = [(now, seq, w) for _, seq, w in self._heap]
+            heapq.heapify(self._heap)
+            self._cond.notify()
+
+    @property
+    def pending_count(self) -> int:
+        with self._cond:
+            return len(self._heap)
+
+    def _ensure_thread(self):
+        if not self.autostart:
+            return
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="timed_waiter", daemon=True)
+            self._thread.start()
+
+    def run_due(self) -> Optional[float]:
+        """检查所有到期的等待, 返回距下一次检查的秒数(没有等待时为 None)"""
+        while True:
+            with self._cond:
+                if not self._heap:
+                    return None
+                due, _, wait = self._heap[0]
+                now = self.clock()
+                if due > now:
+                    return due - now
+                heapq.heappop(self._heap)
+            if wait.future.done():
+                continue
+            try:
+                finished = bool(wait.condition())
+            except Exception as e:
+                wait.future.set_exception(e)
+                continue
+            now = self.clock()
+            if finished:
+                wait.future.set_result(True)
+            elif now >= wait.deadline:
+                wait.future.set_result(False)
+            else:
+                wait.interval = min(wait.interval * self.backoff, self.max_interval)
+                with self._cond:
+                    heapq.heappush(self._heap, (min(now + wait.interval, wait.deadline), next(self._counter), wait))
+
+    def _run(self):
+        while True:
+            try:
+                self.run_due()
+            except Exception as e:
+                logger.error(e)
+            with self._cond:
+                # 期间可能有新登记的等待, 以堆顶为准
+                if self._heap:
+                    delay = self._heap[0][0] - self.clock()
+                    if delay > 0:
+                        self._cond.wait(delay)
+                else:
+                    self._cond.wait()
+
+
+timed_waiter = TimedWaiter()
@@ -0,0 +1,475 @@
+"""
+窗口匹配规则编译:
+- 把远程配置 wnd_class 中的匹配字典(以及 Logic2DictParser 解析出的逻辑表达式)编译成闭包树, 同一规则只编译一次
+- 通配符预编译为正则
+- 控件属性按 hwnd 短时缓存, 多次筛选之间复用
+- 控件来源可替换: 默认使用 uiautomation, 也可使用 FakeControlBackend 在任意平台上测试与基准
+"""
+import fnmatch
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import nullcontext
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional
+
+from utils.parser import Logic2DictParser
+
+# 不依赖 logger_utils(会引入 Windows 专用模块), 以便在任意平台上测试与基准; 与 mylogger 同名, 程序中日志仍输出到同一处
+logger = logging.getLogger('mylogger')
+
+# 属性不存在(或读取失败)
+_MISSING = object()
+# 缓存中表示"控件可获取"的属性名
+_AVAILABLE = "__available__"
+
+
+def compile_wildcards(patterns: Iterable[str]) -> Callable[[str], bool]:
+    """把一组通配符合并编译为一个正则, 规则与 fnmatch.fnmatch 一致(Windows 下不区分大小写)"""
+    patterns = [os.path.normcase(p) for p in patterns]
+    if not patterns:
+        return lambda name: False
+    regex = re.compile("|".join(f"(?:{fnmatch.translate(p)})" for p in patterns))
+    match = regex.match
+    normcase = os.path.normcase
+    return lambda name: isinstance(name, str) and match(normcase(name)) is not None
+
+
+"""控件来源"""
+
+
+class ControlBackend:
+    """控件来源基类: 属性读取走 getattr, 子类只需实现 control_from_handle"""
+
+    def scope(self):
+        """一次筛选期间所需的环境(如 COM 初始化)"""
+        return nullcontext()
+
+    def control_from_handle(self, hwnd):
+        """返回控件, 获取不到返回 None"""
+        raise NotImplementedError
+
+    def read(self, ctrl, prop):
+        """读取属性, 可调用的属性读取其调用结果; 不存在返回 _MISSING"""
+        if not hasattr(ctrl, prop):
+            return _MISSING
+        value = getattr(ctrl, prop)
+        return value() if callable(value) else value
+
+    def rect(self, ctrl) -> tuple:
+        r = ctrl.BoundingRectangle
+        return r.left, r.top, r.right, r.bottom
+
+    def child_handle(self, ctrl, which) -> Optional[int]:
+        """which 为 FirstChild/LastChild"""
+        sub_ctrl = ctrl.GetFirstChildControl() if which == "FirstChild" else ctrl.GetLastChildControl()
+        if sub_ctrl is None:
+            return None
+        return getattr(sub_ctrl, "Handle", None) or None
+
+
+class UIAutomationBackend(ControlBackend):
+    """uiautomation 控件来源; 延迟导入, 非 Windows 平台也可导入本模块"""
+
+    def scope(self):
+        import uiautomation as auto
+        return auto.UIAutomationInitializerInThread()
+
+    def control_from_handle(self, hwnd):
+        import uiautomation as auto
+        ctrl = auto.ControlFromHandle(hwnd)
+        return ctrl if isinstance(ctrl, auto.Control) else None
+
+
+class FakeRect(NamedTuple):
+    left: int
+    top: int
+    right: int
+    bottom: int
+
+
+class FakeControl:
+    """假控件: 任意属性通过关键字参数给出, children 为子控件列表"""
+
+    def __init__(self, hwnd, ClassName="", rect=(0, 0, 0, 0), children: List["FakeControl"] = None, **props):
+        self.Handle = hwnd
+        self.ClassName = ClassName
+        self.BoundingRectangle = FakeRect(*rect)
+        self.children = list(children or [])
+        for k, v in props.items():
+            setattr(self, k, v)
+
+    def GetFirstChildControl(self):
+        return self.children[0] if self.children else None
+
+    def GetLastChildControl(self):
+        return self.children[-1] if self.children else None
+
+
+class FakeControlBackend(ControlBackend):
+    """假控件来源: latency 模拟每次跨进程读取的耗时(秒), calls 记录读取次数"""
+
+    def __init__(self, controls: Iterable[FakeControl] = (), latency=0.0):
+        self.latency = latency
+        self.calls = 0
+        self._controls: Dict[int, FakeControl] = {}
+        self._lock = threading.Lock()
+        for ctrl in controls:
+            self.add(ctrl)
+
+    def add(self, ctrl: FakeControl):
+        self._controls[ctrl.Handle] = ctrl
+        for child in ctrl.children:
+            self.add(child)
+
+    def remove(self, hwnd):
+        self._controls.pop(hwnd, None)
+
+    def _spend(self):
+        with self._lock:
+            self.calls += 1
+        if self.latency > 0:
+            end = time.perf_counter() + self.latency
+            while time.perf_counter() < end:
+                pass
+
+    def control_from_handle(self, hwnd):
+        self._spend()
+        return self._controls.get(hwnd)
+
+    def read(self, ctrl, prop):
+        self._spend()
+        return super().read(ctrl, prop)
+
+    def rect(self, ctrl) -> tuple:
+        self._spend()
+        return super().rect(ctrl)
+
+    def child_handle(self, ctrl, which) -> Optional[int]:
+        self._spend()
+        return super().child_handle(ctrl, which)
+
+
+"""控件属性缓存"""
+
+
+class ControlPropertyCache:
+    """
+    按 (hwnd, 属性) 缓存控件属性值 ttl 秒. 只缓存读到的纯数据(字符串、矩形、子窗口句柄),
+    控件对象本身只在一次筛选内复用, 不跨线程共享
+    """
+
+    def __init__(self, backend: ControlBackend = None, ttl=0.5, clock: Callable[[], float] = time.monotonic,
+                 max_entries=4096):
+        self.backend = backend if backend is not None else UIAutomationBackend()
+        self.ttl = ttl
+        self.clock = clock
+        self.max_entries = max_entries
+        self._values: Dict[tuple, tuple] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, hwnd, prop):
+        """返回 (是否命中, 值)"""
+        key = (hwnd, prop)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is not None:
+                if entry[0] > self.clock():
+                    self.hits += 1
+                    return True, entry[1]
+                del self._values[key]
+            self.misses += 1
+        return False, None
+
+    def store(self, hwnd, prop, value):
+        if self.ttl <= 0:
+            return
+        now = self.clock()
+        with self._lock:
+            if len(self._values) >= self.max_entries:
+                self._values = {k: e for k, e in self._values.items() if e[0] > now}
+                if len(self._values) >= self.max_entries:
+                    self._values.clear()
+            self._values[(hwnd, prop)] = (now + self.ttl, value)
+
+    def invalidate(self, hwnd=None):
+        """清除某个窗口(不传则全部)的缓存"""
+        with self._lock:
+            if hwnd is None:
+                self._values.clear()
+            else:
+                self._values = {k: e for k, e in self._values.items() if k[0] != hwnd}
+
+    def context(self) -> "RuleContext":
+        return RuleContext(self)
+
+
+class RuleContext:
+    """一次筛选的上下文: 属性先查缓存, 未命中才获取控件读取"""
+
+    def __init__(self, cache: ControlPropertyCache):
+        self.cache = cache
+        self.backend = cache.backend
+        self._controls: Dict[int, object] = {}
+
+    def _control(self, hwnd):
+        if hwnd not in self._controls:
+            try:
+                self._controls[hwnd] = self.backend.control_from_handle(hwnd)
+            except Exception as e:
+                print(f"获取 ctrl 失败 {hwnd}: {e}")
+                self._controls[hwnd] = None
+        return self._controls[hwnd]
+
+    def _get(self, hwnd, prop, read):
+        hit, value = self.cache.lookup(hwnd, prop)
+        if hit:
+            return value
+        ctrl = self._control(hwnd)
+        if ctrl is None:
+            # 获取不到的控件不缓存, 窗口可能稍后才就绪
+            return _MISSING
+        try:
+            value = read(ctrl)
+        except Exception as e:
+            print(f"读取 {hwnd} 的 {prop} 失败: {e}")
+            return _MISSING
+        self.cache.store(hwnd, prop, value)
+        return value
+
+    def available(self, hwnd) -> bool:
+        return self._get(hwnd, _AVAILABLE, lambda ctrl: True) is True
+
+    def prop(self, hwnd, name):
+        return self._get(hwnd, name, lambda ctrl: self.backend.read(ctrl, name))
+
+    def rect(self, hwnd) -> tuple:
+        rect = self._get(hwnd, "BoundingRectangle", self.backend.rect)
+        if rect is _MISSING:
+            raise ValueError(f"无法获取 {hwnd} 的 BoundingRectangle")
+        return rect
+
+    def child(self, hwnd, which) -> Optional[int]:
+        handle = self._get(hwnd, which, lambda ctrl: self.backend.child_handle(ctrl, which))
+        return None if handle is _MISSING else handle
+
+
+"""规则编译"""
+
+# 检查的开销等级, 同一层规则中按开销从低到高检查(各检查互不影响, 调整顺序不改变结果)
+_COST_PROP, _COST_CHILD, _COST_OR = 0, 1, 2
+
+
+def _negate(check):
+    return lambda hwnd, ctx: not check(hwnd, ctx)
+
+
+def _compile_predicate(rules: dict, variables: Dict[str, Callable]) -> Callable[[int, RuleContext], bool]:
+    """把一层规则字典编译为 (hwnd, ctx) -> bool"""
+    checks = []
+    for key, value in rules.items():
+        negate = key.startswith("!")
+        name = key[1:] if negate else key
+        if name in variables:
+            var_check = variables[name]
+            check = (lambda c, v: lambda hwnd, ctx: c(hwnd, ctx) == v)(var_check, value)
+            cost = _COST_CHILD
+        elif name.startswith("OR"):
+            subs = [_compile_predicate(sub_rule, variables) for sub_rule in value]
+            check = (lambda s: lambda hwnd, ctx: any(sub(hwnd, ctx) for sub in s))(subs)
+            cost = _COST_OR
+        elif name == "ClassNameWildcards":
+            match = compile_wildcards(value)
+            check = (lambda m: lambda hwnd, ctx: m(ctx.prop(hwnd, "ClassName")))(match)
+            cost = _COST_PROP
+        elif name == "FinalSelect":
+            # 留到外层处理
+            continue
+        elif name in ("FirstChild", "LastChild"):
+            sub = _compile_predicate(value, variables)
+
+            def check(hwnd, ctx, _which=name, _sub=sub):
+                sub_hwnd = ctx.child(hwnd, _which)
+                return bool(sub_hwnd) and _sub(sub_hwnd, ctx)
+
+            cost = _COST_CHILD
+        else:
+            def check(hwnd, ctx, _name=name, _value=value):
+                attr_val = ctx.prop(hwnd, _name)
+                return attr_val is not _MISSING and attr_val == _value
+
+            cost = _COST_PROP
+        checks.append((cost, _negate(check) if negate else check))
+
+    checks = tuple(c for _, c in sorted(checks, key=lambda item: item[0]))
+
+    def predicate(hwnd, ctx):
+        if not ctx.available(hwnd):
+            return False
+        for c in checks:
+            if not c(hwnd, ctx):
+                return False
+        return True
+
+    return predicate
+
+
+_METRICS = {
+    "Size": lambda r: (r[2] - r[0]) * (r[3] - r[1]),
+    "Width": lambda r: r[2] - r[0],
+    "Height": lambda r: r[3] - r[1],
+}
+
+
+def _compile_metric(metric):
+    for prefix, calc in _METRICS.items():
+        if metric.startswith(prefix):
+            return lambda hwnd, ctx: calc(ctx.rect(hwnd))
+
+    def unknown(hwnd, ctx):
+        raise ValueError(f"Unknown metric: {metric}")
+
+    return unknown
+
+
+def _compile_condition(key, value):
+    """尾筛单条件: candidates -> candidates"""
+    negate = key.startswith("!")
+    key = key[1:] if negate else key
+    if key.endswith(("Extreme", "End")):
+        metric = key.replace("Extreme", "").replace("End", "")
+        get_metric = _compile_metric(metric)
+        pick = max if value == "max" else min
+
+        def select(candidates, ctx):
+            vals = [(hwnd, get_metric(hwnd, ctx)) for hwnd in candidates]
+            logger.debug("[hwnd, %s]: %s", metric, vals)
+            extreme_val = pick(v for _, v in vals)
+            return [hwnd for hwnd, val in vals if val == extreme_val]
+    else:
+        for suffix, op in (("Equals", lambda a, b: a == b), ("Greater", lambda a, b: a > b),
+                           ("Less", lambda a, b: a < b)):
+            if key.endswith(suffix):
+                get_metric = _compile_metric(key.replace(suffix, ""))
+
+                def select(candidates, ctx, _op=op, _get=get_metric):
+                    return [hwnd for hwnd in candidates if _op(_get(hwnd, ctx), value)]
+
+                break
+        else:
+            raise ValueError(f"Unknown condition key: {key}")
+
+    if not negate:
+        return select
+    return lambda candidates, ctx: list(set(candidates) - set(select(candidates, ctx)))
+
+
+def _compile_final_select(methods: list):
+    """
+    尾筛: 按顺序尝试每个方法, 只要有一个方法筛选出唯一结果则返回, 否则返回原候选.
+    方法内各条件为 AND 关系(逐个筛选), OR 块中每个分支的输入相同, 结果取并集
+    """
+    compiled_methods = []
+    for method in methods:
+        steps = []
+        for k, v in method.items():
+            if k.startswith("OR"):
+                branches = [[_compile_condition(sk, sv) for sk, sv in cond.items()] for cond in v]
+
+                def or_step(candidates, ctx, _branches=branches):
+                    result_set = set()
+                    for branch in _branches:
+                        sub_candidates = candidates
+                        for cond in branch:
+                            sub_candidates = cond(sub_candidates, ctx)
+                        result_set.update(sub_candidates)
+                    return list(result_set)
+
+                steps.append(or_step)
+            else:
+                steps.append(_compile_condition(k, v))
+        compiled_methods.append(steps)
+
+    def final_select(hwnds, ctx):
+        if len(hwnds) <= 1:
+            return hwnds
+        for steps in compiled_methods:
+            result = hwnds[:]
+            for step in steps:
+                if not result:
+                    break
+                result = step(result, ctx)
+            if len(result) == 1:
+                return result
+        return hwnds
+
+    return final_select
+
+
+class CompiledWndRule:
+    """编译后的窗口匹配规则"""
+
+    def __init__(self, rules: dict, variables: Dict[str, Callable] = None):
+        self.rules = rules
+        self.predicate = _compile_predicate(rules, variables or {})
+        final_select = rules.get("FinalSelect") if isinstance(rules, dict) else None
+        self.final_select = _compile_final_select(final_select) if final_select else None
+
+    def __call__(self, hwnd, ctx: RuleContext) -> bool:
+        """可作为其他规则的变量使用"""
+        return self.predicate(hwnd, ctx)
+
+    def filter(self, hwnds, cache: ControlPropertyCache = None) -> list:
+        """筛选出符合规则的 hwnd, 初筛不唯一时进入尾筛 FinalSelect"""
+        cache = cache if cache is not None else default_property_cache
+        ctx = cache.context()
+        with cache.backend.scope():
+            matched = [hwnd for hwnd in hwnds if self.predicate(hwnd, ctx)]
+            if self.final_select is not None and len(matched) > 1:
+                matched = self.final_select(matched, ctx)
+        return matched
+
+
+_compiled_cache: "OrderedDict[str, CompiledWndRule]" = OrderedDict()
+_compiled_cache_lock = threading.Lock()
+_COMPILED_CACHE_SIZE = 128
+
+
+def compile_wnd_rule(rules: dict) -> CompiledWndRule:
+    """编译匹配字典; 内容相同(含键顺序)的字典只编译一次"""
+    try:
+        key = json.dumps(rules, ensure_ascii=False)
+    except (TypeError, ValueError):
+        return CompiledWndRule(rules)
+    with _compiled_cache_lock:
+        compiled = _compiled_cache.get(key)
+        if compiled is not None:
+            _compiled_cache.move_to_end(key)
+            return compiled
+    compiled = CompiledWndRule(rules)
+    with _compiled_cache_lock:
+        _compiled_cache[key] = compiled
+        while len(_compiled_cache) > _COMPILED_CACHE_SIZE:
+            _compiled_cache.popitem(last=False)
+    return compiled
+
+
+def compile_logic_expr(text: str, variables: Dict[str, object]) -> CompiledWndRule:
+    """
+    编译逻辑表达式, 如 "(A+B)!C"
+    :param text: Logic2DictParser 语法的表达式
+    :param variables: {变量名: 匹配字典或 CompiledWndRule}
+    """
+    compiled_vars = {
+        name: var if isinstance(var, CompiledWndRule) else compile_wnd_rule(var)
+        for name, var in variables.items()
+    }
+    return CompiledWndRule(Logic2DictParser(text).parse(), compiled_vars)
+
+
+default_property_cache = ControlPropertyCache()